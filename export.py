@@ -0,0 +1,59 @@
+"""Exports the incident history of a guild as JSONL or CSV.
+
+The export is streamed, so it works for guilds of any size. It is written
+to stdout, or to a file, which is gzipped if its name ends with ``.gz``.
+
+    python export.py <guild id> [jsonl|csv] [file]
+"""
+
+import asyncio
+import configparser
+import sys
+
+import aredis
+
+from incidentreporter import export
+from incidentreporter.codec import UpdateCodec
+from incidentreporter.ext.incidents import STATES
+from incidentreporter.storage import Storage
+
+
+async def main():
+    config = configparser.ConfigParser()
+    config.read('config.ini')
+
+    if len(sys.argv) < 2 or not sys.argv[1].isdigit():
+        print(__doc__.strip(), file=sys.stderr)
+        exit(1)
+    guild = int(sys.argv[1])
+    format = sys.argv[2] if len(sys.argv) > 2 else 'jsonl'
+    path = sys.argv[3] if len(sys.argv) > 3 else None
+    if format not in export.FORMATS:
+        print(f'Unknown format {format!r}, use one of '
+              f'{", ".join(export.FORMATS)}', file=sys.stderr)
+        exit(1)
+
+    url = config.get('general', 'redis')
+    cluster = config.getboolean('general', 'redis cluster', fallback=False)
+    if cluster:
+        redis = aredis.StrictRedisCluster.from_url(
+            url, skip_full_coverage_check=True
+        )
+    else:
+        redis = aredis.StrictRedis.from_url(url)
+    storage = (Storage(redis, hash_tags=cluster) / 'guild').tag(guild)
+
+    if path is None:
+        count = await export.export(storage, UpdateCodec(STATES),
+                                    sys.stdout.buffer, format,
+                                    compress=False)
+    else:
+        with open(path, 'wb') as fp:
+            count = await export.export(storage, UpdateCodec(STATES), fp,
+                                        format,
+                                        compress=path.endswith('.gz'))
+    print(f'Exported {count} incident updates', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
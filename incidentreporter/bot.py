@@ -1,11 +1,13 @@
 from __future__ import annotations
 
+import asyncio
 import base64
 import configparser
 import logging
 import os
 from pathlib import Path
 import traceback
+from typing import List, Union
 
 import aredis
 import discord
@@ -13,7 +15,10 @@ from discord.ext import commands
 import httpx
 from humanfriendly import format_timespan
 
-from .storage import Storage
+from . import context, schema
+from .context import GuildContext
+from .schema import settings
+from .storage import Cache, Storage
 from .util import NotStaff, NotPremium, GuildBanned, is_guild_banned
 
 
@@ -24,7 +29,10 @@ EXTENSIONS = [
     'incidentreporter.ext.dev',
     'incidentreporter.ext.help',
     'incidentreporter.ext.incidents',
+    'incidentreporter.ext.maintenance',
+    'incidentreporter.ext.mirrors',
     'incidentreporter.ext.premium',
+    'incidentreporter.ext.reminders',
     'incidentreporter.ext.roles',
     'incidentreporter.ext.statusembed',
 ]
@@ -69,6 +77,8 @@ PERMISSIONS = {
     'view_channel': 'View Channels',
     'view_guild_insights': 'View Server Insights'
 }
+# seconds between the checks whether the data has been migrated
+SCHEMA_CHECK_INTERVAL = 5 * 60
 INVITE_PERMISSIONS = discord.Permissions(
     send_messages=True,
     read_messages=True,
@@ -80,7 +90,8 @@ logger = logging.getLogger(__name__)
 
 class IncidentReporterBot(commands.Bot):
     def __init__(self, config: configparser.ConfigParser,
-                 redis: aredis.StrictRedis, **kwargs):
+                 redis: aredis.StrictRedis,
+                 replicas: List[aredis.StrictRedis] = (), **kwargs):
         super().__init__(
             activity=discord.Activity(
                 name='out for new incidents',
@@ -101,7 +112,26 @@ class IncidentReporterBot(commands.Bot):
         if self.config.getboolean('errorlog', 'enabled'):
             self.errorlog = Path(self.config.get('errorlog', 'path'))
 
-        self.storage = Storage(redis)
+        self.cache = None
+        if self.config.getboolean('cache', 'enabled', fallback=False):
+            invalidation = self.config.get('cache', 'invalidation')
+            self.cache = Cache(
+                {f'guild:*:{key}': float(value)
+                 for key, value in self.config.items('cache:ttl')},
+                size=self.config.getint('cache', 'size'),
+                channel=None if invalidation == 'keyspace' else invalidation
+            )
+            self.loop.create_task(self.cache.listen(redis))
+
+        self.storage = Storage(
+            redis, cache=self.cache,
+            hash_tags=self.config.getboolean('general', 'redis cluster',
+                                             fallback=False),
+            replicas=replicas
+        )
+        self.read_your_writes = self.config.getboolean(
+            'general', 'redis read your writes', fallback=True
+        )
         self.shoppy = httpx.AsyncClient(headers={
             'Authorization': self.config.get('shoppy', 'api key'),
             'User-Agent': 'python-httpx (Incident Reporter Bot)'
@@ -115,8 +145,18 @@ class IncidentReporterBot(commands.Bot):
         )
         self.add_check(is_guild_banned().predicate, call_once=True)
 
+    async def check_schema(self):
+        # records read the keys of schema v1 until the data has been
+        # migrated, which is done by another process (migrate.py)
+        while await schema.check_version(self.storage) \
+                < schema.HASHES_VERSION:
+            await asyncio.sleep(SCHEMA_CHECK_INTERVAL)
+        logger.info('data is migrated, records only read their hashes')
+
     async def on_ready(self):
         if not self._loaded_extensions:
+            self.loop.create_task(self.check_schema())
+
             if self.config.getboolean('prometheus', 'enabled'):
                 EXTENSIONS.append('incidentreporter.ext.prometheus')
 
@@ -142,25 +182,59 @@ class IncidentReporterBot(commands.Bot):
                 print()
             print('-' * os.get_terminal_size().columns)
 
+    async def invoke(self, ctx: commands.Context):
+        if ctx.command is not None:
+            # the settings needed by the checks and most commands are read
+            # at once, only for messages that are commands
+            if ctx.guild is None:
+                ctx.guild_context = GuildContext(None, self.default_prefix)
+            else:
+                ctx.guild_context = await GuildContext.load(
+                    self.get_storage(ctx.guild), ctx.guild.id,
+                    self.default_prefix
+                )
+                context.current.set(ctx.guild_context)
+        if not self.read_your_writes:
+            return await super().invoke(ctx)
+        with Storage.read_your_writes():
+            await super().invoke(ctx)
+
+    async def get_context(self, message: discord.Message, *,
+                          cls=commands.Context) -> commands.Context:
+        ctx = await super().get_context(message, cls=cls)
+        # loaded by invoke() once the message turned out to be a command
+        ctx.guild_context = None
+        return ctx
+
     @staticmethod
     async def get_command_prefix(bot: IncidentReporterBot,
                                  message: discord.Message):
-        return (
-            await bot.get_storage(message.guild).get_str(
+        guild_context = context.current.get()
+        if message.guild is None:
+            prefix = bot.default_prefix
+        elif guild_context is not None \
+                and guild_context.guild_id == message.guild.id:
+            prefix = guild_context.prefix
+        else:
+            prefix = await settings(bot.get_storage(message.guild)).get_str(
                 'prefix',
                 default=bot.default_prefix
-            ),
+            )
+        return (
+            prefix,
             bot.user.mention + ' ',
             f'<@!{bot.user.id}> '
         )
 
-    def get_storage(self, guild: discord.Guild) -> Storage:
-        return self.storage / 'guild' / guild.id
+    def get_storage(self, guild: Union[discord.Guild, int]) -> Storage:
+        if isinstance(guild, discord.Guild):
+            guild = guild.id
+        return (self.storage / 'guild').tag(guild)
 
     async def on_command_error(self, ctx: commands.Context, exception):
         if isinstance(exception, commands.CommandError):
             if isinstance(exception, commands.MissingRequiredArgument):
-                prefix = (await self.get_command_prefix(self, ctx.message))[0]
+                prefix = ctx.guild_context.prefix
                 return await ctx.send(embed=discord.Embed(
                     description=(
                         f'You are missing a required argument: '
@@ -171,6 +245,11 @@ class IncidentReporterBot(commands.Bot):
                 ))
             elif isinstance(exception, commands.CommandNotFound):
                 return
+            elif isinstance(exception, commands.NoPrivateMessage):
+                return await ctx.send(embed=discord.Embed(
+                    description='This command can only be used in a server.',
+                    color=self.colorsg['failure']
+                ))
             elif isinstance(exception, commands.MissingPermissions):
                 return await ctx.send(embed=discord.Embed(
                     description=(
@@ -273,7 +352,7 @@ class IncidentReporterBot(commands.Bot):
             f'Message: {ctx.message.content!r}\n'
             f'More: {ctx.message.id} ({ctx.message.created_at.isoformat()})\n'
             f'Author: {ctx.author!r} ({ctx.author.id})\n'
-            f'Guild: {ctx.guild!r} ({ctx.guild.id})\n'
+            f'Guild: {ctx.guild!r} ({ctx.guild and ctx.guild.id})\n'
             f'----------------\n'
             f'{error_text}'
         )
@@ -0,0 +1,127 @@
+"""Encoding of incident updates.
+
+Updates used to be stored as JSON, ``["Outage", "message", "isoformat"]``,
+which has to be parsed again every time an incident is rendered. The binary
+format is a fixed header followed by the message:
+
+    format   1 byte   FORMAT_*, JSON always starts with '[' instead
+    state    1 byte   index of the state in the codec's ``states``
+    time     8 bytes  milliseconds since the epoch, big endian
+    message  rest     UTF-8, compressed for FORMAT_ZLIB and FORMAT_ZSTD
+
+Updates in every format can be decoded, the configured format only applies
+to new updates.
+"""
+
+from __future__ import annotations
+
+import datetime
+import json
+import struct
+from typing import NamedTuple, Sequence
+import zlib
+
+# zstd compresses faster and better, but requires an extra package
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+FORMAT_BINARY = 1
+FORMAT_ZLIB = 2
+FORMAT_ZSTD = 3
+FORMAT_JSON = ord('[')
+
+# messages shorter than this are never compressed
+COMPRESS_THRESHOLD = 256
+
+_HEADER = struct.Struct('>BBq')
+_EPOCH = datetime.datetime(1970, 1, 1)
+_MILLISECOND = datetime.timedelta(milliseconds=1)
+
+
+class Update(NamedTuple):
+    state: str
+    message: str
+    # naive, in UTC, like discord.py's timestamps
+    time: datetime.datetime
+
+
+class UpdateCodec:
+    """Encodes and decodes incident updates.
+
+    The index of a state in ``states`` is stored, so states may only be
+    appended to it. Updates with a state that isn't in it are stored as
+    JSON. ``compression`` is None, ``'zlib'`` or ``'zstd'``.
+    """
+
+    def __init__(self, states: Sequence[str], format: str = 'binary',
+                 compression: str = None,
+                 threshold: int = COMPRESS_THRESHOLD):
+        if format not in ('binary', 'json'):
+            raise ValueError(f'unknown update format: {format!r}')
+        if compression not in (None, 'zlib', 'zstd'):
+            raise ValueError(f'unknown compression: {compression!r}')
+        if compression == 'zstd' and zstandard is None:
+            raise ValueError('zstd compression requires the zstandard '
+                             'package')
+
+        self.states = tuple(states)
+        self.format = format
+        self.compression = compression
+        self.threshold = threshold
+        self._state_ids = {state: i for i, state in enumerate(self.states)}
+
+    def encode(self, state: str, message: str,
+               time: datetime.datetime) -> bytes:
+        if self.format == 'json' or state not in self._state_ids:
+            return json.dumps((state, message, time.isoformat())).encode()
+
+        format, data = FORMAT_BINARY, message.encode()
+        if self.compression is not None and len(data) >= self.threshold:
+            if self.compression == 'zstd':
+                compressed = zstandard.ZstdCompressor().compress(data)
+                candidate = FORMAT_ZSTD
+            else:
+                compressed = zlib.compress(data)
+                candidate = FORMAT_ZLIB
+            if len(compressed) < len(data):
+                format, data = candidate, compressed
+
+        millis = (time - _EPOCH) // _MILLISECOND
+        return _HEADER.pack(format, self._state_ids[state], millis) + data
+
+    def decode(self, data: bytes) -> Update:
+        format = data[0]
+        if format == FORMAT_JSON:
+            state, message, time = json.loads(data)
+            return Update(state, message,
+                          datetime.datetime.fromisoformat(time))
+
+        _, state, millis = _HEADER.unpack_from(data)
+        message = data[_HEADER.size:]
+        if format == FORMAT_ZLIB:
+            message = zlib.decompress(message)
+        elif format == FORMAT_ZSTD:
+            if zstandard is None:
+                raise ValueError('decoding zstd compressed updates requires '
+                                 'the zstandard package')
+            message = zstandard.ZstdDecompressor().decompress(message)
+        elif format != FORMAT_BINARY:
+            raise ValueError(f'unknown update format: {format}')
+        return Update(self.states[state], message.decode(),
+                      _EPOCH + millis * _MILLISECOND)
+
+    def decode_state(self, data: bytes) -> str:
+        """Decodes only the state of an update, without its message."""
+        if data[0] == FORMAT_JSON:
+            return json.loads(data)[0]
+        return self.states[data[1]]
+
+    @staticmethod
+    def decode_time(data: bytes) -> datetime.datetime:
+        """Decodes only the time of an update."""
+        if data[0] == FORMAT_JSON:
+            return datetime.datetime.fromisoformat(json.loads(data)[2])
+        return _EPOCH + _HEADER.unpack_from(data)[2] * _MILLISECOND
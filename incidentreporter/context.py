@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import contextvars
+from typing import Optional, Set
+
+from . import schema
+from .storage import Storage
+
+
+class GuildContext:
+    """Snapshot of the guild settings most commands need.
+
+    Loaded in a single round trip for every command in a guild and attached
+    to its :class:`discord.ext.commands.Context` as ``guild_context``, so the
+    checks and the commands don't each read them on their own. Writes made
+    while handling the command aren't reflected. Commands in direct messages
+    get a context without a guild and with the default prefix.
+    """
+    __slots__ = ('guild_id', 'prefix', 'timezone', 'defaultchannel', 'ban',
+                 'reminderchannel', 'reminderafter', 'premium', 'staff')
+
+    def __init__(self, guild_id: Optional[int], prefix: str,
+                 timezone: float = 0, defaultchannel: int = None,
+                 ban: str = None, reminderchannel: int = None,
+                 reminderafter: float = None, premium: bool = False,
+                 staff: Set[int] = frozenset()):
+        self.guild_id = guild_id
+        self.prefix = prefix
+        # offset to UTC in seconds
+        self.timezone = timezone
+        self.defaultchannel = defaultchannel
+        self.ban = ban
+        # staff channel reminded of open incidents that weren't updated for
+        # reminderafter seconds, see incidentreporter.ext.reminders
+        self.reminderchannel = reminderchannel
+        self.reminderafter = reminderafter
+        self.premium = premium
+        # role ids
+        self.staff = staff
+
+    @classmethod
+    async def load(cls, storage: Storage, guild_id: int,
+                   default_prefix: str) -> GuildContext:
+        pipeline = storage.pipeline(transaction=False)
+        async with pipeline as pipe:
+            await schema.settings(pipe).copy()
+            await pipe.exists('premium')
+            await pipe.as_set('staff').copy()
+        settings, premium, staff = pipeline.results
+
+        (prefix, timezone, defaultchannel, ban, reminderchannel,
+         reminderafter) = [settings.get(x) for x in schema.SETTINGS_FIELDS]
+        return cls(
+            guild_id,
+            default_prefix if prefix is None else prefix.decode(),
+            timezone=0 if timezone is None else float(timezone),
+            defaultchannel=None if defaultchannel is None
+            else int(defaultchannel),
+            ban=None if ban is None else ban.decode(),
+            reminderchannel=None if reminderchannel is None
+            else int(reminderchannel),
+            reminderafter=None if reminderafter is None
+            else float(reminderafter),
+            premium=bool(premium),
+            staff={int(x) for x in staff}
+        )
+
+
+# the guild context of the command that is being handled, every message is
+# handled in its own task
+current = contextvars.ContextVar(
+    'guild_context', default=None
+)  # type: contextvars.ContextVar[Optional[GuildContext]]
@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class _Burst:
+    __slots__ = ('func', 'order', 'quiet_at', 'deadline', 'future',
+                 'flushed')
+
+    def __init__(self, deadline: float):
+        self.func = None  # type: Callable[[], Awaitable]
+        self.order = None
+        self.quiet_at = deadline
+        self.deadline = deadline
+        self.future = asyncio.get_event_loop().create_future()
+        self.flushed = asyncio.Event()
+
+
+class Debouncer:
+    """Coalesces bursts of calls per key, only running the latest one.
+
+    A scheduled call waits until no other call was scheduled for the same
+    key for ``delay`` seconds, but never longer than ``max_delay`` seconds
+    after the first call of the burst. Every caller of a burst gets the
+    result of the call that was run, which is the latest scheduled one, or
+    the one with the highest ``order`` if they were given one. The bursts
+    of a key run one after another, so an older call never finishes after a
+    newer one.
+
+        await debouncer.schedule(message_id, lambda: edit(message_id, embed))
+    """
+
+    def __init__(self, delay: float, max_delay: float):
+        self.delay = delay
+        self.max_delay = max_delay
+        self._bursts = {}  # type: Dict[Hashable, _Burst]
+        # key -> the future of the latest burst that has been started
+        self._running = {}  # type: Dict[Hashable, asyncio.Future]
+
+    def schedule(self, key: Hashable, func: Callable[[], Awaitable],
+                 order: Any = None) -> asyncio.Future:
+        loop = asyncio.get_event_loop()
+        burst = self._bursts.get(key)
+        if burst is None:
+            burst = self._bursts[key] = _Burst(loop.time() + self.max_delay)
+            loop.create_task(self._run(key, burst))
+        if order is None or burst.order is None or order >= burst.order:
+            burst.func = func
+            burst.order = order
+        burst.quiet_at = min(loop.time() + self.delay, burst.deadline)
+        # a caller being cancelled mustn't cancel the others
+        return asyncio.shield(burst.future)
+
+    def flush(self):
+        """Runs every scheduled call now."""
+        for burst in self._bursts.values():
+            burst.quiet_at = burst.deadline = 0
+            burst.flushed.set()
+
+    async def _run(self, key: Hashable, burst: _Burst):
+        loop = asyncio.get_event_loop()
+        try:
+            while loop.time() < burst.quiet_at:
+                try:
+                    await asyncio.wait_for(burst.flushed.wait(),
+                                           burst.quiet_at - loop.time())
+                except asyncio.TimeoutError:
+                    pass
+            # calls scheduled from now on start a new burst
+            del self._bursts[key]
+
+            previous = self._running.get(key)
+            self._running[key] = burst.future
+            if previous is not None and not previous.done():
+                await asyncio.wait([previous])
+
+            try:
+                result = await burst.func()  # type: Any
+            except Exception as e:
+                burst.future.set_exception(e)
+            else:
+                burst.future.set_result(result)
+        finally:
+            if self._bursts.get(key) is burst:
+                del self._bursts[key]
+            if self._running.get(key) is burst.future:
+                del self._running[key]
+            if not burst.future.done():
+                # cancelled while waiting or running, e.g. on shutdown, the
+                # callers mustn't wait forever
+                burst.future.cancel()
@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+import hashlib
+import json
+
+import discord
+
+from .storage import Storage, register_script
+
+
+# seconds the digest of the embed of an edited message is kept, the first
+# edit after that always goes through
+DIGEST_TTL = 24 * 60 * 60
+
+# KEYS = digest, ARGV = digest of the embed before the edit or '', digest
+# of the new embed, ttl, stores the digest of an edited embed unless the
+# message has been edited by someone else in the meantime, in which case
+# the digest is removed, returns whether it was stored
+register_script('edit_digest', """
+if (redis.call('GET', KEYS[1]) or '') == ARGV[1] then
+    redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+    return 1
+end
+redis.call('DEL', KEYS[1])
+return 0
+""")
+
+
+def digest(embed: dict) -> str:
+    return hashlib.blake2b(
+        json.dumps(embed, sort_keys=True, separators=(',', ':')).encode(),
+        digest_size=16
+    ).hexdigest()
+
+
+async def edit_message(storage: Storage, http: discord.http.HTTPClient,
+                       channel: int, message: int, embed: dict) -> bool:
+    """Edits the embed of a message unless it already is ``embed``, returns
+    whether it was edited.
+
+    The digest of the last embed is kept per message in redis rather than in
+    memory, as the messages mirrored into other guilds and the incidents of
+    scheduled maintenances are edited by whichever process gets to them. It
+    is only stored once the edit succeeded, a failed edit is retried by the
+    next one. Of two concurrent edits, which the message ends up with is
+    unknown, so the digest is removed instead.
+    """
+    key = f'edits:{message}'
+    new = digest(embed)
+    # a lagging replica could skip an edit the message needs
+    with Storage.read_your_writes(primary=True):
+        previous = await storage.get_str(key, default='')
+    if previous == new:
+        return False
+    await http.edit_message(channel, message, embed=embed)
+    await storage.script('edit_digest', [key], [previous, new, DIGEST_TTL])
+    return True
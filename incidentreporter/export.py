@@ -0,0 +1,134 @@
+"""Streaming export of the incident history of a guild.
+
+Every update of every incident becomes one row. The rows are produced by a
+pipeline of async generators,
+
+    rows(storage, codec) -> encode(rows, format) -> gzipped(chunks)
+
+which only ever hold a chunk of incidents and their updates, so exporting
+a guild with a long history takes as much memory as exporting a small one.
+The incidents are walked by id, a chunk of them and their first updates
+are read in one round trip, only incidents with more updates than that
+take more round trips.
+"""
+
+from __future__ import annotations
+
+import csv
+import datetime
+import io
+import json
+from typing import Any, AsyncIterator, BinaryIO, Dict, List
+import zlib
+
+from . import schema, timeline
+from .codec import UpdateCodec
+from .storage import CHUNK_SIZE, Storage
+
+
+FORMATS = ('jsonl', 'csv')
+COLUMNS = ('incident', 'channel', 'status', 'update', 'state', 'message',
+           'time')
+
+
+def _timelines(storage: Storage, incident: int) -> List[timeline.Timeline]:
+    # the archived updates come before the others, an incident only has
+    # updates in the timeline of its kind, the other one is empty
+    return [timeline.archive(storage, incident),
+            *[cls(storage, incident) for cls in timeline.TIMELINES.values()]]
+
+
+async def rows(storage: Storage, codec: UpdateCodec,
+               chunk_size: int = CHUNK_SIZE) -> AsyncIterator[Dict[str, Any]]:
+    """Yields the updates of the incidents of the guild ``storage`` belongs
+    to, oldest incident first."""
+    last = await storage.get_int('incidents', default=0)
+    for start in range(1, last + 1, chunk_size):
+        ids = range(start, min(start + chunk_size, last + 1))
+        pipeline = storage.pipeline(transaction=False)
+        async with pipeline as pipe:
+            for incident in ids:
+                await schema.incident(pipe, incident).get_many('channel',
+                                                               'status')
+                for updates in _timelines(pipe, incident):
+                    await updates.page(count=chunk_size)
+        results = iter(pipeline.results)
+
+        for incident, fields in zip(ids, results):
+            channel, status = [None if x is None else int(x)
+                               for x in fields]
+            number = 0
+            for updates in _timelines(storage, incident):
+                cursor, page = next(results)
+                while True:
+                    for update in page:
+                        number += 1
+                        state, message, time = codec.decode(update)
+                        yield {
+                            'incident': incident,
+                            'channel': channel,
+                            'status': status,
+                            'update': number,
+                            'state': state,
+                            'message': message,
+                            'time': time.replace(
+                                tzinfo=datetime.timezone.utc
+                            ).isoformat()
+                        }
+                    if cursor is None:
+                        break
+                    cursor, page = await updates.page(cursor, chunk_size)
+
+
+async def encode(rows: AsyncIterator[Dict[str, Any]],
+                 format: str) -> AsyncIterator[bytes]:
+    """Yields the rows as lines of JSON or CSV, with a header."""
+    if format == 'jsonl':
+        async for row in rows:
+            yield json.dumps(row, ensure_ascii=False).encode() + b'\n'
+        return
+
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, COLUMNS)
+    writer.writeheader()
+    yield buffer.getvalue().encode()
+    async for row in rows:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow(row)
+        yield buffer.getvalue().encode()
+
+
+async def gzipped(chunks: AsyncIterator[bytes],
+                  level: int = 6) -> AsyncIterator[bytes]:
+    # wbits 31 writes a gzip header and trailer instead of zlib's
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+async def export(storage: Storage, codec: UpdateCodec, fp: BinaryIO,
+                 format: str = 'jsonl', compress: bool = True,
+                 chunk_size: int = CHUNK_SIZE) -> int:
+    """Writes the incident history of a guild to ``fp``, gzipped if
+    ``compress`` is set, and returns the amount of updates written."""
+    if format not in FORMATS:
+        raise ValueError(f'unknown export format: {format!r}')
+
+    count = 0
+
+    async def counted():
+        nonlocal count
+        async for row in rows(storage, codec, chunk_size):
+            count += 1
+            yield row
+
+    chunks = encode(counted(), format)
+    if compress:
+        chunks = gzipped(chunks)
+    async for chunk in chunks:
+        fp.write(chunk)
+    return count
@@ -5,6 +5,7 @@ from typing import Optional
 import discord
 from discord.ext import commands
 
+from ..schema import settings
 from ..storage import Storage
 from ..util import is_staff
 
@@ -25,7 +26,7 @@ class Config(commands.Cog):
                 ))
             else:
                 stor = ctx.bot.get_storage(ctx.guild)
-                await stor.set('prefix', prefix)
+                await settings(stor).set('prefix', prefix)
                 await ctx.send(embed=discord.Embed(
                     description=f'Prefix updated :ok_hand:\n'
                                 f'It is now: {prefix}',
@@ -35,9 +36,9 @@ class Config(commands.Cog):
                     icon_url=ctx.author.avatar_url
                 ))
         else:
-            prefix = (await ctx.bot.get_command_prefix(ctx.bot, ctx.message))
             await ctx.send(embed=discord.Embed(
-                description=f'My current prefix is: {prefix[0]}',
+                description=f'My current prefix is: '
+                            f'{ctx.guild_context.prefix}',
                 color=ctx.bot.colorsg['info']
             ).set_footer(
                 text=f'Requested by {ctx.author}',
@@ -47,9 +48,8 @@ class Config(commands.Cog):
     @commands.command(help='Change the timezone displayed in incidents')
     @is_staff()
     async def timezone(self, ctx: commands.Context, tz: str = None):
-        storage = ctx.bot.get_storage(ctx.guild)  # type: Storage
         if tz is None:
-            offset = await storage.get_float('timezone', default=0)
+            offset = ctx.guild_context.timezone
             tzinfo = datetime.timezone(datetime.timedelta(seconds=offset))
             time = ctx.message.created_at.replace(tzinfo=tzinfo)
             str = time.strftime('UTC%z')
@@ -74,7 +74,8 @@ class Config(commands.Cog):
             ))
 
         offset = time.tzinfo.utcoffset(time).total_seconds()
-        await storage.set('timezone', offset)
+        storage = ctx.bot.get_storage(ctx.guild)  # type: Storage
+        await settings(storage).set('timezone', offset)
 
         str = time.strftime('UTC%z')
         return await ctx.send(embed=discord.Embed(
@@ -1,8 +1,44 @@
 
+import tempfile
+
 import discord
 from discord.ext import commands
 
+from .incidents import STALE
+from .maintenance import DUE, Maintenance
+from .. import export, schema
 from ..storage import Storage
+from ..util import is_staff
+
+
+async def delete_guild(storage: Storage, gstorage: Storage,
+                       guild: int) -> int:
+    """Deletes the keys of a guild and its entries in the sorted sets of all
+    guilds, returns the amount of deleted keys.
+
+    Only open incidents have reminders and only windows that haven't ended
+    are due, so the entries are found through the guild's indexes instead of
+    scanning the sets of all guilds.
+    """
+    pipeline = gstorage.pipeline(transaction=False)
+    async with pipeline as pipe:
+        await schema.incident_index(pipe, 'open').slice()
+        await Maintenance.scheduled(pipe).slice()
+    incidents, windows = pipeline.results
+
+    keys = [key async for key in gstorage.scan('*')]
+    async with storage.pipeline(transaction=False) as pipe:
+        if incidents:
+            await pipe.as_sorted_set(STALE).remove(
+                *[f'{guild}:{int(x)}' for x in incidents]
+            )
+        if windows:
+            await pipe.as_sorted_set(DUE).remove(
+                *[f'{guild}:{int(x)}' for x in windows]
+            )
+        if keys:
+            await pipe.delete(*keys)
+    return len(keys)
 
 
 class Data(commands.Cog):
@@ -26,18 +62,50 @@ class Data(commands.Cog):
                 )
             )
 
-        stor = ctx.bot.storage  # type: Storage
-
-        keys = []
-        async for key in stor.scan(f'guild:{ctx.guild.id}:*'):
-            keys.append(key)
-
-        if keys:
-            await stor.delete(*keys)
+        await delete_guild(ctx.bot.storage, ctx.bot.get_storage(ctx.guild),
+                           ctx.guild.id)
 
         await ctx.send('All data deleted, thanks for using me and bye :heart:')
         await ctx.guild.leave()
 
+    @commands.command(
+        help='Export the incident history of this guild as a gzipped JSONL '
+             'or CSV file',
+        name='data-export'
+    )
+    @is_staff()
+    @commands.cooldown(rate=1, per=60, type=commands.BucketType.guild)
+    async def data_export(self, ctx: commands.Context, format: str = 'jsonl'):
+        format = format.lower()
+        if format not in export.FORMATS:
+            return await ctx.send(embed=discord.Embed(
+                description=f'Format must either be `jsonl` or `csv`, not '
+                            f'{format!r}.',
+                color=ctx.bot.colorsg['failure']
+            ))
+
+        # the export is streamed into a file on disk instead of memory
+        codec = ctx.bot.get_cog('Incidents').codec
+        with tempfile.TemporaryFile() as fp:
+            async with ctx.typing():
+                count = await export.export(ctx.bot.get_storage(ctx.guild),
+                                            codec, fp, format)
+            if fp.tell() > ctx.guild.filesize_limit:
+                return await ctx.send(embed=discord.Embed(
+                    description='The export is too large to be uploaded, '
+                                'ask my owners for an export.',
+                    color=ctx.bot.colorsg['failure']
+                ))
+
+            fp.seek(0)
+            await ctx.send(
+                embed=discord.Embed(
+                    description=f'Exported **{count}** incident updates.',
+                    color=ctx.bot.colorsg['success']
+                ),
+                file=discord.File(fp, f'incidents-{ctx.guild.id}.{format}.gz')
+            )
+
 
 def setup(bot: commands.Bot):
     bot.add_cog(Data())
@@ -7,6 +7,7 @@ import discord
 from discord.ext import commands
 
 from ..bot import EXTENSIONS
+from ..schema import settings
 from ..storage import Storage
 
 
@@ -99,8 +100,8 @@ class Developer(commands.Cog):
     @commands.is_owner()
     async def dev_ban(self, ctx: commands.Context, guildid: int, *,
                       reason: str):
-        storage = ctx.bot.storage / 'guild' / guildid  # type: Storage
-        await storage.set('ban', reason)
+        storage = ctx.bot.get_storage(guildid)  # type: Storage
+        await settings(storage).set('ban', reason)
         await ctx.send(embed=discord.Embed(
             description='Guild has been banned from using the bot.',
             color=ctx.bot.colorsg['success']
@@ -109,8 +110,8 @@ class Developer(commands.Cog):
     @commands.command(help='Allows a server to use the bot again')
     @commands.is_owner()
     async def dev_unban(self, ctx: commands.Context, guildid: int):
-        storage = ctx.bot.storage / 'guild' / guildid  # type: Storage
-        await storage.delete('ban')
+        storage = ctx.bot.get_storage(guildid)  # type: Storage
+        await settings(storage).del_('ban')
         await ctx.send(embed=discord.Embed(
             description='Guild can now use the bot again.',
             color=ctx.bot.colorsg['success']
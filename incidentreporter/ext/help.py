@@ -74,7 +74,7 @@ class Help(commands.Cog):
     @commands.command(help='Getting started with incidents',
                       aliases=['getting-start', 'quickstart'])
     async def getting_started(self, ctx: commands.Context):
-        prefix = (await ctx.bot.get_command_prefix(ctx.bot, ctx.message))[0]
+        prefix = ctx.guild_context.prefix
         message = (
             f'Hey :wave:,\nthis is the quickstart guide for using me '
             f':slight_smile:\n\n'
@@ -95,6 +95,23 @@ class Help(commands.Cog):
             f'`{prefix}outage 42 Entire bot is restarting for fix`\n'
             f'`{prefix}resolve 42 The issue has been fixed and the bot is '
             f'operational. Thank you for your patience.`\n\n'
+            f'Several incidents can be updated at once, '
+            f'`{prefix}resolve 42,43 Fixed` or '
+            f'`{prefix}resolve all-open Fixed`.\n\n'
+            f'__Finding incidents__\n'
+            f'`{prefix}incidents` lists the open incidents, '
+            f'`{prefix}incidents all` every incident and '
+            f'`{prefix}incidents #status-update` the ones of a channel.\n'
+            f'`{prefix}history 42 2h` shows the updates of the last two hours '
+            f'of an incident.\n\n'
+            f'__Scheduling maintenance__\n'
+            f'`{prefix}maintenances schedule #status-update 2h 30m Database '
+            f'upgrade` creates a maintenance incident in two hours and '
+            f'resolves it 30 minutes later.\n\n'
+            f'`{prefix}reminders set #staff 2h` reminds you of open '
+            f'incidents that weren\'t updated for two hours.\n\n'
+            f'`{prefix}mirror add #status-mirror` posts every incident in '
+            f'another channel too, also of partner servers.\n\n'
             f'__Permissions__\n'
             f'You need the **manage server** permission to create and manage '
             f'incidents.'
@@ -1,21 +1,32 @@
 
+import asyncio
+from collections import OrderedDict
 import datetime
-import json
+import logging
 import typing as t
 
 import discord
 from discord.ext import commands
+import humanfriendly
 
-from ..storage import Storage
+from .. import dedup, schema, timeline
+from ..codec import COMPRESS_THRESHOLD, Update, UpdateCodec
+from ..debounce import Debouncer
+from ..storage import SortedSetView, Storage
 from ..util import has_premium, is_staff
 
 
+logger = logging.getLogger(__name__)
+
 STATE_OUTAGE = 'Outage'
 STATE_PARTIAL_OUTAGE = 'Partial Outage'
 STATE_MAINTENANCE = 'Maintenance'
 STATE_UPDATE = 'Update'
 STATE_RESOLVED = 'Resolved'
 STATE_OPERATIONAL = 'Operational'
+# the index of a state is stored in the updates, so only append to this
+STATES = (STATE_OUTAGE, STATE_PARTIAL_OUTAGE, STATE_MAINTENANCE, STATE_UPDATE,
+          STATE_RESOLVED, STATE_OPERATIONAL)
 
 EMOJIS = {
     STATE_OUTAGE: '<:outage:812640646937706547>',
@@ -32,116 +43,554 @@ COLORS = {
     STATE_RESOLVED: 0x00ff00,
     STATE_OPERATIONAL: 0x00ff00
 }
+# amount of incidents whose rendered updates are kept in memory
+RENDER_CACHE_SIZE = 1000
+# amount of incidents listed per page
+PAGE_SIZE = 10
+# amount of incidents updated by one command at most, and the amount of
+# their messages that are edited at once
+BULK_LIMIT = 50
+BULK_CONCURRENCY = 5
+# amount of channels an incident is mirrored into at most, and the amount
+# of its messages there that are sent or edited at once
+MIRROR_LIMIT = 500
+MIRROR_CONCURRENCY = 25
+# the open incidents of all guilds, as '{guild id}:{incident}' scored by
+# the time their staff is reminded of them
+STALE = 'incidents:stale'
+# older updates aren't shown in the incident message once its embed
+# description would be longer than this
+DESCRIPTION_LIMIT = 2048
+OMITTED_UPDATES = '*{} earlier updates*'
+
+
+def state_slug(state: str) -> str:
+    # 'Partial Outage' -> 'partial-outage'
+    return state.lower().replace(' ', '-').replace('_', '-')
+
+
+class RenderedIncident:
+    """The rendered updates of an incident, extended one at a time.
+
+    Valid as long as the incident has ``archived`` archived updates and
+    ``len(lines)`` other updates, its first other update is still ``first``
+    and the guild's timezone is still ``offset``.
+    """
+    __slots__ = ('offset', 'first', 'archived', 'lines', 'started', 'latest',
+                 'color')
+
+    def __init__(self, offset: float, first: bytes, archived: int = 0,
+                 started: datetime.datetime = None, state: str = None):
+        self.offset = offset
+        self.first = first
+        self.archived = archived
+        self.lines = []  # type: t.List[str]
+        self.started = started
+        self.latest = None  # type: t.Optional[Update]
+        # the colored updates may all be archived
+        self.color = COLORS.get(state, COLORS[STATE_OUTAGE])
+
+    def add(self, update: Update):
+        state, message, when = update
+        self.lines.append(
+            f'{EMOJIS[state]} **{state}**: {message}\n'
+            f'*{Incidents.format_time(when, self.offset)}*'
+        )
+        if self.started is None:
+            self.started = when
+        self.latest = update
+        if state in COLORS:
+            self.color = COLORS[state]
+
+    def description(self) -> str:
+        """The latest updates that fit into an embed, newest last."""
+        lines, length = [], len(OMITTED_UPDATES) + 10
+        for line in reversed(self.lines):
+            length += len(line) + 2
+            if length > DESCRIPTION_LIMIT:
+                break
+            lines.append(line)
+        if not lines:
+            # a single update that is too long
+            limit = DESCRIPTION_LIMIT - len(OMITTED_UPDATES) - 10
+            lines.append(self.lines[-1][:limit - 1] + '…')
+
+        omitted = self.archived + len(self.lines) - len(lines)
+        if omitted:
+            lines.append(OMITTED_UPDATES.format(omitted))
+        return '\n\n'.join(reversed(lines))
+
+
+class _Target:
+    # an incident that is being updated, see Incidents.update_incidents()
+    __slots__ = ('incident', 'channel', 'status', 'messageid', 'textid',
+                 'previous', 'kind', 'mirrors', 'rerender', 'count',
+                 'snapshot', 'first', 'archived', 'started', 'rendered')
+
+    def __init__(self, incident: int, channel: bytes, status: bytes,
+                 messageid: bytes, textid: bytes, previous: bytes,
+                 kind: bytes):
+        self.incident = incident
+        self.channel = None  # type: t.Optional[discord.TextChannel]
+        self.status = None if status is None else int(status)
+        self.messageid = None if messageid is None else int(messageid)
+        self.textid = None if textid is None else textid.decode()
+        self.previous = None if previous is None else previous.decode()
+        # of the timeline
+        self.kind = None if kind is None else kind.decode()
+        # channel id -> message id
+        self.mirrors = {}  # type: t.Dict[int, int]
+
+
+def _join(incidents: t.List[int]) -> str:
+    return ', '.join(f'#{x}' for x in incidents)
 
 
 class Incidents(commands.Cog):
+    def __init__(self, codec: UpdateCodec, edits: Debouncer, keep: int,
+                 kind: str = timeline.ListTimeline.kind):
+        self.codec = codec
+        # edits of incident messages, by message id
+        self.edits = edits
+        # amount of updates kept when compacting an incident, 0 disables it
+        self.keep = keep
+        # kind of the timelines of new incidents
+        self.kind = kind
+        # (guild id, incident) -> RenderedIncident
+        self.rendered = OrderedDict()  # type: OrderedDict
+
+    def cog_unload(self):
+        self.edits.flush()
+
+    def render(self, key: t.Tuple[int, int], offset: float, first: bytes,
+               count: int, update: bytes, updates: t.List[bytes] = None, *,
+               archived: int = 0, started: bytes = None,
+               state: str = None) -> t.Optional[RenderedIncident]:
+        """Renders an incident after ``update`` was appended as its
+        ``count``-th update that isn't archived.
+
+        Only the new update is rendered if the incident is cached, otherwise
+        all ``updates`` are, None means they still have to be fetched. The
+        archived updates are never rendered, ``started`` is the first one
+        and ``state`` the state of the incident.
+        """
+        rendered = self.rendered.pop(key, None)
+        if count == 1 and not archived:
+            rendered = RenderedIncident(offset, first)
+            updates = [update]
+        elif rendered is not None and rendered.offset == offset \
+                and rendered.first == first \
+                and rendered.archived == archived \
+                and len(rendered.lines) == count - 1:
+            updates = [update]
+        elif updates is None:
+            return None
+        else:
+            rendered = RenderedIncident(
+                offset, first, archived,
+                None if started is None else self.codec.decode(started).time,
+                state
+            )
+
+        for x in updates:
+            rendered.add(self.codec.decode(x))
+        self.rendered[key] = rendered
+        if len(self.rendered) > RENDER_CACHE_SIZE:
+            self.rendered.popitem(last=False)
+        return rendered
+
     async def update_incident(self, ctx: commands.Context, state: str,
                               incident: int, message: str):
+        await self.update_incidents(ctx, state, [incident], message)
+
+    async def update_incidents(self, ctx: commands.Context, state: str,
+                               incidents: t.List[int], message: str):
+        """Adds the same update to several incidents at once.
+
+        Nothing is updated unless all incidents exist. The records are read
+        in one round trip and the updates written in another, the incident
+        messages and their mirrors are edited concurrently and every linked
+        statusembed is only updated once.
+        """
         gstorage = ctx.bot.get_storage(ctx.guild)  # type: Storage
-        storage = gstorage / 'incident' / str(incident)
 
-        if not await storage.exists('channel'):
-            return await ctx.send(embed=discord.Embed(
-                description='No incident with that id exists.',
-                color=ctx.bot.colorsg['failure']
-            ))
+        pipeline = gstorage.pipeline(transaction=False)
+        async with pipeline as pipe:
+            await pipe.as_set('mirrors').copy()
+            for incident in incidents:
+                await schema.incident(pipe, incident).get_many(
+                    'channel', 'status', 'message', 'textid', 'state',
+                    'timeline'
+                )
+                await schema.incident_mirrors(pipe, incident).copy()
+        results = iter(pipeline.results)
+        mirrors = sorted(int(x) for x in next(results))
 
-        channel = ctx.guild.get_channel(await storage.get_int('channel'))
-        if channel is None:
+        targets, missing, gone = [], [], []
+        for incident, record, messages in zip(incidents, results, results):
+            if record[0] is None:
+                missing.append(incident)
+                continue
+            target = _Target(incident, *record)
+            target.mirrors = {int(k): int(v) for k, v in messages.items()}
+            target.channel = ctx.guild.get_channel(int(record[0]))
+            if target.channel is None:
+                gone.append(incident)
+                continue
+            # resolving a statusembed incident deletes its message instead
+            target.rerender = target.status is None \
+                or state != STATE_RESOLVED
+            targets.append(target)
+
+        if missing or gone:
+            errors = []
+            if len(incidents) == 1:
+                if missing:
+                    errors.append('No incident with that id exists.')
+                else:
+                    errors.append("The channel this incident belonged to, "
+                                  "doesn't exist anymore.")
+            else:
+                if missing:
+                    errors.append(f'No incidents with the ids '
+                                  f'{_join(missing)} exist.')
+                if gone:
+                    errors.append(f"The channels the incidents {_join(gone)} "
+                                  f"belonged to, don't exist anymore.")
             return await ctx.send(embed=discord.Embed(
-                description="The channel this incident belonged to, "
-                            "doesn't exist anymore.",
+                description='\n'.join(errors),
                 color=ctx.bot.colorsg['failure']
             ))
 
-        updates = storage.as_list('updates')
-        await updates.append(json.dumps(
-            (state, message, ctx.message.created_at.isoformat())
-        ))
+        # append the update, compact and index the updates and check
+        # whether the rendered updates are still valid in one round trip
+        when = ctx.message.created_at
+        update = self.codec.encode(state, message, when)
+        async with gstorage.pipeline() as pipe:
+            for x in targets:
+                updates = timeline.timeline(pipe, x.incident, x.kind)
+                x.count = await updates.append(update)
+                x.snapshot = await updates.compact(self.keep)
+                textids = [] if x.status is None \
+                    else [int(y) - 1 for y in x.textid.split(',')]
+                if x.rerender:
+                    x.first = await updates.first()
+                    if textids and state in COLORS:
+                        await schema.statusembed_state(pipe, x.status,
+                                                       x.incident, state,
+                                                       textids)
+                else:
+                    await schema.incident(pipe, x.incident).del_('channel')
+                    await schema.incident_mirrors(pipe, x.incident).clear()
+                    for textid in textids:
+                        await schema.statusembed_systems(
+                            pipe, x.status
+                        ).del_(textid)
+                    # linked by older versions
+                    await pipe.delete(*[f'statusembed:{x.status}:incident:'
+                                        f'{textid}' for textid in textids])
+                await self.index(pipe, x.incident, x.channel.id, x.previous,
+                                 state, when)
+        if ctx.guild_context.reminderafter:
+            await self.track(ctx.bot.storage, ctx.guild.id,
+                             [x.incident for x in targets], state, when,
+                             ctx.guild_context.reminderafter)
 
-        status = await storage.get_int('status')
-        if status is not None:
-            if state == STATE_RESOLVED:
-                messageid = await storage.get_int('message')
-                id = [int(x)
-                      for x in (await storage.get_str('textid')).split(',')]
-                await storage.delete('channel')
-                for textid in id:
-                    await gstorage.delete(
-                        f'statusembed:{status}:incident:{textid - 1}'
-                    )
-                await ctx.bot.get_cog('StatusEmbed').update_statusembed(
-                    ctx, status, incident=True
-                )
-                try:
-                    await ctx.bot.http.delete_message(channel.id, messageid)
-                except discord.NotFound:
-                    pass
-                await ctx.message.add_reaction('👍')
-                return
-            await ctx.bot.get_cog('StatusEmbed').update_statusembed(
-                ctx, status, incident=True
-            )
+        # discord api calls made at once
+        semaphore = asyncio.Semaphore(BULK_CONCURRENCY)
 
-        updates = [json.loads(x) for x in await updates.copy()]
-        message = '\n\n'.join([
-            f'{EMOJIS[state]} **{state}**: {message}\n'
-            f'*{await self.format_time(gstorage, when)}*'
-            for state, message, when in updates
+        async def bounded(coroutine: t.Awaitable):
+            async with semaphore:
+                return await coroutine
+
+        # the mirrors have their own limit, as there are many more of them
+        mirror_semaphore = asyncio.Semaphore(MIRROR_CONCURRENCY)
+
+        async def fanout(coroutine: t.Awaitable):
+            async with mirror_semaphore:
+                return await coroutine
+
+        # every statusembed once, the incidents linked to them are rendered
+        # there, along with the changes of other commands
+        statusembeds = sorted({x.status for x in targets
+                               if x.status is not None})
+        cog = ctx.bot.get_cog('StatusEmbed')
+        refreshed = asyncio.gather(*[cog.refresh(ctx, x)
+                                     for x in statusembeds])
+
+        async def delete(channel: int, message: int):
+            try:
+                await ctx.bot.http.delete_message(channel, message)
+            except discord.NotFound:
+                pass
+
+        unlinked = [x for x in targets if not x.rerender]
+        targets = [x for x in targets if x.rerender]
+        await asyncio.gather(*[
+            bounded(delete(x.channel.id, x.messageid)) for x in unlinked
+            if x.messageid is not None
+        ], *[
+            fanout(delete(channel, message)) for x in unlinked
+            for channel, message in x.mirrors.items()
         ])
 
-        resolved = updates[-1][0] == STATE_RESOLVED
+        offset = ctx.guild_context.timezone
+        outdated = []
+        for x in targets:
+            moved, x.archived, x.started = x.snapshot.result()
+            x.count = x.count.result() - moved
+            x.first = x.first.result()
+            x.rendered = self.render((ctx.guild.id, x.incident), offset,
+                                     x.first, x.count, update,
+                                     archived=x.archived)
+            if x.rendered is None:
+                outdated.append(x)
+
+        if outdated:
+            # not cached, or outdated, the updates that aren't archived are
+            # bounded by the compaction
+            pipeline = gstorage.pipeline(transaction=False)
+            async with pipeline as pipe:
+                for x in outdated:
+                    await timeline.timeline(pipe, x.incident, x.kind).copy()
+            for x, updates in zip(outdated, pipeline.results):
+                x.rendered = self.render(
+                    (ctx.guild.id, x.incident), offset, x.first, x.count,
+                    update, updates=updates, archived=x.archived,
+                    started=x.started,
+                    state=state if state in COLORS else x.previous
+                )
+
+        pingroles = None
+        if any(x.messageid is None for x in targets):
+            pingroles = [int(x) for x in await gstorage.as_set('ping').copy()]
+
+        async def publish(x: _Target):
+            embed = self.embed(x.incident, x.rendered)
+            if x.messageid is None:
+                content = None
+                if pingroles:
+                    content = 'New incident: ' \
+                              + ', '.join(f'<@&{role}>' for role in pingroles)
+
+                message = await bounded(x.channel.send(content=content,
+                                                       embed=embed))
+                await schema.incident(gstorage, x.incident).set('message',
+                                                                message.id)
+                return True
+
+            # we don't have access to the message object and fetching it
+            # would be an unneeded api call, so just use the discord.py's
+            # underlying http library, bursts of updates only edit the
+            # message once, and not at all if its embed stays the same
+            try:
+                await self.edits.schedule(
+                    x.messageid,
+                    lambda: bounded(dedup.edit_message(
+                        ctx.bot.storage, ctx.bot.http, x.channel.id,
+                        x.messageid, embed.to_dict()
+                    )),
+                    # a render with more updates is never replaced
+                    order=x.archived + x.count
+                )
+            except discord.NotFound:
+                # the message was deleted
+                return False
+            return True
+
+        async def mirror(x: _Target, embed: discord.Embed,
+                         channelid: int) -> t.Optional[int]:
+            # returns the id of the message in the channel, None if there's
+            # none, a failing channel doesn't affect the others
+            channel = ctx.bot.get_channel(channelid)
+            messageid = x.mirrors.get(channelid)
+            if channel is None:
+                # the bot left its guild, or it was deleted
+                return messageid
+            try:
+                if messageid is None:
+                    message = await fanout(channel.send(embed=embed))
+                    return message.id
+                await self.edits.schedule(
+                    messageid,
+                    lambda: fanout(dedup.edit_message(
+                        ctx.bot.storage, ctx.bot.http, channelid, messageid,
+                        embed.to_dict()
+                    )),
+                    order=x.archived + x.count
+                )
+            except discord.NotFound:
+                # deleted, the next update sends a new one
+                return None
+            except discord.HTTPException:
+                logger.warning('mirroring incident %d of guild %d into %d '
+                               'failed', x.incident, ctx.guild.id, channelid,
+                               exc_info=True)
+            return messageid
+
+        async def publish_mirrors(x: _Target):
+            embed = self.embed(x.incident, x.rendered)
+            channels = [c for c in mirrors if c != x.channel.id]
+            messages = await asyncio.gather(*[
+                mirror(x, embed, channel) for channel in channels
+            ])
+            return {channel: message
+                    for channel, message in zip(channels, messages)
+                    if message != x.mirrors.get(channel)}
+
+        published, changed, _ = await asyncio.gather(
+            asyncio.gather(*[publish(x) for x in targets]),
+            asyncio.gather(*[publish_mirrors(x) for x in targets]),
+            refreshed
+        )
+        if any(changed):
+            async with gstorage.pipeline(transaction=False) as pipe:
+                for x, messages in zip(targets, changed):
+                    view = schema.incident_mirrors(pipe, x.incident)
+                    sent = {k: v for k, v in messages.items()
+                            if v is not None}
+                    if sent:
+                        await view.update(sent)
+                    for channel in messages.keys() - sent.keys():
+                        await view.del_(channel)
+
+        deleted = [x.incident for x, ok in zip(targets, published) if not ok]
+        if deleted:
+            description = 'My incident message has been deleted.'
+            if len(incidents) > 1:
+                description = f'My messages of the incidents ' \
+                              f'{_join(deleted)} have been deleted.'
+            await ctx.send(embed=discord.Embed(
+                description=description,
+                color=ctx.bot.colorsg['failure']
+            ))
+        if unlinked or len(deleted) < len(targets):
+            # we were successful
+            await ctx.message.add_reaction('👍')
+
+    @staticmethod
+    def embed(incident: int, rendered: RenderedIncident) -> discord.Embed:
+        resolved = rendered.latest.state == STATE_RESOLVED
         title = ':hammer_pick: ' + (
             'Resolved incident' if resolved else 'Ongoing incident'
         )
-        color = COLORS[STATE_OUTAGE]
-        for state, _, _ in updates[::-1]:
-            if state in COLORS:
-                color = COLORS[state]
-                break
-        embed = discord.Embed(
+        return discord.Embed(
             title=title,
-            description=message,
-            color=color,
-            timestamp=datetime.datetime.fromisoformat(
-                updates[-1][2] if resolved else updates[0][2]
-            )
+            description=rendered.description(),
+            color=rendered.color,
+            timestamp=rendered.latest.time if resolved else rendered.started
         ).set_footer(text=f'Incident #{incident} | ' + (
             'Incident resolved at ' if resolved else
             'Incident started at '
         ))
 
-        messageid = await storage.get_int('message')
-        if messageid is None:
-            content = None
-            pingroles = [int(x) async for x in gstorage.as_set('ping')]
-            if pingroles:
-                content = 'New incident: ' \
-                          + ', '.join(f'<@&{x}>' for x in pingroles)
+    @staticmethod
+    async def index(storage: Storage, incident: int, channel: int,
+                    previous: t.Optional[str], state: str,
+                    time: datetime.datetime):
+        """Updates the indexes of an incident that got an update.
+
+        ``previous`` is the current state of the incident before the update,
+        updates without a color don't change it.
+        """
+        score = time.replace(tzinfo=datetime.timezone.utc).timestamp()
+        await schema.incident_index(storage, 'updated').add(incident, score)
+        await schema.incident_index(storage, f'channel:{channel}').add(
+            incident, score
+        )
 
-            message = await channel.send(content=content, embed=embed)
-            await storage.set('message', message.id)
+        opened = schema.incident_index(storage, 'open')
+        if state == STATE_RESOLVED:
+            await opened.remove(incident)
         else:
-            # we don't have access to the message object and fetching it
-            # would be an unneeded api call, so just use the discord.py's
-            # underlying http library
-            try:
-                await ctx.bot.http.edit_message(channel.id, messageid,
-                                                embed=embed.to_dict())
-            except discord.NotFound:
-                # the message was deleted
-                return await ctx.send(embed=discord.Embed(
-                    description='My incident message has been deleted.',
-                    color=ctx.bot.colorsg['failure']
-                ))
+            # a reopened incident is open since now
+            await opened.add(incident, score, only_if_nonexistent=True)
+
+        current = state if state in COLORS else previous
+        if current is None:
+            return
+        if current != previous:
+            await schema.incident(storage, incident).set('state', current)
+            if previous is not None:
+                await schema.incident_index(
+                    storage, f'state:{state_slug(previous)}'
+                ).remove(incident)
+        await schema.incident_index(
+            storage, f'state:{state_slug(current)}'
+        ).add(incident, score)
+
+    @staticmethod
+    async def backfill(codec: UpdateCodec, storage: Storage,
+                       incident: int) -> bool:
+        """Indexes an incident that wasn't updated since the indexes were
+        introduced from its updates, see :meth:`index`, returns whether it
+        was indexed.
+
+        Used by :class:`~incidentreporter.schema.Migrator`, incidents that
+        were indexed in the meantime are left alone.
+        """
+        pipeline = storage.pipeline(transaction=False)
+        async with pipeline as pipe:
+            await schema.incident(pipe, incident).get_many(
+                'channel', 'state', 'timeline'
+            )
+            await schema.incident_index(pipe, 'updated').score(incident)
+            await timeline.archive(pipe, incident).copy()
+        (channel, state, kind), updated, archived = pipeline.results
+        if channel is None or state is not None or updated is not None:
+            return False
+        updates = archived + await timeline.timeline(
+            storage, incident, kind and kind.decode()
+        ).copy()
+        if not updates:
+            return False
+
+        states = [codec.decode_state(x) for x in updates]
+        scores = [codec.decode_time(x).replace(
+            tzinfo=datetime.timezone.utc
+        ).timestamp() for x in updates]
+        current = next((x for x in reversed(states) if x in COLORS), None)
+        channel = int(channel)
+        async with storage.pipeline(transaction=False) as pipe:
+            # only_if_nonexistent, as the incident may get an update now
+            for name in ('updated', f'channel:{channel}'):
+                await schema.incident_index(pipe, name).add(
+                    incident, scores[-1], only_if_nonexistent=True
+                )
+            if states[-1] != STATE_RESOLVED:
+                # open since the first update after it was last resolved
+                start = max((i + 1 for i, x in enumerate(states)
+                             if x == STATE_RESOLVED), default=0)
+                await schema.incident_index(pipe, 'open').add(
+                    incident, scores[start], only_if_nonexistent=True
+                )
+            if current is not None:
+                await schema.incident(pipe, incident).set('state', current)
+                await schema.incident_index(
+                    pipe, f'state:{state_slug(current)}'
+                ).add(incident, scores[-1], only_if_nonexistent=True)
+        return True
 
-        # we were successful
-        await ctx.message.add_reaction('👍')
+    @staticmethod
+    async def track(storage: Storage, guild: int, incidents: t.List[int],
+                    state: str, time: datetime.datetime, after: float):
+        """Schedules the reminders of incidents that got an update, see
+        :mod:`incidentreporter.ext.reminders`.
+
+        The incidents of all guilds are in one sorted set, ``storage`` isn't
+        the storage of a guild.
+        """
+        due = time.replace(tzinfo=datetime.timezone.utc).timestamp() + after
+        async with storage.pipeline(transaction=False) as pipe:
+            stale = pipe.as_sorted_set(STALE)
+            for incident in incidents:
+                if state == STATE_RESOLVED:
+                    await stale.remove(f'{guild}:{incident}')
+                else:
+                    await stale.add(f'{guild}:{incident}', due)
 
     @staticmethod
-    async def format_time(storage: Storage, time: str):
-        time = datetime.datetime.fromisoformat(time)
-        offset = await storage.get_float('timezone', default=0)
+    def format_time(time: datetime.datetime, offset: float):
         tzinfo = datetime.timezone(datetime.timedelta(seconds=offset))
 
         format = '%Y-%m-%d %H:%M:%S (UTC%z)'
@@ -157,12 +606,9 @@ class Incidents(commands.Cog):
     @is_staff()
     async def default(self, ctx: commands.Context, state: str, *,
                       message: str):
-        storage = ctx.bot.get_storage(ctx.guild)  # type: Storage
-
-        channelid = await storage.get_int('defaultchannel')
+        channelid = ctx.guild_context.defaultchannel
         if channelid is None:
-            prefix = (await ctx.bot.get_command_prefix(ctx.bot,
-                                                       ctx.message))[0]
+            prefix = ctx.guild_context.prefix
             return await ctx.send(embed=discord.Embed(
                 description=(
                     f"You haven't send any default channel, use "
@@ -173,8 +619,7 @@ class Incidents(commands.Cog):
 
         channel = ctx.guild.get_channel(channelid)
         if channel is None:
-            prefix = (await ctx.bot.get_command_prefix(ctx.bot,
-                                                       ctx.message))[0]
+            prefix = ctx.guild_context.prefix
             return await ctx.send(embed=discord.Embed(
                 description=(
                     f"The default channel no longer exists, use "
@@ -189,10 +634,8 @@ class Incidents(commands.Cog):
     @is_staff()
     async def setdefault(self, ctx: commands.Context,
                          channel: discord.TextChannel = None):
-        storage = ctx.bot.get_storage(ctx.guild)  # type: Storage
-
         if channel is None:
-            channelid = await storage.get_int('defaultchannel')
+            channelid = ctx.guild_context.defaultchannel
             if channelid is None:
                 return await ctx.send(embed=discord.Embed(
                     description='No default channel set.',
@@ -203,8 +646,9 @@ class Incidents(commands.Cog):
                 color=ctx.bot.colorsg['success']
             ))
 
-        await storage.set('defaultchannel', channel.id)
-        prefix = (await ctx.bot.get_command_prefix(ctx.bot, ctx.message))[0]
+        storage = ctx.bot.get_storage(ctx.guild)  # type: Storage
+        await schema.settings(storage).set('defaultchannel', channel.id)
+        prefix = ctx.guild_context.prefix
         return await ctx.send(embed=discord.Embed(
             description=(
                 f'The default channel has been set to {channel.mention}!\n\n'
@@ -217,10 +661,12 @@ class Incidents(commands.Cog):
                 self, ctx: commands.Context, channel: discord.TextChannel,
                 state: str, message: str, *,
                 status: int = None, textid: t.List[int] = None
-            ):
+            ) -> t.Optional[int]:
+        """Creates an incident and returns its id, None if it couldn't be
+        created, which has been reported."""
         perms = channel.permissions_for(ctx.guild.me)
         if not perms.send_messages:
-            return await ctx.send(embed=discord.Embed(
+            await ctx.send(embed=discord.Embed(
                 description=(
                     f"I'm missing the **send messages** permission "
                     f"in {channel.mention}.\n"
@@ -228,8 +674,9 @@ class Incidents(commands.Cog):
                 ),
                 color=ctx.bot.colorsg['failure']
             ))
+            return None
         if not perms.embed_links:
-            return await ctx.send(embed=discord.Embed(
+            await ctx.send(embed=discord.Embed(
                 description=(
                     f"I'm missing the **embed links** permission "
                     f"in {channel.mention}.\n"
@@ -237,12 +684,12 @@ class Incidents(commands.Cog):
                 ),
                 color=ctx.bot.colorsg['failure']
             ))
+            return None
 
         allowed_states = STATE_OUTAGE, STATE_PARTIAL_OUTAGE, STATE_MAINTENANCE
         if state not in allowed_states:
-            prefix = (await ctx.bot.get_command_prefix(ctx.bot,
-                                                       ctx.message))[0]
-            return await ctx.send(embed=discord.Embed(
+            prefix = ctx.guild_context.prefix
+            await ctx.send(embed=discord.Embed(
                 description=(
                     f'State must either be in {allowed_states!r}, '
                     f'not {state!r}. '
@@ -255,20 +702,27 @@ class Incidents(commands.Cog):
                 ),
                 color=ctx.bot.colorsg['failure']
             ))
+            return None
 
         storage = ctx.bot.get_storage(ctx.guild)  # type: Storage
         incident = await storage.increment('incidents')
-        await storage.set(f'incident:{incident}:channel', channel.id)
-        if status is not None:
-            await storage.set(f'incident:{incident}:status', status)
-            await storage.set(f'incident:{incident}:textid',
-                              ','.join(map(str, textid)))
-            for x in textid:
-                await storage.set(f'statusembed:{status}:incident:{x - 1}',
-                                  incident)
+        fields = {'channel': channel.id}
+        if self.kind != timeline.ListTimeline.kind:
+            # incidents without one have a list
+            fields['timeline'] = self.kind
+        if status is None:
+            await schema.incident(storage, incident).update(fields)
+        else:
+            fields['status'] = status
+            fields['textid'] = ','.join(map(str, textid))
+            async with storage.pipeline() as pipe:
+                await schema.incident(pipe, incident).update(fields)
+                await schema.statusembed_systems(pipe, status).update({
+                    x - 1: f'{incident}:{state}' for x in textid
+                })
         await self.update_incident(ctx, state, incident, message)
 
-        prefix = (await ctx.bot.get_command_prefix(ctx.bot, ctx.message))[0]
+        prefix = ctx.guild_context.prefix
         await ctx.send(embed=discord.Embed(
             title=f'Incident {incident} created!',
             description=(
@@ -279,39 +733,247 @@ class Incidents(commands.Cog):
             ),
             color=ctx.bot.colorsg['success']
         ))
+        return incident
 
-    @commands.command(help='Add an outage update to an incident')
+    async def parse_incidents(self, ctx: commands.Context,
+                              argument: str) -> t.Optional[t.List[int]]:
+        """Parses ``12``, ``12,13,14`` or ``all-open``, None if the argument
+        is invalid, which has been reported."""
+        if argument.lower() == 'all-open':
+            gstorage = ctx.bot.get_storage(ctx.guild)  # type: Storage
+            incidents = sorted(int(x) for x in await schema.incident_index(
+                gstorage, 'open'
+            ).slice())
+            if not incidents:
+                await ctx.send(embed=discord.Embed(
+                    description='There are no open incidents.',
+                    color=ctx.bot.colorsg['failure']
+                ))
+                return None
+        else:
+            try:
+                # without duplicates, in the given order
+                incidents = list(dict.fromkeys(
+                    int(x) for x in argument.split(',') if x
+                ))
+            except ValueError:
+                incidents = []
+            if not incidents:
+                prefix = f'{ctx.prefix}{ctx.invoked_with}'
+                await ctx.send(embed=discord.Embed(
+                    description=(
+                        f'Not an incident id, list of incident ids or '
+                        f'`all-open`.\n\n'
+                        f'- `{prefix} 12 <message>`\n'
+                        f'- `{prefix} 12,13,14 <message>`\n'
+                        f'- `{prefix} all-open <message>`'
+                    ),
+                    color=ctx.bot.colorsg['failure']
+                ))
+                return None
+
+        if len(incidents) > BULK_LIMIT:
+            await ctx.send(embed=discord.Embed(
+                description=f'At most {BULK_LIMIT} incidents can be updated '
+                            f'at once.',
+                color=ctx.bot.colorsg['failure']
+            ))
+            return None
+        return incidents
+
+    @commands.command(help='Add an outage update to incidents')
     @is_staff()
-    async def outage(self, ctx: commands.Context, incident: int, *,
+    async def outage(self, ctx: commands.Context, incident: str, *,
                      message: str):
-        await self.update_incident(ctx, STATE_OUTAGE, incident, message)
+        incidents = await self.parse_incidents(ctx, incident)
+        if incidents is not None:
+            await self.update_incidents(ctx, STATE_OUTAGE, incidents,
+                                        message)
 
     @commands.command(name='partial-outage',
                       aliases=['partial', 'partialoutage'],
-                      help='Add a partial outage update to an incident')
+                      help='Add a partial outage update to incidents')
     @is_staff()
-    async def partial_outage(self, ctx: commands.Context, incident: int, *,
+    async def partial_outage(self, ctx: commands.Context, incident: str, *,
                              message: str):
-        await self.update_incident(ctx, STATE_PARTIAL_OUTAGE, incident,
-                                   message)
+        incidents = await self.parse_incidents(ctx, incident)
+        if incidents is not None:
+            await self.update_incidents(ctx, STATE_PARTIAL_OUTAGE, incidents,
+                                        message)
 
-    @commands.command(help='Add a maintenance update to an incident')
+    @commands.command(help='Add a maintenance update to incidents')
     @is_staff()
-    async def maintenance(self, ctx: commands.Context, incident: int, *,
+    async def maintenance(self, ctx: commands.Context, incident: str, *,
                           message: str):
-        await self.update_incident(ctx, STATE_MAINTENANCE, incident, message)
+        incidents = await self.parse_incidents(ctx, incident)
+        if incidents is not None:
+            await self.update_incidents(ctx, STATE_MAINTENANCE, incidents,
+                                        message)
 
-    @commands.command(help='Add an update to an incident')
+    @commands.command(help='Add an update to incidents')
     @is_staff()
-    async def update(self, ctx: commands.Context, incident: int, *,
+    async def update(self, ctx: commands.Context, incident: str, *,
                      message: str):
-        await self.update_incident(ctx, STATE_UPDATE, incident, message)
+        incidents = await self.parse_incidents(ctx, incident)
+        if incidents is not None:
+            await self.update_incidents(ctx, STATE_UPDATE, incidents,
+                                        message)
 
-    @commands.command(help='Resolve an incident')
+    @commands.command(help='Resolve incidents')
     @is_staff()
-    async def resolve(self, ctx: commands.Context, incident: int, *,
+    async def resolve(self, ctx: commands.Context, incident: str, *,
                       message: str):
-        await self.update_incident(ctx, STATE_RESOLVED, incident, message)
+        incidents = await self.parse_incidents(ctx, incident)
+        if incidents is not None:
+            await self.update_incidents(ctx, STATE_RESOLVED, incidents,
+                                        message)
+
+    @commands.command(help='List the open incidents, all incidents or the '
+                           'incidents of a channel or state')
+    @is_staff()
+    async def incidents(self, ctx: commands.Context, filter: str = 'open',
+                        page: int = 1):
+        states = {state_slug(x): x for x in COLORS}
+        slug = state_slug(filter)
+        if slug == 'open':
+            name, title = 'open', 'Open incidents'
+        elif slug == 'all':
+            name, title = 'updated', 'Incidents'
+        elif slug in states:
+            name, title = f'state:{slug}', f'{states[slug]} incidents'
+        else:
+            try:
+                channel = await commands.TextChannelConverter().convert(
+                    ctx, filter
+                )
+            except commands.BadArgument:
+                prefix = f'{ctx.prefix}incidents'
+                return await ctx.send(embed=discord.Embed(
+                    description=(
+                        f'Filter must either be `open`, `all`, a channel or '
+                        f'a state, not {filter!r}.\n\n'
+                        f'- `{prefix} open`\n'
+                        f'- `{prefix} all 2`\n'
+                        f'- `{prefix} #status-updates`\n'
+                        f'- `{prefix} partial-outage`'
+                    ),
+                    color=ctx.bot.colorsg['failure']
+                ))
+            name = f'channel:{channel.id}'
+            title = f'Incidents in #{channel.name}'
+
+        # a page is read from the index in one round trip and the incidents
+        # on it in another, however many incidents the guild has
+        gstorage = ctx.bot.get_storage(ctx.guild)  # type: Storage
+        start = (max(page, 1) - 1) * PAGE_SIZE
+        pipeline = gstorage.pipeline(transaction=False)
+        async with pipeline as pipe:
+            index = schema.incident_index(pipe, name)  # type: SortedSetView
+            await index.len()
+            await index.slice(start, start + PAGE_SIZE, desc=True,
+                              withscores=True)
+        total, entries = pipeline.results
+
+        pipeline = gstorage.pipeline(transaction=False)
+        async with pipeline as pipe:
+            for incident, _ in entries:
+                await schema.incident(pipe, int(incident)).get_many(
+                    'channel', 'state'
+                )
+
+        lines = []
+        offset = ctx.guild_context.timezone
+        for (incident, score), (channelid, state) in zip(entries,
+                                                         pipeline.results):
+            line = f'**#{int(incident)}**'
+            if state is not None:
+                state = state.decode()
+                line += f' {EMOJIS[state]} {state}'
+            if channelid is not None:
+                line += f' in <#{int(channelid)}>'
+            when = self.format_time(
+                datetime.datetime.utcfromtimestamp(score), offset
+            )
+            line += f'\n*{"Started" if name == "open" else "Updated"} {when}*'
+            lines.append(line)
+
+        pages = max(-(-total // PAGE_SIZE), 1)
+        return await ctx.send(embed=discord.Embed(
+            title=title,
+            description='\n\n'.join(lines) or 'No incidents found.',
+            color=ctx.bot.colorsg['success']
+        ).set_footer(text=f'Page {max(page, 1)}/{pages} | {total} total'))
+
+    @staticmethod
+    def parse_since(argument: str, now: datetime.datetime,
+                    offset: float) -> t.Optional[datetime.datetime]:
+        # a timespan before now like 2h, or a time like 2021-03-01T14:00 in
+        # the guild's timezone, as naive utc like the times of the updates
+        try:
+            return now - datetime.timedelta(
+                seconds=humanfriendly.parse_timespan(argument)
+            )
+        except humanfriendly.InvalidTimespan:
+            pass
+        try:
+            when = datetime.datetime.fromisoformat(argument)
+        except ValueError:
+            return None
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=datetime.timezone(
+                datetime.timedelta(seconds=offset)
+            ))
+        return when.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+
+    @commands.command(help='Show the updates of an incident in a time window')
+    @is_staff()
+    async def history(self, ctx: commands.Context, incident: int, since: str,
+                      until: str = None):
+        now = ctx.message.created_at
+        offset = ctx.guild_context.timezone
+        start = self.parse_since(since, now, offset)
+        end = now if until is None else self.parse_since(until, now, offset)
+        if start is None or end is None or start > end:
+            prefix = f'{ctx.prefix}history {incident}'
+            return await ctx.send(embed=discord.Embed(
+                description=(
+                    f'The window must start and end either a time span ago '
+                    f'or at a time in your timezone, and end after it '
+                    f'starts.\n\n'
+                    f'- `{prefix} 1h`\n'
+                    f'- `{prefix} 2021-03-01T14:00 2021-03-01T15:00`'
+                ),
+                color=ctx.bot.colorsg['failure']
+            ))
+
+        gstorage = ctx.bot.get_storage(ctx.guild)  # type: Storage
+        channelid, kind = await schema.incident(gstorage, incident).get_many(
+            'channel', 'timeline'
+        )
+        if channelid is None:
+            return await ctx.send(embed=discord.Embed(
+                description='No incident with that id exists.',
+                color=ctx.bot.colorsg['failure']
+            ))
+
+        # streams read the window only, lists from their end back to it,
+        # the archive holds the updates before the timeline
+        updates = [
+            *await timeline.archive(gstorage, incident).between(start, end),
+            *await timeline.timeline(
+                gstorage, incident, None if kind is None else kind.decode()
+            ).between(start, end)
+        ]
+        rendered = RenderedIncident(offset, None)
+        for update in updates:
+            rendered.add(self.codec.decode(update))
+        await ctx.send(embed=discord.Embed(
+            title=f'Incident {incident}',
+            description=rendered.description() if updates
+            else 'No updates in that time window.',
+            color=rendered.color
+        ).set_footer(text=f'{self.format_time(start, offset)} - '
+                          f'{self.format_time(end, offset)}'))
 
     @commands.command(help='Create an incident tied to a statusembed')
     @is_staff()
@@ -348,7 +1010,11 @@ class Incidents(commands.Cog):
                 color=ctx.bot.colorsg['failure']
             ))
 
-        if any([await storage.exists(f'incident:{x - 1}') for x in textid]):
+        systems = await schema.statusembed_systems(gstorage, id).copy()
+        if b'migrated' not in systems:
+            systems = await schema.migrate_statusembed(gstorage, id,
+                                                       await texts.len())
+        if any(str(x - 1).encode() in systems for x in textid):
             return await ctx.send(embed=discord.Embed(
                 description='There already is an ongoing issue with that '
                             'system.',
@@ -363,4 +1029,21 @@ class Incidents(commands.Cog):
 
 
 def setup(bot: commands.Bot):
-    bot.add_cog(Incidents())
+    compression = bot.config.get('updates', 'compression', fallback='zlib')
+    codec = UpdateCodec(
+        STATES,
+        format=bot.config.get('updates', 'format', fallback='binary'),
+        compression=None if compression == 'none' else compression,
+        threshold=bot.config.getint('updates', 'compress above',
+                                    fallback=COMPRESS_THRESHOLD)
+    )
+    edits = Debouncer(
+        bot.config.getfloat('edits', 'debounce', fallback=1),
+        bot.config.getfloat('edits', 'max delay', fallback=5)
+    )
+    keep = bot.config.getint('updates', 'keep', fallback=0)
+    kind = bot.config.get('updates', 'timeline',
+                          fallback=timeline.ListTimeline.kind)
+    if kind not in timeline.TIMELINES:
+        raise ValueError(f'unknown timeline: {kind!r}')
+    bot.add_cog(Incidents(codec, edits, keep, kind))
@@ -0,0 +1,303 @@
+import datetime
+import logging
+import time
+import typing as t
+
+import discord
+from discord.ext import commands
+import humanfriendly
+
+from .incidents import Incidents, STATE_MAINTENANCE, STATE_RESOLVED
+from .. import schema
+from ..context import GuildContext
+from ..scheduler import Scheduler
+from ..storage import DictView, SortedSetView, Storage
+from ..util import is_staff
+
+
+logger = logging.getLogger(__name__)
+# the windows of all guilds, as '{guild id}:{window}' scored by the time
+# they start, or end once they've started
+DUE = 'maintenance:due'
+# fields of guild:{id}:maintenance:{window}, start and end are unix times
+WINDOW_FIELDS = ('channel', 'start', 'end', 'message', 'incident')
+# amount of windows a guild can have scheduled at once
+WINDOW_LIMIT = 25
+RESOLVED_MESSAGE = 'The scheduled maintenance has ended.'
+
+
+class _ScheduledMessage:
+    # the message of a _ScheduledContext
+
+    def __init__(self):
+        self.created_at = datetime.datetime.utcnow()
+
+    async def add_reaction(self, emoji: str):
+        pass
+
+
+class _ScheduledContext:
+    """Stands in for the context of a command when the scheduler creates or
+    resolves an incident, replies are logged instead of sent."""
+
+    def __init__(self, bot: commands.Bot, guild: discord.Guild,
+                 guild_context: GuildContext):
+        self.bot = bot
+        self.guild = guild
+        self.guild_context = guild_context
+        self.message = _ScheduledMessage()
+
+    async def send(self, content: str = None, *, embed: discord.Embed = None):
+        if embed is not None:
+            content = embed.description
+        logger.info('scheduled maintenance in guild %d: %s', self.guild.id,
+                    content)
+
+
+class Maintenance(commands.Cog):
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        self.scheduler = Scheduler(bot.storage, DUE, self.run)
+        self.scheduler.start()
+
+    def cog_unload(self):
+        self.scheduler.stop()
+
+    @staticmethod
+    def window(storage: Storage, window: int) -> DictView:
+        return storage.as_dict(f'maintenance:{window}')
+
+    @staticmethod
+    def scheduled(storage: Storage) -> SortedSetView:
+        # the windows of a guild that haven't ended, by start
+        return storage.as_sorted_set('maintenances:scheduled')
+
+    async def run(self, job: str) -> t.Optional[float]:
+        """Opens or resolves the incident of a window, see
+        :class:`Scheduler`."""
+        guild_id, window = map(int, job.split(':'))
+        # the window may just have been written by another process, which
+        # a lagging replica wouldn't have yet, so like a command after its
+        # first write, see IncidentReporterBot.invoke(), the job only reads
+        # from the primary
+        with Storage.read_your_writes(primary=True):
+            gstorage = self.bot.get_storage(guild_id)  # type: Storage
+            channelid, _, end, message, incident = await self.window(
+                gstorage, window
+            ).get_many(*WINDOW_FIELDS)
+            if channelid is None:
+                # cancelled
+                await self.remove(gstorage, window)
+                return None
+            guild = self.bot.get_guild(guild_id)
+            if guild is None:
+                # unavailable for now, or the bot left the guild
+                due = self.scheduler.retry(job)
+                if due is None:
+                    await self.remove(gstorage, window)
+                return due
+
+            context = _ScheduledContext(
+                self.bot, guild, await GuildContext.load(
+                    gstorage, guild_id, self.bot.default_prefix
+                )
+            )
+            cog = self.bot.get_cog('Incidents')  # type: Incidents
+            return await self._run(context, cog, gstorage, window,
+                                   int(channelid), float(end), message,
+                                   incident)
+
+    async def _run(self, ctx: _ScheduledContext, cog: Incidents,
+                   gstorage: Storage, window: int, channelid: int,
+                   end: float, message: bytes,
+                   incident: t.Optional[bytes]) -> t.Optional[float]:
+        if incident is None:
+            channel = ctx.guild.get_channel(channelid)
+            if channel is None or time.time() >= end:
+                # the channel is gone, or the bot was offline during the
+                # whole window
+                logger.info('skipped maintenance %d of guild %d', window,
+                            ctx.guild.id)
+                await self.remove(gstorage, window)
+                return None
+
+            incident = await cog.create_new(ctx, channel, STATE_MAINTENANCE,
+                                            message.decode())
+            if incident is None:
+                await self.remove(gstorage, window)
+                return None
+            await self.window(gstorage, window).set('incident', incident)
+            return end
+
+        state = await schema.incident(gstorage, int(incident)).get_str(
+            'state'
+        )
+        if state is not None and state != STATE_RESOLVED:
+            await cog.update_incident(ctx, STATE_RESOLVED, int(incident),
+                                      RESOLVED_MESSAGE)
+        await self.remove(gstorage, window)
+        return None
+
+    async def remove(self, gstorage: Storage, window: int):
+        async with gstorage.pipeline() as pipe:
+            await self.window(pipe, window).clear()
+            await self.scheduled(pipe).remove(window)
+
+    @staticmethod
+    def parse_time(argument: str, now: datetime.datetime,
+                   offset: float) -> t.Optional[datetime.datetime]:
+        # a timespan from now like 2h, or a time like 2021-03-01T18:00 in
+        # the guild's timezone
+        try:
+            return now + datetime.timedelta(
+                seconds=humanfriendly.parse_timespan(argument)
+            )
+        except humanfriendly.InvalidTimespan:
+            pass
+        try:
+            when = datetime.datetime.fromisoformat(argument)
+        except ValueError:
+            return None
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=datetime.timezone(
+                datetime.timedelta(seconds=offset)
+            ))
+        return when
+
+    @commands.group(help='Schedule maintenance')
+    @is_staff()
+    async def maintenances(self, ctx: commands.Context):
+        if ctx.subcommand_passed is None:
+            prefix = ctx.guild_context.prefix
+            await ctx.send(embed=discord.Embed(
+                description=(
+                    f'Subcommand is missing.\n\n'
+                    f'- `{prefix}maintenances schedule #channel <start> '
+                    f'<duration> <message>`\n'
+                    f'- `{prefix}maintenances list`\n'
+                    f'- `{prefix}maintenances cancel <id>`'
+                ),
+                color=ctx.bot.colorsg['failure']
+            ))
+
+    @maintenances.command()
+    @is_staff()
+    async def schedule(self, ctx: commands.Context,
+                       channel: discord.TextChannel, start: str,
+                       duration: str, *, message: str):
+        now = ctx.message.created_at.replace(tzinfo=datetime.timezone.utc)
+        starts = self.parse_time(start, now, ctx.guild_context.timezone)
+        try:
+            length = humanfriendly.parse_timespan(duration)
+        except humanfriendly.InvalidTimespan:
+            length = 0
+        if starts is None or starts <= now or length <= 0:
+            prefix = f'{ctx.prefix}maintenances schedule {channel.mention}'
+            return await ctx.send(embed=discord.Embed(
+                description=(
+                    f'The maintenance must start in the future, either '
+                    f'after a time span or at a time in your timezone, '
+                    f'and last for a time span.\n\n'
+                    f'- `{prefix} 2h 30m Database upgrade`\n'
+                    f'- `{prefix} 2021-03-01T18:00 1h Database upgrade`'
+                ),
+                color=ctx.bot.colorsg['failure']
+            ))
+
+        gstorage = ctx.bot.get_storage(ctx.guild)  # type: Storage
+        if await self.scheduled(gstorage).len() >= WINDOW_LIMIT:
+            return await ctx.send(embed=discord.Embed(
+                description=f'At most {WINDOW_LIMIT} maintenances can be '
+                            f'scheduled at once.',
+                color=ctx.bot.colorsg['failure']
+            ))
+
+        window = await gstorage.increment('maintenances')
+        start, end = starts.timestamp(), starts.timestamp() + length
+        async with gstorage.pipeline() as pipe:
+            await self.window(pipe, window).update({
+                'channel': channel.id, 'start': start, 'end': end,
+                'message': message
+            })
+            await self.scheduled(pipe).add(window, start)
+        await self.scheduler.schedule(f'{ctx.guild.id}:{window}', start)
+
+        offset = ctx.guild_context.timezone
+        prefix = ctx.guild_context.prefix
+        await ctx.send(embed=discord.Embed(
+            title=f'Maintenance {window} scheduled!',
+            description=(
+                f'A maintenance incident will be created in '
+                f'{channel.mention} at '
+                f'{Incidents.format_time(starts, offset)} and resolved '
+                f'after {humanfriendly.format_timespan(length)}.\n\n'
+                f'- `{prefix}maintenances list`\n'
+                f'- `{prefix}maintenances cancel {window}`'
+            ),
+            color=ctx.bot.colorsg['success']
+        ))
+
+    @maintenances.command(name='list')
+    @is_staff()
+    async def list_(self, ctx: commands.Context):
+        gstorage = ctx.bot.get_storage(ctx.guild)  # type: Storage
+        windows = [int(x) for x in await self.scheduled(gstorage).slice()]
+        pipeline = gstorage.pipeline(transaction=False)
+        async with pipeline as pipe:
+            for window in windows:
+                await self.window(pipe, window).get_many(*WINDOW_FIELDS)
+
+        lines = []
+        offset = ctx.guild_context.timezone
+        for window, (channelid, start, end, message, incident) in zip(
+                    windows, pipeline.results
+                ):
+            if channelid is None:
+                continue
+            start, end = [
+                Incidents.format_time(datetime.datetime.fromtimestamp(
+                    float(x), datetime.timezone.utc
+                ), offset) for x in (start, end)
+            ]
+            line = f'**#{window}** in <#{int(channelid)}>'
+            if incident is not None:
+                line += f', incident #{int(incident)}'
+            lines.append(f'{line}\n*{start} - {end}*\n{message.decode()}')
+
+        await ctx.send(embed=discord.Embed(
+            title='Scheduled maintenances',
+            description='\n\n'.join(lines) or 'No maintenance scheduled.',
+            color=ctx.bot.colorsg['success']
+        ))
+
+    @maintenances.command()
+    @is_staff()
+    async def cancel(self, ctx: commands.Context, id: int):
+        gstorage = ctx.bot.get_storage(ctx.guild)  # type: Storage
+        channelid, incident = await self.window(gstorage, id).get_many(
+            'channel', 'incident'
+        )
+        if channelid is None:
+            return await ctx.send(embed=discord.Embed(
+                description='No scheduled maintenance with that id exists.',
+                color=ctx.bot.colorsg['failure']
+            ))
+
+        await self.scheduler.cancel(f'{ctx.guild.id}:{id}')
+        await self.remove(gstorage, id)
+        description = 'Maintenance cancelled!'
+        if incident is not None:
+            prefix = ctx.guild_context.prefix
+            description += (
+                f'\n\nIts incident is still open, use '
+                f'`{prefix}resolve {int(incident)} <message>` to '
+                f'resolve it.'
+            )
+        await ctx.send(embed=discord.Embed(
+            description=description,
+            color=ctx.bot.colorsg['success']
+        ))
+
+
+def setup(bot: commands.Bot):
+    bot.add_cog(Maintenance(bot))
@@ -0,0 +1,146 @@
+import re
+import typing as t
+
+import discord
+from discord.ext import commands
+
+from .incidents import MIRROR_LIMIT
+from ..storage import Storage
+from ..util import is_staff
+
+
+# a channel mention or id
+CHANNEL = re.compile(r'<#(\d+)>|(\d+)')
+
+
+class Mirrors(commands.Cog):
+    """Mirrors the incidents of a guild into more channels, of this guild or
+    of partner guilds, see :meth:`Incidents.update_incidents`."""
+
+    @staticmethod
+    def resolve(ctx: commands.Context,
+                argument: str) -> t.Optional[discord.TextChannel]:
+        match = CHANNEL.fullmatch(argument)
+        if match is None:
+            return None
+        channel = ctx.bot.get_channel(int(match.group(1) or match.group(2)))
+        if not isinstance(channel, discord.TextChannel):
+            return None
+        return channel
+
+    @commands.group(help='Mirror incidents into more channels')
+    @is_staff()
+    async def mirror(self, ctx: commands.Context):
+        if ctx.subcommand_passed is None:
+            prefix = ctx.guild_context.prefix
+            await ctx.send(embed=discord.Embed(
+                description=(
+                    f'Subcommand is missing.\n\n'
+                    f'- `{prefix}mirror add <channel or channel id>`\n'
+                    f'- `{prefix}mirror remove <channel or channel id>`\n'
+                    f'- `{prefix}mirror list`'
+                ),
+                color=ctx.bot.colorsg['failure']
+            ))
+
+    @mirror.command()
+    @is_staff()
+    async def add(self, ctx: commands.Context, channel: str):
+        destination = self.resolve(ctx, channel)
+        if destination is None:
+            return await ctx.send(embed=discord.Embed(
+                description=f"I can't find a channel {channel!r}, mention "
+                            f"it or use its id if it's in another server.",
+                color=ctx.bot.colorsg['failure']
+            ))
+
+        if destination.guild != ctx.guild:
+            # only the staff of the other guild may mirror into it
+            try:
+                member = await destination.guild.fetch_member(ctx.author.id)
+            except discord.HTTPException:
+                # not a member, or the bot can't tell
+                member = None
+            if member is None or not member.guild_permissions.manage_guild:
+                return await ctx.send(embed=discord.Embed(
+                    description=(
+                        f'You need the **Manage Server** permission in '
+                        f'{destination.guild.name} to mirror incidents '
+                        f'into it.'
+                    ),
+                    color=ctx.bot.colorsg['failure']
+                ))
+
+        perms = destination.permissions_for(destination.guild.me)
+        if not perms.send_messages or not perms.embed_links:
+            return await ctx.send(embed=discord.Embed(
+                description=(
+                    f"I'm missing the **send messages** or **embed links** "
+                    f"permission in {destination.mention}.\n"
+                    f"Correct my permissions and try again!"
+                ),
+                color=ctx.bot.colorsg['failure']
+            ))
+
+        gstorage = ctx.bot.get_storage(ctx.guild)  # type: Storage
+        mirrors = gstorage.as_set('mirrors')
+        if await mirrors.len() >= MIRROR_LIMIT:
+            return await ctx.send(embed=discord.Embed(
+                description=f'Incidents can be mirrored into at most '
+                            f'{MIRROR_LIMIT} channels.',
+                color=ctx.bot.colorsg['failure']
+            ))
+        await mirrors.add(destination.id)
+
+        await ctx.send(embed=discord.Embed(
+            description=(
+                f'Incidents are now mirrored into {destination.mention} '
+                f'({destination.guild.name}), starting with their next '
+                f'update.'
+            ),
+            color=ctx.bot.colorsg['success']
+        ))
+
+    @mirror.command()
+    @is_staff()
+    async def remove(self, ctx: commands.Context, channel: str):
+        match = CHANNEL.fullmatch(channel)
+        gstorage = ctx.bot.get_storage(ctx.guild)  # type: Storage
+        mirrors = gstorage.as_set('mirrors')
+        channelid = None if match is None \
+            else int(match.group(1) or match.group(2))
+        if channelid is None or not await mirrors.contains(channelid):
+            return await ctx.send(embed=discord.Embed(
+                description='Incidents aren\'t mirrored into that channel.',
+                color=ctx.bot.colorsg['failure']
+            ))
+        await mirrors.remove(channelid)
+
+        await ctx.send(embed=discord.Embed(
+            description='Incidents aren\'t mirrored into that channel '
+                        'anymore, the messages already sent stay.',
+            color=ctx.bot.colorsg['success']
+        ))
+
+    @mirror.command(name='list')
+    @is_staff()
+    async def list_(self, ctx: commands.Context):
+        gstorage = ctx.bot.get_storage(ctx.guild)  # type: Storage
+        lines = []
+        for channelid in sorted(int(x) for x in
+                                await gstorage.as_set('mirrors').copy()):
+            channel = ctx.bot.get_channel(channelid)
+            if channel is None:
+                lines.append(f'`{channelid}` *(not found)*')
+            else:
+                lines.append(f'{channel.mention} ({channel.guild.name})')
+
+        await ctx.send(embed=discord.Embed(
+            title='Mirrors',
+            description='\n'.join(lines) or 'Incidents aren\'t mirrored.',
+            color=ctx.bot.colorsg['success']
+        ))
+
+
+def setup(bot: commands.Bot):
+    bot.add_cog(Mirrors())
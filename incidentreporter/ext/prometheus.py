@@ -6,15 +6,23 @@ from wsgiref.simple_server import make_server
 import discord
 from discord.ext import commands
 
-from prometheus_client import CollectorRegistry, make_wsgi_app, Counter, Gauge
+from prometheus_client import (
+    CollectorRegistry, make_wsgi_app, Counter, Gauge, Histogram
+)
 from prometheus_client.exposition import (
     ThreadingWSGIServer, _SilentHandler as SilentHandler
 )
 
 
+# storage round trips are mostly sub-millisecond
+STORAGE_BUCKETS = (.0002, .0005, .001, .0025, .005, .01, .025, .05, .1, .25,
+                   .5, 1)
+
+
 # noinspection PyUnusedLocal
 class Prometheus(commands.Cog):
     def __init__(self, bot: commands.Bot, registry):
+        self.bot = bot
         self.pr_messages = Counter(
             'incidentreporter_messages', 'Total messages', registry=registry
         )
@@ -30,6 +38,33 @@ class Prometheus(commands.Cog):
         )
         self.pr_guilds.set_function(lambda: len(bot.guilds))
 
+        if bot.cache is not None:
+            for stat in bot.cache.stats():
+                Gauge(
+                    f'incidentreporter_cache_{stat}', f'Storage cache {stat}',
+                    registry=registry
+                ).set_function(lambda stat=stat: bot.cache.stats()[stat])
+
+        self.pr_storage_commands = Counter(
+            'incidentreporter_storage_commands', 'Storage commands sent',
+            ['command', 'key'], registry=registry
+        )
+        self.pr_storage_seconds = Histogram(
+            'incidentreporter_storage_seconds', 'Storage round trip latency',
+            ['command', 'key'], buckets=STORAGE_BUCKETS, registry=registry
+        )
+        bot.storage.observe(self.observe_storage)
+
+    def cog_unload(self):
+        self.bot.storage.unobserve(self.observe_storage)
+
+    def observe_storage(self, command: str, key: str,
+                        seconds: t.Optional[float]):
+        # pipelined commands have no duration of their own
+        self.pr_storage_commands.labels(command, key).inc()
+        if seconds is not None:
+            self.pr_storage_seconds.labels(command, key).observe(seconds)
+
     @commands.Cog.listener()
     async def on_message(self, message: discord.Message):
         self.pr_messages.inc()
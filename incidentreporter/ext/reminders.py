@@ -0,0 +1,182 @@
+import time
+import typing as t
+
+import discord
+from discord.ext import commands
+import humanfriendly
+
+from .incidents import EMOJIS, STALE
+from .. import schema
+from ..context import GuildContext
+from ..scheduler import Scheduler
+from ..storage import Storage
+from ..util import is_staff
+
+
+# incidents are never reminded of more often
+MIN_REMINDER_AFTER = 10 * 60
+
+
+class Reminders(commands.Cog):
+    """Reminds the staff of open incidents that weren't updated for a while.
+
+    Every update of an incident of a guild with reminders moves the
+    incident to the time it's reminded of in one sorted set of all guilds,
+    see :meth:`Incidents.track`. The scheduler sleeps until the earliest
+    reminder is due and reads all due ones with a single range query, so
+    neither the guilds nor their incidents are scanned.
+    """
+
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        self.scheduler = Scheduler(bot.storage, STALE, self.remind)
+        self.scheduler.start()
+
+    def cog_unload(self):
+        self.scheduler.stop()
+
+    async def remind(self, job: str) -> t.Optional[float]:
+        """Reminds the staff of an incident that's due, see
+        :class:`Scheduler`."""
+        guild_id, incident = map(int, job.split(':'))
+        guild = self.bot.get_guild(guild_id)
+        if guild is None:
+            # unavailable for now, or the bot left the guild
+            return self.scheduler.retry(job)
+        gstorage = self.bot.get_storage(guild_id)  # type: Storage
+        guild_context = await GuildContext.load(gstorage, guild_id,
+                                                self.bot.default_prefix)
+        after = guild_context.reminderafter
+        channel = guild.get_channel(guild_context.reminderchannel)
+        if not after or channel is None:
+            # reminders have been turned off
+            return None
+
+        pipeline = gstorage.pipeline(transaction=False)
+        async with pipeline as pipe:
+            await schema.incident(pipe, incident).get_many('channel', 'state')
+            await schema.incident_index(pipe, 'open').score(incident)
+            await schema.incident_index(pipe, 'updated').score(incident)
+        (channelid, state), opened, updated = pipeline.results
+        if channelid is None or opened is None or updated is None:
+            # resolved or deleted
+            return None
+
+        now = time.time()
+        if updated + after > now:
+            return updated + after
+
+        prefix = guild_context.prefix
+        line = f'**#{incident}**'
+        if state is not None:
+            state = state.decode()
+            line += f' {EMOJIS[state]} {state}'
+        await channel.send(embed=discord.Embed(
+            title=f'Incident {incident} needs an update',
+            description=(
+                f'{line} in <#{int(channelid)}> has not been updated for '
+                f'**{humanfriendly.format_timespan(now - updated)}**.\n\n'
+                f'- `{prefix}update {incident} <message>`\n'
+                f'- `{prefix}resolve {incident} <message>`'
+            ),
+            color=self.bot.colorsg['warning']
+        ))
+        return now + after
+
+    @commands.group(help='Remind the staff of incidents without updates')
+    @is_staff()
+    async def reminders(self, ctx: commands.Context):
+        if ctx.subcommand_passed is not None:
+            return
+        prefix = ctx.guild_context.prefix
+        channelid = ctx.guild_context.reminderchannel
+        after = ctx.guild_context.reminderafter
+        status = 'Reminders are off.'
+        if after:
+            status = (f'Open incidents are reminded of in <#{channelid}> '
+                      f'after **{humanfriendly.format_timespan(after)}** '
+                      f'without an update.')
+        await ctx.send(embed=discord.Embed(
+            description=(
+                f'{status}\n\n'
+                f'- `{prefix}reminders set #staff 2h`\n'
+                f'- `{prefix}reminders off`'
+            ),
+            color=ctx.bot.colorsg['info']
+        ))
+
+    @reminders.command(name='set')
+    @is_staff()
+    async def set_(self, ctx: commands.Context,
+                   channel: discord.TextChannel, after: str):
+        try:
+            seconds = humanfriendly.parse_timespan(after)
+        except humanfriendly.InvalidTimespan:
+            seconds = 0
+        if seconds < MIN_REMINDER_AFTER:
+            minimum = humanfriendly.format_timespan(MIN_REMINDER_AFTER)
+            return await ctx.send(embed=discord.Embed(
+                description=(
+                    f'Reminders must be sent after a time span of at least '
+                    f'{minimum}, not {after!r}.\n\n'
+                    f'- `{ctx.prefix}reminders set {channel.mention} 2h`'
+                ),
+                color=ctx.bot.colorsg['failure']
+            ))
+
+        perms = channel.permissions_for(ctx.guild.me)
+        if not perms.send_messages or not perms.embed_links:
+            return await ctx.send(embed=discord.Embed(
+                description=(
+                    f"I'm missing the **send messages** or **embed links** "
+                    f"permission in {channel.mention}.\n"
+                    f"Correct my permissions and try again!"
+                ),
+                color=ctx.bot.colorsg['failure']
+            ))
+
+        gstorage = ctx.bot.get_storage(ctx.guild)  # type: Storage
+        await schema.settings(gstorage).update({
+            'reminderchannel': channel.id, 'reminderafter': seconds
+        })
+
+        # the incidents that are already open, later ones are scheduled
+        # when they are updated
+        opened = [int(x) for x in await schema.incident_index(
+            gstorage, 'open'
+        ).slice()]
+        pipeline = gstorage.pipeline(transaction=False)
+        async with pipeline as pipe:
+            for incident in opened:
+                await schema.incident_index(pipe, 'updated').score(incident)
+        async with ctx.bot.storage.pipeline(transaction=False) as pipe:
+            stale = pipe.as_sorted_set(STALE)
+            for incident, updated in zip(opened, pipeline.results):
+                if updated is not None:
+                    await stale.add(f'{ctx.guild.id}:{incident}',
+                                    updated + seconds)
+
+        await ctx.send(embed=discord.Embed(
+            description=(
+                f'Open incidents are now reminded of in {channel.mention} '
+                f'after **{humanfriendly.format_timespan(seconds)}** '
+                f'without an update.'
+            ),
+            color=ctx.bot.colorsg['success']
+        ))
+
+    @reminders.command()
+    @is_staff()
+    async def off(self, ctx: commands.Context):
+        gstorage = ctx.bot.get_storage(ctx.guild)  # type: Storage
+        # the scheduled reminders are dropped once they're due
+        await schema.settings(gstorage).del_('reminderchannel',
+                                             'reminderafter')
+        await ctx.send(embed=discord.Embed(
+            description='Reminders are off.',
+            color=ctx.bot.colorsg['success']
+        ))
+
+
+def setup(bot: commands.Bot):
+    bot.add_cog(Reminders(bot))
@@ -1,5 +1,5 @@
-
-import json
+import asyncio
+import typing as t
 
 import discord
 from discord.ext import commands
@@ -9,27 +9,71 @@ from .incidents import (
     STATE_OPERATIONAL, STATE_OUTAGE, STATE_PARTIAL_OUTAGE, STATE_MAINTENANCE,
     STATE_RESOLVED
 )
+from .. import dedup, schema, timeline
+from ..codec import UpdateCodec
+from ..debounce import Debouncer
 from ..storage import Storage
 from ..util import has_premium
 
 
 ORDER = (STATE_OUTAGE, STATE_PARTIAL_OUTAGE, STATE_MAINTENANCE, STATE_RESOLVED)
+# amount of updates fetched per incident for finding its current state
+TAIL = 5
 
 
 class StatusEmbed(commands.Cog):
+    def __init__(self, refreshes: Debouncer):
+        # debounces the refreshes of statusembeds, by guild and statusembed
+        # id, see refresh()
+        self.refreshes = refreshes
+
+    def cog_unload(self):
+        self.refreshes.flush()
+
+    def refresh(self, ctx: commands.Context, id: int) -> asyncio.Future:
+        """Updates a statusembed after it or an incident linked to it
+        changed, the result is None if it was updated.
+
+        Changes to several of its incidents at once only render and edit it
+        once, with the state at that time, so it always ends up showing the
+        latest one. Its edits never overlap, which keeps the digest of its
+        embed in sync with the message, see :func:`dedup.edit_message`.
+        """
+        return self.refreshes.schedule(
+            (ctx.guild.id, id),
+            lambda: self.update_statusembed(ctx, id, incident=True)
+        )
+
+    @staticmethod
+    def latest_state(codec: UpdateCodec,
+                     updates: t.Iterable[bytes]) -> t.Optional[str]:
+        # updates are newest first
+        for update in updates:
+            state = codec.decode_state(update)
+            if state in COLORS:
+                return state
+
     @staticmethod
     async def update_statusembed(ctx: commands.Context, id: int,
                                  incident: bool = False):
         gstorage = ctx.bot.get_storage(ctx.guild)  # type: Storage
-        storage = gstorage / 'statusembed' / str(id)
 
-        if not await storage.exists('channel'):
+        # the states of the linked systems are kept up to date by the
+        # incidents, see Incidents.update_incidents()
+        pipeline = gstorage.pipeline(transaction=False)
+        async with pipeline as pipe:
+            storage = pipe / 'statusembed' / str(id)
+            await storage.get_many('channel', 'message')
+            await storage.as_list('text').copy()
+            await schema.statusembed_systems(pipe, id).copy()
+        (channelid, messageid), texts, linked = pipeline.results
+        if channelid is None:
             return await ctx.send(embed=discord.Embed(
                 description='No statusembed with that id exists.',
                 color=ctx.bot.colorsg['failure']
             ))
 
-        channel = ctx.guild.get_channel(await storage.get_int('channel'))
+        channel = ctx.guild.get_channel(int(channelid))
         if channel is None:
             return await ctx.send(embed=discord.Embed(
                 description="The channel this incident belonged to, "
@@ -37,13 +81,31 @@ class StatusEmbed(commands.Cog):
                 color=ctx.bot.colorsg['failure']
             ))
 
-        texts = await storage.as_list('text').copy()
-        incidents = {}
-        for textid, _ in enumerate(texts):
-            if await storage.exists(f'incident:{textid}'):
-                incidents[textid] = await storage.get_int(
-                    f'incident:{textid}'
-                )
+        if texts and b'migrated' not in linked:
+            linked = await schema.migrate_statusembed(gstorage, id,
+                                                       len(texts))
+        incidents, states = {}, {}
+        for textid, system in linked.items():
+            if textid == b'migrated' or int(textid) >= len(texts):
+                continue
+            incidentid, _, state = system.decode().partition(':')
+            incidents[int(textid)] = int(incidentid)
+            if state:
+                states[int(textid)] = state
+
+        # only systems that were linked by older versions miss their state,
+        # the latest coloured state is almost always one of the last
+        # updates, so only those are fetched for every such incident, from
+        # the timelines of both kinds as only one of them has updates
+        tails = {}
+        async with gstorage.pipeline(transaction=False) as pipe:
+            for textid, incidentid in incidents.items():
+                if textid in states:
+                    continue
+                tails[textid] = [
+                    await cls(pipe, incidentid).tail(TAIL)
+                    for cls in timeline.TIMELINES.values()
+                ]
 
         message = f'{EMOJIS[STATE_OPERATIONAL]} __All systems operational__'
         color = COLORS[STATE_OPERATIONAL]
@@ -60,17 +122,32 @@ class StatusEmbed(commands.Cog):
                       f'__Several systems experience downtime__'
             color = COLORS[STATE_PARTIAL_OUTAGE]
 
+        codec = ctx.bot.get_cog('Incidents').codec  # type: UpdateCodec
         systems = []
         for textid, text in enumerate(texts):
-            if textid in incidents:
-                updates = gstorage / 'incident' / incidents[textid]
-                updates = [json.loads(x)
-                           async for x in updates.as_list('updates')]
-                for state, _, _ in updates[::-1]:
-                    if state in COLORS:
-                        systems.append(f'{EMOJIS[state]} **{state}**: '
-                                       f'{text.decode()}')
-                        break
+            if textid in states:
+                systems.append(f'{EMOJIS[states[textid]]} '
+                               f'**{states[textid]}**: {text.decode()}')
+            elif textid in incidents:
+                state = StatusEmbed.latest_state(codec, [
+                    x for tail in tails[textid] for x in tail.result()[::-1]
+                ])
+                if state is None:
+                    for cls in timeline.TIMELINES.values():
+                        updates = await cls(gstorage,
+                                            incidents[textid]).copy()
+                        state = StatusEmbed.latest_state(codec,
+                                                         updates[::-1])
+                        if updates:
+                            break
+                if state is None:
+                    # the colored updates have been archived
+                    state = await schema.incident(
+                        gstorage, incidents[textid]
+                    ).get_str('state')
+                if state is not None:
+                    systems.append(f'{EMOJIS[state]} **{state}**: '
+                                   f'{text.decode()}')
             else:
                 systems.append(
                     f'{EMOJIS[STATE_OPERATIONAL]} **{STATE_OPERATIONAL}**: '
@@ -81,10 +158,10 @@ class StatusEmbed(commands.Cog):
             description=message + '\n\n' + '\n'.join(systems),
             color=color
         )
-        messageid = await storage.get_int('message')
         try:
-            await ctx.bot.http.edit_message(channel.id, messageid,
-                                            embed=embed.to_dict())
+            await dedup.edit_message(ctx.bot.storage, ctx.bot.http,
+                                     channel.id, int(messageid),
+                                     embed.to_dict())
         except discord.NotFound:
             # the message was deleted
             return await ctx.send(embed=discord.Embed(
@@ -100,8 +177,7 @@ class StatusEmbed(commands.Cog):
     @has_premium()
     async def statusembed(self, ctx: commands.Context):
         if ctx.subcommand_passed is None:
-            prefix = (await ctx.bot.get_command_prefix(ctx.bot,
-                                                       ctx.message))[0]
+            prefix = ctx.guild_context.prefix
             await ctx.send(embed=discord.Embed(
                 description=(
                     f'Subcommand is missing.\n\n'
@@ -148,7 +224,7 @@ class StatusEmbed(commands.Cog):
         ))
         await storage.set('message', message.id)
 
-        prefix = (await ctx.bot.get_command_prefix(ctx.bot, ctx.message))[0]
+        prefix = ctx.guild_context.prefix
         await ctx.send(embed=discord.Embed(
             title=f'Statusembed {id} created!',
             description=(
@@ -174,7 +250,8 @@ class StatusEmbed(commands.Cog):
         texts = storage.as_list('text')
         await texts.append(text)
 
-        await self.update_statusembed(ctx, id)
+        if await self.refresh(ctx, id) is None:
+            await ctx.message.add_reaction('👍')
 
     @statusembed.command()
     @commands.has_permissions(manage_guild=True)
@@ -189,14 +266,14 @@ class StatusEmbed(commands.Cog):
             ))
 
         texts = storage.as_list('text')
-        if textid <= 0 or textid > await texts.len():
+        if textid <= 0 or not await texts.del_(textid - 1):
             return await ctx.send(embed=discord.Embed(
                 description='Invalid text id.',
                 color=ctx.bot.colorsg['failure']
             ))
-        await texts.del_(textid - 1)
 
-        await self.update_statusembed(ctx, id)
+        if await self.refresh(ctx, id) is None:
+            await ctx.message.add_reaction('👍')
 
     @statusembed.command()
     @commands.has_permissions(manage_guild=True)
@@ -217,7 +294,7 @@ class StatusEmbed(commands.Cog):
             )
         except discord.HTTPException:
             pass
-        await storage.delete('channel', 'message', 'texts')
+        await storage.delete('channel', 'message', 'texts', 'systems')
 
         return await ctx.send(embed=discord.Embed(
             description='Statusembed deleted!',
@@ -226,4 +303,7 @@ class StatusEmbed(commands.Cog):
 
 
 def setup(bot: commands.Bot):
-    bot.add_cog(StatusEmbed())
+    bot.add_cog(StatusEmbed(Debouncer(
+        bot.config.getfloat('edits', 'statusembed debounce', fallback=1),
+        bot.config.getfloat('edits', 'statusembed max delay', fallback=5)
+    )))
@@ -0,0 +1,967 @@
+"""In-process storage backend, for running the bot without a redis server.
+
+:class:`MemoryBackend` implements the subset of the `aredis.StrictRedis`
+interface used by :class:`~incidentreporter.storage.Storage`, including
+pipelines, the registered lua scripts and pub/sub. An artificial latency
+can be configured, which is spent once per round trip like with a real
+redis server, so round trip bound and cpu bound costs can be compared.
+
+    redis: memory://?latency=0.0005
+"""
+
+from __future__ import annotations
+
+import asyncio
+import fnmatch
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+from urllib.parse import parse_qs, urlparse
+
+from aredis.exceptions import NoScriptError, ResponseError
+
+from .storage import SCRIPTS, STRINGABLE
+
+
+WRONGTYPE = 'WRONGTYPE Operation against a key holding the wrong kind of ' \
+            'value'
+
+# name of a registered script -> python implementation, which is called
+# with the database, the keys and the arguments
+SCRIPT_HANDLERS = {}  # type: Dict[str, Callable]
+
+
+def script_handler(name: str):
+    def decorator(func: Callable) -> Callable:
+        SCRIPT_HANDLERS[name] = func
+        return func
+    return decorator
+
+
+def _encode(value: STRINGABLE) -> bytes:
+    # same encoding as aredis
+    if isinstance(value, bytes):
+        return value
+    if isinstance(value, float):
+        return repr(value).encode()
+    return str(value).encode()
+
+
+def _key(key: Union[str, bytes]) -> str:
+    if isinstance(key, bytes):
+        return key.decode()
+    return key
+
+
+def _index(index: int, length: int) -> int:
+    if index < 0:
+        index += length
+    return index
+
+
+def _range(start: int, end: int, length: int) -> slice:
+    # redis ranges are inclusive and clamped
+    start = max(_index(start, length), 0)
+    end = _index(end, length)
+    return slice(start, end + 1 if end >= 0 else 0)
+
+
+def _bound(bound: STRINGABLE) -> tuple:
+    # a score bound as (score, exclusive), like '(1.5' or '-inf'
+    bound = _key(_encode(bound))
+    if bound.startswith('('):
+        return float(bound[1:]), True
+    return float(bound), False
+
+
+def _in_bounds(score: float, min: tuple, max: tuple) -> bool:
+    return (score > min[0] if min[1] else score >= min[0]) \
+        and (score < max[0] if max[1] else score <= max[0])
+
+
+class _SortedSet(dict):
+    # member -> score
+
+    def ordered(self, desc: bool = False) -> list:
+        return sorted(self.items(), key=lambda x: (x[1], x[0]),
+                      reverse=desc)
+
+
+class _Stream(list):
+    # (id, fields) tuples, ids are (milliseconds, sequence number)
+
+    def next_id(self) -> tuple:
+        millis = int(time.time() * 1000)
+        if self and self[-1][0][0] >= millis:
+            return self[-1][0][0], self[-1][0][1] + 1
+        return millis, 0
+
+
+def _stream_id(id: tuple) -> bytes:
+    return f'{id[0]}-{id[1]}'.encode()
+
+
+def _stream_bound(bound: STRINGABLE, end: bool) -> tuple:
+    # a range bound as (id, exclusive)
+    bound = _key(_encode(bound))
+    if bound == '-':
+        return (0, 0), False
+    if bound == '+':
+        return (float('inf'), 0), False
+    exclusive = bound.startswith('(')
+    millis, _, sequence = bound.lstrip('(').partition('-')
+    if not sequence:
+        sequence = 2 ** 64 - 1 if end else 0
+    return (int(millis), int(sequence)), exclusive
+
+
+class Database:
+    """The data and synchronous implementation of the redis commands."""
+
+    def __init__(self, on_change: Callable[[str, str], None] = None):
+        self._data = {}  # type: Dict[str, Any]
+        self._expires = {}  # type: Dict[str, float]
+        self._on_change = on_change
+
+    # helpers
+    def _alive(self, key: str) -> bool:
+        expires = self._expires.get(key)
+        if expires is not None and expires <= time.monotonic():
+            del self._data[key]
+            del self._expires[key]
+            self._changed(key, 'expired')
+        return key in self._data
+
+    def _lookup(self, key, kind: Union[type, Tuple[type, ...]],
+                create: bool = False):
+        # the types are compared exactly, a sorted set is no hash
+        kinds = kind if isinstance(kind, tuple) else (kind,)
+        key = _key(key)
+        if not self._alive(key):
+            if not create:
+                return None
+            self._data[key] = kinds[0]()
+        value = self._data[key]
+        if type(value) not in kinds:
+            raise ResponseError(WRONGTYPE)
+        return value
+
+    def _cleanup(self, key) -> None:
+        # redis removes empty containers
+        key = _key(key)
+        if key in self._data and not self._data[key]:
+            self.delete(key)
+
+    def _changed(self, key: str, event: str):
+        if self._on_change is not None:
+            self._on_change(key, event)
+
+    def keys(self, pattern: str = '*') -> List[str]:
+        return [key for key in list(self._data)
+                if self._alive(key) and fnmatch.fnmatchcase(key, pattern)]
+
+    # strings
+    def get(self, name) -> Optional[bytes]:
+        return self._lookup(name, bytes)
+
+    def set(self, name, value, ex=None, px=None, nx=False, xx=False):
+        name = _key(name)
+        exists = self._alive(name)
+        if nx and exists or xx and not exists:
+            return None
+        self._data[name] = _encode(value)
+        self._expires.pop(name, None)
+        if ex is not None:
+            self._expires[name] = time.monotonic() + ex
+        elif px is not None:
+            self._expires[name] = time.monotonic() + px / 1000
+        self._changed(name, 'set')
+        return True
+
+    def mget(self, keys, *args) -> List[Optional[bytes]]:
+        if isinstance(keys, (str, bytes)):
+            keys = [keys]
+        return [self.get(x) for x in [*keys, *args]]
+
+    def mset(self, *args, **kwargs) -> bool:
+        if args:
+            kwargs.update(args[0])
+        for key, value in kwargs.items():
+            self.set(key, value)
+        return True
+
+    def incrby(self, name, amount: int) -> int:
+        value = int(self.get(name) or 0) + amount
+        name = _key(name)
+        self._data[name] = _encode(value)
+        self._changed(name, 'incrby')
+        return value
+
+    def incr(self, name, amount: int = 1) -> int:
+        return self.incrby(name, amount)
+
+    def decrby(self, name, amount: int) -> int:
+        return self.incrby(name, -amount)
+
+    def decr(self, name, amount: int = 1) -> int:
+        return self.incrby(name, -amount)
+
+    # keys
+    def delete(self, *names) -> int:
+        deleted = 0
+        for name in map(_key, names):
+            if self._alive(name):
+                del self._data[name]
+                self._expires.pop(name, None)
+                self._changed(name, 'del')
+                deleted += 1
+        return deleted
+
+    def exists(self, *names) -> bool:
+        # aredis turns the count into a bool
+        return sum(self._alive(_key(x)) for x in names) > 0
+
+    def pexpire(self, name, time_ms: int) -> int:
+        name = _key(name)
+        if not self._alive(name):
+            return 0
+        self._expires[name] = time.monotonic() + time_ms / 1000
+        self._changed(name, 'expire')
+        return 1
+
+    def expire(self, name, time_s: int) -> bool:
+        return bool(self.pexpire(name, time_s * 1000))
+
+    def pttl(self, name) -> int:
+        name = _key(name)
+        if not self._alive(name):
+            return -2
+        if name not in self._expires:
+            return -1
+        return int((self._expires[name] - time.monotonic()) * 1000)
+
+    def scan(self, cursor: int = 0, match: str = None, count: int = None):
+        keys = sorted(self.keys(_key(match) if match else '*'))
+        count = count or 10
+        cursor = int(cursor)
+        chunk = keys[cursor:cursor + count]
+        cursor += count
+        return (cursor if cursor < len(keys) else 0,
+                [x.encode() for x in chunk])
+
+    def _sort_lookup(self, pattern: str, item: bytes) -> Optional[bytes]:
+        if pattern == '#':
+            return item
+        key = pattern.replace('*', item.decode(), 1)
+        if '->' in key:
+            key, field = key.split('->', 1)
+            return self.hget(key, field)
+        return self.get(key)
+
+    def sort(self, name, start=None, num=None, by=None, get=None,
+             desc=False, alpha=False, store=None, groups=None):
+        value = self._lookup(name, (list, set)) or []
+        items = list(value)
+
+        if by is None or '*' in by:
+            def weight(item):
+                if by is not None:
+                    item = self._sort_lookup(by, item)
+                    if item is None:
+                        return 0 if not alpha else b''
+                if alpha:
+                    return item
+                try:
+                    return float(item)
+                except ValueError:
+                    raise ResponseError('One or more scores can\'t be '
+                                        'converted into double')
+            items.sort(key=weight, reverse=desc)
+
+        if start is not None and num is not None:
+            items = items[start:start + num]
+
+        if get:
+            if isinstance(get, (str, bytes)):
+                get = [get]
+            items = [self._sort_lookup(_key(pattern), item)
+                     for item in items for pattern in get]
+
+        if store is not None:
+            self.delete(store)
+            if items:
+                self.rpush(store, *items)
+            return len(items)
+        return items
+
+    # hashes
+    def hget(self, name, key) -> Optional[bytes]:
+        return (self._lookup(name, dict) or {}).get(_encode(key))
+
+    def hmget(self, name, keys, *args) -> List[Optional[bytes]]:
+        if isinstance(keys, (str, bytes)):
+            keys = [keys]
+        return [self.hget(name, x) for x in [*keys, *args]]
+
+    def hset(self, name, key, value) -> int:
+        return self.hset_many(name, {key: value})
+
+    def hset_many(self, name, mapping: dict) -> int:
+        hash = self._lookup(name, dict, create=True)
+        added = 0
+        for key, value in mapping.items():
+            key = _encode(key)
+            added += key not in hash
+            hash[key] = _encode(value)
+        self._changed(_key(name), 'hset')
+        return added
+
+    def hdel(self, name, *keys) -> int:
+        hash = self._lookup(name, dict) or {}
+        deleted = 0
+        for key in map(_encode, keys):
+            if hash.pop(key, None) is not None:
+                deleted += 1
+        if deleted:
+            self._changed(_key(name), 'hdel')
+            self._cleanup(name)
+        return deleted
+
+    def hexists(self, name, key) -> bool:
+        return self.hget(name, key) is not None
+
+    def hlen(self, name) -> int:
+        return len(self._lookup(name, dict) or {})
+
+    def hkeys(self, name) -> List[bytes]:
+        return list(self._lookup(name, dict) or {})
+
+    def hvals(self, name) -> List[bytes]:
+        return list((self._lookup(name, dict) or {}).values())
+
+    def hgetall(self, name) -> Dict[bytes, bytes]:
+        return dict(self._lookup(name, dict) or {})
+
+    def hscan(self, name, cursor: int = 0, match: str = None,
+              count: int = None):
+        items = sorted(self.hgetall(name).items())
+        if match:
+            items = [(k, v) for k, v in items
+                     if fnmatch.fnmatchcase(k.decode(), match)]
+        count = count or 10
+        cursor = int(cursor)
+        chunk = items[cursor:cursor + count]
+        cursor += count
+        return cursor if cursor < len(items) else 0, dict(chunk)
+
+    # lists
+    def lindex(self, name, index: int) -> Optional[bytes]:
+        value = self._lookup(name, list) or []
+        index = _index(index, len(value))
+        if 0 <= index < len(value):
+            return value[index]
+        return None
+
+    def lset(self, name, index: int, value) -> bool:
+        list_ = self._lookup(name, list)
+        if list_ is None:
+            raise ResponseError('no such key')
+        index = _index(index, len(list_))
+        if not 0 <= index < len(list_):
+            raise ResponseError('index out of range')
+        list_[index] = _encode(value)
+        self._changed(_key(name), 'lset')
+        return True
+
+    def rpush(self, name, *values) -> int:
+        list_ = self._lookup(name, list, create=True)
+        list_.extend(map(_encode, values))
+        self._changed(_key(name), 'rpush')
+        return len(list_)
+
+    def lpush(self, name, *values) -> int:
+        list_ = self._lookup(name, list, create=True)
+        for value in values:
+            list_.insert(0, _encode(value))
+        self._changed(_key(name), 'lpush')
+        return len(list_)
+
+    def lrange(self, name, start: int, end: int) -> List[bytes]:
+        value = self._lookup(name, list) or []
+        return value[_range(start, end, len(value))]
+
+    def llen(self, name) -> int:
+        return len(self._lookup(name, list) or [])
+
+    def _pop(self, name, index: int) -> Optional[bytes]:
+        list_ = self._lookup(name, list)
+        if not list_:
+            return None
+        value = list_.pop(index)
+        self._changed(_key(name), 'rpop' if index else 'lpop')
+        self._cleanup(name)
+        return value
+
+    def rpop(self, name) -> Optional[bytes]:
+        return self._pop(name, -1)
+
+    def lpop(self, name) -> Optional[bytes]:
+        return self._pop(name, 0)
+
+    def lrem(self, name, count: int, value) -> int:
+        list_ = self._lookup(name, list) or []
+        value = _encode(value)
+        indexes = [i for i, x in enumerate(list_) if x == value]
+        if count < 0:
+            indexes = indexes[::-1]
+        if count:
+            indexes = indexes[:abs(count)]
+        for index in sorted(indexes, reverse=True):
+            del list_[index]
+        if indexes:
+            self._changed(_key(name), 'lrem')
+            self._cleanup(name)
+        return len(indexes)
+
+    def ltrim(self, name, start: int, end: int) -> bool:
+        list_ = self._lookup(name, list)
+        if list_ is not None:
+            list_[:] = list_[_range(start, end, len(list_))]
+            self._changed(_key(name), 'ltrim')
+            self._cleanup(name)
+        return True
+
+    def lpos(self, name, value, rank: int = 1, count: int = None,
+             maxlen: int = None):
+        list_ = self._lookup(name, list) or []
+        value = _encode(value)
+        indexes = range(len(list_))
+        if rank < 0:
+            indexes = reversed(indexes)
+        if maxlen:
+            indexes = list(indexes)[:maxlen]
+        positions = [i for i in indexes if list_[i] == value][abs(rank) - 1:]
+        if count is None:
+            return positions[0] if positions else None
+        return positions[:count] if count else positions
+
+    # sets
+    def sadd(self, name, *values) -> int:
+        set_ = self._lookup(name, set, create=True)
+        before = len(set_)
+        set_.update(map(_encode, values))
+        self._changed(_key(name), 'sadd')
+        return len(set_) - before
+
+    def srem(self, name, *values) -> int:
+        set_ = self._lookup(name, set) or set()
+        before = len(set_)
+        set_.difference_update(map(_encode, values))
+        if len(set_) != before:
+            self._changed(_key(name), 'srem')
+            self._cleanup(name)
+        return before - len(set_)
+
+    def spop(self, name, count: int = None):
+        set_ = self._lookup(name, set)
+        if not set_:
+            return None if count is None else []
+        values = [set_.pop() for _ in range(min(count or 1, len(set_)))]
+        self._changed(_key(name), 'spop')
+        self._cleanup(name)
+        return values[0] if count is None else values
+
+    def smembers(self, name) -> set:
+        return set(self._lookup(name, set) or ())
+
+    def sscan(self, name, cursor: int = 0, match: str = None,
+              count: int = None):
+        values = sorted(self.smembers(name))
+        if match:
+            values = [x for x in values
+                      if fnmatch.fnmatchcase(x.decode(), match)]
+        count = count or 10
+        cursor = int(cursor)
+        chunk = values[cursor:cursor + count]
+        cursor += count
+        return cursor if cursor < len(values) else 0, chunk
+
+    def sismember(self, name, value) -> bool:
+        return _encode(value) in (self._lookup(name, set) or ())
+
+    def scard(self, name) -> int:
+        return len(self._lookup(name, set) or ())
+
+    # sorted sets
+    def zadd(self, name, *args, **kwargs) -> int:
+        return self.zaddoption(name, None, *args, **kwargs)
+
+    def zaddoption(self, name, option=None, *args, **kwargs) -> int:
+        options = set((option or '').upper().split())
+        pairs = list(zip(args[1::2], args[::2])) + list(kwargs.items())
+        zset = self._lookup(name, _SortedSet, create=True)
+        added = changed = 0
+        for member, score in pairs:
+            member = _encode(member)
+            exists = member in zset
+            if 'NX' in options and exists or 'XX' in options and not exists:
+                continue
+            if zset.get(member) != float(score):
+                changed += 1
+            added += not exists
+            zset[member] = float(score)
+        self._changed(_key(name), 'zadd')
+        self._cleanup(name)
+        return changed if 'CH' in options else added
+
+    def zrem(self, name, *values) -> int:
+        zset = self._lookup(name, _SortedSet) or {}
+        removed = 0
+        for value in map(_encode, values):
+            if zset.pop(value, None) is not None:
+                removed += 1
+        if removed:
+            self._changed(_key(name), 'zrem')
+            self._cleanup(name)
+        return removed
+
+    def zremrangebyscore(self, name, min, max) -> int:
+        zset = self._lookup(name, _SortedSet) or {}
+        min, max = _bound(min), _bound(max)
+        members = [x for x, score in zset.items()
+                   if _in_bounds(score, min, max)]
+        if members:
+            return self.zrem(name, *members)
+        return 0
+
+    def zscore(self, name, value) -> Optional[float]:
+        return (self._lookup(name, _SortedSet) or {}).get(_encode(value))
+
+    def zcard(self, name) -> int:
+        return len(self._lookup(name, _SortedSet) or ())
+
+    def zcount(self, name, min, max) -> int:
+        zset = self._lookup(name, _SortedSet) or {}
+        min, max = _bound(min), _bound(max)
+        return sum(_in_bounds(x, min, max) for x in zset.values())
+
+    @staticmethod
+    def _zreply(items: list, withscores: bool,
+                score_cast_func: Callable) -> list:
+        if withscores:
+            return [(x, score_cast_func(score)) for x, score in items]
+        return [x for x, _ in items]
+
+    def zrange(self, name, start, end, desc=False, withscores=False,
+               score_cast_func=float) -> list:
+        zset = self._lookup(name, _SortedSet) or _SortedSet()
+        items = zset.ordered(desc)
+        return self._zreply(items[_range(start, end, len(items))],
+                            withscores, score_cast_func)
+
+    def zrevrange(self, name, start, end, withscores=False,
+                  score_cast_func=float) -> list:
+        return self.zrange(name, start, end, True, withscores,
+                           score_cast_func)
+
+    def zrangebyscore(self, name, min, max, start=None, num=None,
+                      withscores=False, score_cast_func=float,
+                      desc=False) -> list:
+        zset = self._lookup(name, _SortedSet) or _SortedSet()
+        min, max = _bound(min), _bound(max)
+        items = [x for x in zset.ordered(desc)
+                 if _in_bounds(x[1], min, max)]
+        if start is not None and num is not None:
+            # a negative count returns everything after the offset
+            items = items[start:] if num < 0 else items[start:start + num]
+        return self._zreply(items, withscores, score_cast_func)
+
+    def zrevrangebyscore(self, name, max, min, start=None, num=None,
+                         withscores=False, score_cast_func=float) -> list:
+        return self.zrangebyscore(name, min, max, start, num, withscores,
+                                  score_cast_func, desc=True)
+
+    # streams
+    def xadd(self, name, entry: dict, max_len=None, stream_id='*',
+             approximate=True) -> bytes:
+        stream = self._lookup(name, _Stream, create=True)
+        id = stream.next_id()
+        stream.append((id, {_encode(k): _encode(v) for k, v in entry.items()}))
+        if max_len is not None:
+            del stream[:max(len(stream) - max_len, 0)]
+        self._changed(_key(name), 'xadd')
+        return _stream_id(id)
+
+    def xlen(self, name) -> int:
+        return len(self._lookup(name, _Stream) or ())
+
+    def xrange(self, name, start='-', end='+', count=None) -> list:
+        (start, after), (end, before) = \
+            _stream_bound(start, False), _stream_bound(end, True)
+        entries = []
+        for id, fields in self._lookup(name, _Stream) or ():
+            if (id > start if after else id >= start) \
+                    and (id < end if before else id <= end):
+                entries.append((_stream_id(id), dict(fields)))
+        return entries[:count]
+
+    def xrevrange(self, name, start='+', end='-', count=None) -> list:
+        entries = self.xrange(name, end, start)[::-1]
+        return entries[:count]
+
+    def xtrim(self, name, max_len: int, approximate=True) -> int:
+        stream = self._lookup(name, _Stream) or []
+        trimmed = max(len(stream) - max_len, 0)
+        if trimmed:
+            del stream[:trimmed]
+            self._changed(_key(name), 'xtrim')
+        return trimmed
+
+    # raw commands
+    def execute_command(self, command: str, *args):
+        command = command.upper()
+        if command == 'HSET':
+            name, *pairs = args
+            return self.hset_many(name, dict(zip(pairs[::2], pairs[1::2])))
+        if command == 'LPOS':
+            name, value, *options = args
+            kwargs = {}
+            for option, argument in zip(options[::2], options[1::2]):
+                kwargs[_key(option).lower()] = int(argument)
+            return self.lpos(name, value, **kwargs)
+        return getattr(self, command.lower())(*args)
+
+
+class MemoryPipeline:
+    """Queues commands until :meth:`execute` is called.
+
+    The commands are applied at once, so they are always atomic.
+    """
+
+    def __init__(self, backend: MemoryBackend):
+        self._backend = backend
+        self._stack = []
+
+    def __getattr__(self, command: str):
+        async def queue(*args, **kwargs):
+            self._stack.append((command, args, kwargs))
+            return self
+        return queue
+
+    async def execute(self, raise_on_error: bool = True) -> List[Any]:
+        stack, self._stack = self._stack, []
+        if not stack:
+            return []
+        await self._backend.round_trip()
+        results = []
+        for command, args, kwargs in stack:
+            try:
+                results.append(self._backend.call(command, *args, **kwargs))
+            except ResponseError as e:
+                results.append(e)
+        if raise_on_error:
+            for result in results:
+                if isinstance(result, ResponseError):
+                    raise result
+        return results
+
+    async def reset(self):
+        self._stack = []
+
+
+class MemoryPubSub:
+    def __init__(self, backend: MemoryBackend,
+                 ignore_subscribe_messages: bool = False):
+        self._backend = backend
+        self._queue = asyncio.Queue()
+        self.channels = set()
+        self.patterns = set()
+
+    async def subscribe(self, *channels: str):
+        self.channels.update(channels)
+        self._backend._pubsubs.add(self)
+
+    async def psubscribe(self, *patterns: str):
+        self.patterns.update(patterns)
+        self._backend._pubsubs.add(self)
+
+    async def listen(self) -> dict:
+        return await self._queue.get()
+
+    def close(self):
+        self._backend._pubsubs.discard(self)
+
+    def deliver(self, channel: str, data: bytes) -> int:
+        received = 0
+        if channel in self.channels:
+            self._queue.put_nowait({'type': 'message', 'pattern': None,
+                                    'channel': channel.encode(),
+                                    'data': data})
+            received += 1
+        for pattern in self.patterns:
+            if fnmatch.fnmatchcase(channel, pattern):
+                self._queue.put_nowait({'type': 'pmessage',
+                                        'pattern': pattern.encode(),
+                                        'channel': channel.encode(),
+                                        'data': data})
+                received += 1
+        return received
+
+
+class _ConnectionPool:
+    # Cache.listen() reads the database number from here
+    connection_kwargs = {'db': 0}
+
+
+class MemoryBackend:
+    """Drop-in replacement for `aredis.StrictRedis`, keeping all data in
+    this process.
+
+    Every command costs one round trip of ``latency`` seconds, a pipeline
+    costs one round trip in total.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.database = Database(self._notify)
+        self.connection_pool = _ConnectionPool()
+        self.round_trips = 0
+        self._scripts = {}  # type: Dict[str, Callable]
+        self._pubsubs = set()
+
+    @classmethod
+    def from_url(cls, url: str) -> MemoryBackend:
+        query = parse_qs(urlparse(url).query)
+        return cls(latency=float(query.get('latency', [0])[0]))
+
+    async def round_trip(self):
+        self.round_trips += 1
+        # always yield to the event loop, like real io would
+        await asyncio.sleep(self.latency)
+
+    def call(self, command: str, *args, **kwargs):
+        if command in ('eval', 'evalsha', 'script_load', 'publish'):
+            return getattr(self, '_' + command)(*args, **kwargs)
+        return getattr(self.database, command)(*args, **kwargs)
+
+    def __getattr__(self, command: str):
+        if command.startswith('_') or not hasattr(Database, command):
+            raise AttributeError(command)
+
+        async def execute(*args, **kwargs):
+            await self.round_trip()
+            return self.call(command, *args, **kwargs)
+        return execute
+
+    async def pipeline(self, transaction: bool = True) -> MemoryPipeline:
+        return MemoryPipeline(self)
+
+    # scripting
+    def _script_load(self, source: str) -> str:
+        for script in SCRIPTS.values():
+            if script.source == source:
+                self._scripts[script.sha] = SCRIPT_HANDLERS[script.name]
+                return script.sha
+        raise ResponseError('only registered scripts are supported')
+
+    def _evalsha(self, sha: str, numkeys: int, *keys_and_args):
+        if sha not in self._scripts:
+            raise NoScriptError('No matching script. Please use EVAL.')
+        return self._scripts[sha](self.database, keys_and_args[:numkeys],
+                                  keys_and_args[numkeys:])
+
+    def _eval(self, source: str, numkeys: int, *keys_and_args):
+        return self._evalsha(self._script_load(source), numkeys,
+                             *keys_and_args)
+
+    async def script_load(self, source: str) -> str:
+        await self.round_trip()
+        return self._script_load(source)
+
+    async def script_flush(self) -> bool:
+        await self.round_trip()
+        self._scripts.clear()
+        return True
+
+    async def eval(self, source: str, numkeys: int, *keys_and_args):
+        await self.round_trip()
+        return self._eval(source, numkeys, *keys_and_args)
+
+    async def evalsha(self, sha: str, numkeys: int, *keys_and_args):
+        await self.round_trip()
+        return self._evalsha(sha, numkeys, *keys_and_args)
+
+    # iterators
+    async def scan_iter(self, match: str = None, count: int = None):
+        cursor = None
+        while cursor != 0:
+            await self.round_trip()
+            cursor, keys = self.database.scan(cursor or 0, match, count)
+            for key in keys:
+                yield key
+
+    async def hscan_iter(self, name, match: str = None, count: int = None):
+        cursor = None
+        while cursor != 0:
+            await self.round_trip()
+            cursor, data = self.database.hscan(name, cursor or 0, match,
+                                               count)
+            for item in data.items():
+                yield item
+
+    async def sscan_iter(self, name, match: str = None, count: int = None):
+        await self.round_trip()
+        for value in self.database.smembers(name):
+            if match is None or fnmatch.fnmatchcase(value.decode(), match):
+                yield value
+
+    # pub/sub
+    def pubsub(self, ignore_subscribe_messages: bool = False) -> MemoryPubSub:
+        return MemoryPubSub(self, ignore_subscribe_messages)
+
+    def _publish(self, channel: str, message: STRINGABLE) -> int:
+        channel = _key(channel)
+        return sum(pubsub.deliver(channel, _encode(message))
+                   for pubsub in list(self._pubsubs))
+
+    async def publish(self, channel: str, message: STRINGABLE) -> int:
+        await self.round_trip()
+        return self._publish(channel, message)
+
+    def _notify(self, key: str, event: str):
+        # keyspace notifications, always enabled
+        if self._pubsubs:
+            self._publish(f'__keyspace@0__:{key}', event)
+
+
+@script_handler('list_pop')
+def _list_pop(db: Database, keys, args):
+    key, = keys
+    index, _ = args
+    list_ = db._lookup(key, list) or []
+    index = _index(int(index), len(list_))
+    if not 0 <= index < len(list_):
+        return None
+    value = list_.pop(index)
+    db._changed(_key(key), 'lrem')
+    db._cleanup(key)
+    return value
+
+
+@script_handler('dict_pop')
+def _dict_pop(db: Database, keys, args):
+    key, = keys
+    field, = args
+    value = db.hget(key, field)
+    if value is not None:
+        db.hdel(key, field)
+    return value
+
+
+@script_handler('record_getall')
+def _record_getall(db: Database, keys, args):
+    record = db.hgetall(keys[0])
+    for key, field in zip(keys[1:], map(_encode, args)):
+        if field not in record:
+            value = db.get(key)
+            if value is not None:
+                record[field] = value
+    return [x for item in record.items() for x in item]
+
+
+@script_handler('record_set')
+def _record_set(db: Database, keys, args):
+    for i, key in enumerate(keys[1:]):
+        db.hset(keys[0], args[i * 2], args[i * 2 + 1])
+        db.delete(key)
+    return len(keys) - 1
+
+
+@script_handler('record_del')
+def _record_del(db: Database, keys, args):
+    deleted = 0
+    for key, field in zip(keys[1:], args):
+        if db.hdel(keys[0], field) + db.delete(key):
+            deleted += 1
+    return deleted
+
+
+@script_handler('record_migrate')
+def _record_migrate(db: Database, keys, args):
+    moved = 0
+    for key, field in zip(keys[1:], args):
+        value = db.get(key)
+        if value is not None:
+            if db.hget(keys[0], field) is None:
+                db.hset(keys[0], field, value)
+            db.delete(key)
+            moved += 1
+    return moved
+
+
+@script_handler('updates_compact')
+def _updates_compact(db: Database, keys, args):
+    updates, archive, snapshot = keys
+    keep, length, moved = int(args[0]), db.llen(updates), 0
+    if keep > 0 and length >= int(args[1]):
+        moved = length - keep
+        if db.hget(snapshot, 'first') is None:
+            db.hset(snapshot, 'first', db.lindex(updates, 0))
+        db.rpush(archive, *db.lrange(updates, 0, moved - 1))
+        db.ltrim(updates, moved, -1)
+        archived = int(db.hget(snapshot, 'archived') or 0) + moved
+        db.hset(snapshot, 'archived', archived)
+    return [moved, *db.hmget(snapshot, 'archived', 'first')]
+
+
+@script_handler('timeline_compact')
+def _timeline_compact(db: Database, keys, args):
+    timeline, archive, snapshot = keys
+    keep, length, moved = int(args[0]), db.xlen(timeline), 0
+    if keep > 0 and length >= int(args[1]):
+        moved = length - keep
+        updates = [x[b'u'] for _, x in db.xrange(timeline, count=moved)]
+        if db.hget(snapshot, 'first') is None:
+            db.hset(snapshot, 'first', updates[0])
+        db.rpush(archive, *updates)
+        db.xtrim(timeline, keep)
+        archived = int(db.hget(snapshot, 'archived') or 0) + moved
+        db.hset(snapshot, 'archived', archived)
+    return [moved, *db.hmget(snapshot, 'archived', 'first')]
+
+
+@script_handler('scheduler_claim')
+def _scheduler_claim(db: Database, keys, args):
+    jobs = db.zrangebyscore(keys[0], '-inf', args[0], 0, int(args[2]))
+    for job in jobs:
+        db.zadd(keys[0], float(args[0]) + float(args[1]), job)
+    return jobs
+
+
+@script_handler('statusembed_migrate')
+def _statusembed_migrate(db: Database, keys, args):
+    for key, textid in zip(keys[1:], args):
+        incident = db.get(key)
+        if incident is not None:
+            if db.hget(keys[0], textid) is None:
+                db.hset(keys[0], textid, incident + b':')
+            db.delete(key)
+    db.hset(keys[0], 'migrated', 1)
+    return [x for item in db.hgetall(keys[0]).items() for x in item]
+
+
+@script_handler('statusembed_state')
+def _statusembed_state(db: Database, keys, args):
+    prefix = _encode(args[0]) + b':'
+    for textid in args[2:]:
+        system = db.hget(keys[0], textid)
+        if system is not None and system.startswith(prefix):
+            db.hset(keys[0], textid, prefix + _encode(args[1]))
+
+
+@script_handler('edit_digest')
+def _edit_digest(db: Database, keys, args):
+    if (db.get(keys[0]) or b'') == _encode(args[0]):
+        db.set(keys[0], args[1], ex=int(args[2]))
+        return 1
+    db.delete(keys[0])
+    return 0
@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from .storage import Storage, register_script
+
+
+logger = logging.getLogger(__name__)
+
+# KEYS = jobs, ARGV = now, lease, count, returns the jobs that are due and
+# pushes their due time back by the lease
+register_script('scheduler_claim', """
+local jobs = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1],
+                        'LIMIT', 0, ARGV[3])
+local due = tonumber(ARGV[1]) + tonumber(ARGV[2])
+for _, job in ipairs(jobs) do
+    redis.call('ZADD', KEYS[1], due, job)
+end
+return jobs
+""")
+
+
+class Scheduler:
+    """Runs jobs at their due time, from a sorted set of jobs scored by it.
+
+    A single task sleeps until the earliest job is due and is woken up when
+    an earlier one is scheduled, so waiting jobs cost nothing and
+    scheduling one is a single ZADD. As the jobs are stored in redis, they
+    survive restarts.
+
+    A due job is claimed by pushing its due time back by ``lease`` seconds
+    before ``handler`` is called with it, so a job is never run by two
+    processes at once, and a job whose handler failed or didn't finish
+    because the bot stopped is run again once the lease ran out. The
+    handler returns the time the job is due next, or None once it's done.
+    Jobs scheduled by other processes are noticed after ``poll`` seconds at
+    most. A handler that can't run a job yet, e.g. as its guild is
+    unavailable, returns :meth:`retry`, which backs off from
+    ``retry_delay`` seconds up to ``max_retry_delay`` and gives up after
+    ``max_retries`` attempts in a row.
+
+        scheduler = Scheduler(storage, 'jobs', handler)
+        scheduler.start()
+        await scheduler.schedule('1234:5', time.time() + 60)
+    """
+
+    def __init__(self, storage: Storage, key: str,
+                 handler: Callable[[str], Awaitable[Optional[float]]], *,
+                 lease: float = 60, poll: float = 60, batch_size: int = 100,
+                 retry_delay: float = 60, max_retry_delay: float = 60 * 60,
+                 max_retries: int = 48):
+        self._storage = storage
+        self._key = key
+        self.jobs = storage.as_sorted_set(key)
+        self.handler = handler
+        self.lease = lease
+        self.poll = poll
+        self.batch_size = batch_size
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.max_retries = max_retries
+        # job -> attempts in a row, of this process
+        self._retries = {}  # type: Dict[str, int]
+        self._wakeup = asyncio.Event()
+        self._task = None  # type: Optional[asyncio.Task]
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_event_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def schedule(self, job: str, due: float):
+        """Schedules a job at ``due``, a unix time, moving it if it's
+        already scheduled."""
+        await self.jobs.add(job, due)
+        self._wakeup.set()
+
+    async def cancel(self, job: str) -> bool:
+        return bool(await self.jobs.remove(job))
+
+    def retry(self, job: str) -> Optional[float]:
+        """Returns the time a job that can't be run now is due again, or
+        None once it has been retried ``max_retries`` times in a row."""
+        attempts = self._retries.get(job, 0)
+        if attempts >= self.max_retries:
+            logger.warning('gave up on scheduled job %r after %d attempts',
+                           job, attempts)
+            del self._retries[job]
+            return None
+        self._retries[job] = attempts + 1
+        return time.time() + min(self.retry_delay * 2 ** attempts,
+                                 self.max_retry_delay)
+
+    async def _claim(self, now: float) -> List[str]:
+        return await self._storage.script(
+            'scheduler_claim', [self._key],
+            [now, self.lease, self.batch_size],
+            callback=lambda jobs: [x.decode() for x in jobs]
+        )
+
+    async def _handle(self, job: str):
+        attempts = self._retries.get(job)
+        try:
+            due = await self.handler(job)
+        except Exception:
+            logger.exception('scheduled job %r failed, retrying in %ds',
+                             job, self.lease)
+            return
+        if attempts is not None and self._retries.get(job) == attempts:
+            # the job could be run, so the next retry starts over
+            del self._retries[job]
+        if due is None:
+            await self.jobs.remove(job)
+        else:
+            # unless it has been cancelled in the meantime
+            await self.jobs.add(job, due, only_if_exists=True)
+
+    async def _run(self):
+        while True:
+            # jobs scheduled from now on wake the task up again
+            self._wakeup.clear()
+            try:
+                jobs = await self._claim(time.time())
+                await asyncio.gather(*map(self._handle, jobs))
+                if len(jobs) == self.batch_size:
+                    continue
+                earliest = await self.jobs.slice(0, 1, withscores=True)
+            except Exception:
+                logger.exception('running the scheduled jobs failed')
+                earliest = []
+
+            delay = self.poll
+            if earliest:
+                delay = min(max(earliest[0][1] - time.time(), 0), delay)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,278 @@
+"""Storage layout of the guild data.
+
+Schema v1 stored every field in its own key (``guild:1:prefix``,
+``guild:1:incident:5:channel``, ...). Schema v2 keeps the scalar fields of
+an object in one small hash instead, which redis stores compactly and which
+is read in a single command:
+
+    guild:{id}:settings          prefix, timezone, defaultchannel, ban,
+                                 reminderchannel, reminderafter
+    guild:{id}:incident:{n}      channel, message, status, textid, state,
+                                 timeline
+
+``premium`` stays a key of its own, as its expiry is the subscription.
+
+Both layouts are read through :class:`~incidentreporter.storage.RecordView`,
+so the bot works during the migration, which is done by :class:`Migrator`.
+Once it's done, records only read their hash, see :func:`check_version`.
+
+The incidents of a guild are indexed by sorted sets of incident ids, so
+they can be listed without scanning the keyspace:
+
+    guild:{id}:incidents:open                open ones, by start time
+    guild:{id}:incidents:updated             all, by last update
+    guild:{id}:incidents:channel:{channel}   by last update
+    guild:{id}:incidents:state:{state}       by current state, last update
+
+Incidents are indexed when they are updated. Schema v3 indexes the
+incidents that weren't updated since the indexes were introduced, from
+their updates.
+
+The updates of an incident are stored in its timeline, see
+:mod:`incidentreporter.timeline`.
+
+Incidents are mirrored into the channels of a set, of this guild or
+others, and the ids of their messages there are kept in a hash per
+incident:
+
+    guild:{id}:mirrors                 channel ids
+    guild:{id}:incident:{n}:mirrors    channel id -> message id
+
+The systems of a statusembed that have an incident are kept in a hash
+with the incident and its current state, ``{incident}:{state}``, so a
+statusembed is rendered without reading the incidents:
+
+    guild:{id}:statusembed:{n}:systems   text id -> incident and state
+
+Older versions linked the systems in keys of their own
+(``statusembed:{n}:incident:{text id}``), which are moved into the hash
+by :func:`migrate_statusembed`, without the state.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from .storage import (
+    DictView, RecordView, SortedSetView, Storage, register_script
+)
+
+
+SCHEMA_VERSION = 3
+# the version keeping the fields of a record in a hash, see check_version()
+HASHES_VERSION = 2
+
+SETTINGS_FIELDS = ('prefix', 'timezone', 'defaultchannel', 'ban',
+                   'reminderchannel', 'reminderafter')
+INCIDENT_FIELDS = ('channel', 'message', 'status', 'textid', 'state',
+                   'timeline')
+
+logger = logging.getLogger(__name__)
+
+# whether records still read the schema v1 keys of their fields, until the
+# data has been migrated, see check_version()
+_legacy_reads = True
+
+# KEYS = systems, the old links, ARGV = their text ids, returns the systems
+register_script('statusembed_migrate', """
+for i = 2, #KEYS do
+    local incident = redis.call('GET', KEYS[i])
+    if incident then
+        redis.call('HSETNX', KEYS[1], ARGV[i - 1], incident .. ':')
+        redis.call('DEL', KEYS[i])
+    end
+end
+redis.call('HSET', KEYS[1], 'migrated', 1)
+return redis.call('HGETALL', KEYS[1])
+""")
+
+# KEYS = systems, ARGV = incident, state, text ids, only sets the systems
+# that are still linked to the incident
+register_script('statusembed_state', """
+local prefix = ARGV[1] .. ':'
+for i = 3, #ARGV do
+    local system = redis.call('HGET', KEYS[1], ARGV[i])
+    if system and string.sub(system, 1, #prefix) == prefix then
+        redis.call('HSET', KEYS[1], ARGV[i], prefix .. ARGV[2])
+    end
+end
+""")
+
+
+async def check_version(storage: Storage) -> int:
+    """Reads the schema version of the data and returns it.
+
+    Records stop reading the schema v1 keys once the data has been migrated,
+    the version is only read when this is called.
+    """
+    global _legacy_reads
+    version = await storage.get_int('schema:version', default=1)
+    _legacy_reads = version < HASHES_VERSION
+    return version
+
+
+def settings(storage: Storage) -> RecordView:
+    """The settings of the guild ``storage`` belongs to."""
+    return storage.as_record('settings', SETTINGS_FIELDS, legacy='',
+                             legacy_reads=_legacy_reads)
+
+
+def incident(storage: Storage, incident: int) -> RecordView:
+    """The fields of an incident of the guild ``storage`` belongs to."""
+    return storage.as_record(f'incident:{incident}', INCIDENT_FIELDS,
+                             legacy_reads=_legacy_reads)
+
+
+def incident_mirrors(storage: Storage, incident: int) -> DictView:
+    """The messages of an incident in the channels it's mirrored into."""
+    return storage.as_dict(f'incident:{incident}:mirrors')
+
+
+def statusembed_systems(storage: Storage, statusembed: int) -> DictView:
+    """The systems of a statusembed that have an incident, see
+    :func:`migrate_statusembed`."""
+    return storage.as_dict(f'statusembed:{statusembed}:systems')
+
+
+async def migrate_statusembed(storage: Storage, statusembed: int,
+                              texts: int) -> Dict[bytes, bytes]:
+    """Moves the links of the first ``texts`` systems of a statusembed
+    into its hash and returns the hash.
+
+    Hashes that were migrated have a ``migrated`` field, the others might
+    miss links.
+    """
+    prefix = f'statusembed:{statusembed}:'
+
+    def parse(reply):
+        return {reply[i]: reply[i + 1] for i in range(0, len(reply), 2)}
+    return await storage.script(
+        'statusembed_migrate',
+        [prefix + 'systems', *[prefix + f'incident:{x}'
+                               for x in range(texts)]],
+        range(texts),
+        callback=parse
+    )
+
+
+async def statusembed_state(storage: Storage, statusembed: int,
+                            incident: int, state: str, textids: List[int]):
+    """Sets the state of the systems of a statusembed an incident is
+    linked to, systems that have been unlinked in the meantime stay
+    unlinked."""
+    await storage.script(
+        'statusembed_state', [f'statusembed:{statusembed}:systems'],
+        [incident, state, *textids]
+    )
+
+
+def incident_index(storage: Storage, name: str) -> SortedSetView:
+    """An index of the incidents of the guild ``storage`` belongs to, like
+    ``'open'`` or ``'channel:1234'``."""
+    return storage.as_sorted_set(f'incidents:{name}')
+
+
+def _record_of(parts: list) -> Optional[Tuple[str, ...]]:
+    # the record a schema v1 key belongs to, as (guild, incident or '')
+    if len(parts) == 3 and parts[2] in SETTINGS_FIELDS:
+        return parts[1], ''
+    if len(parts) == 5 and parts[2] == 'incident' \
+            and parts[4] in INCIDENT_FIELDS:
+        return parts[1], parts[3]
+    return None
+
+
+class Migrator:
+    """Migrates the guild data to the current schema, online.
+
+    The keys are walked with SCAN in batches of ``batch_size``. Migrating
+    to v2, the records they belong to are migrated with one atomic script
+    each, all records of a batch in one round trip. Migrating to v3, the
+    incidents that weren't updated since the indexes were introduced are
+    indexed by ``backfill``, see :meth:`Incidents.backfill
+    <incidentreporter.ext.incidents.Incidents.backfill>`. The cursor is
+    saved after every batch, so an interrupted migration continues where it
+    stopped, and migrating a record twice does nothing.
+    """
+
+    def __init__(self, storage: Storage,
+                 backfill: Callable[[Storage, int], Awaitable[bool]],
+                 batch_size: int = 1000):
+        self.storage = storage
+        self.backfill = backfill
+        self.batch_size = batch_size
+
+    async def version(self) -> int:
+        return await check_version(self.storage)
+
+    async def run(self, progress: Callable[[Dict[str, int]], None] = None):
+        version = await self.version()
+        if version < HASHES_VERSION:
+            await self._walk(self._migrate_records, progress)
+            await self.storage.set('schema:version', HASHES_VERSION)
+        if version < SCHEMA_VERSION:
+            await self._walk(self._index_incidents, progress)
+            await self.storage.set('schema:version', SCHEMA_VERSION)
+
+    async def _walk(self, step: Callable[[List[str]], Awaitable[int]],
+                    progress: Optional[Callable[[Dict[str, int]], None]]):
+        # runs a step for every batch of keys, step returns the amount of
+        # migrated records
+        state = self.storage.as_dict('schema:migration')
+        cursor, scanned, migrated = [
+            int(x) for x in await state.get_many(
+                'cursor', 'scanned', 'migrated', default=0
+            )
+        ]
+        if cursor:
+            logger.info('resuming schema migration at cursor %d', cursor)
+
+        while True:
+            cursor, keys = await self.storage.scan_page(
+                cursor, 'guild:*', self.batch_size
+            )
+            scanned += len(keys)
+            migrated += await step(keys)
+            await state.update(cursor=cursor, scanned=scanned,
+                               migrated=migrated)
+
+            stats = {'cursor': cursor, 'scanned': scanned,
+                     'migrated': migrated}
+            logger.info('schema migration: %r', stats)
+            if progress is not None:
+                progress(stats)
+            if cursor == 0:
+                break
+        await state.clear()
+
+    async def _migrate_records(self, keys: List[str]) -> int:
+        records = set()  # type: Set[Tuple[str, ...]]
+        for key in keys:
+            record = _record_of(key.split(':'))
+            if record is not None:
+                records.add(record)
+
+        pipeline = self.storage.pipeline(transaction=False)
+        async with pipeline as pipe:
+            for guild, id in records:
+                gstorage = pipe / 'guild' / guild
+                if id:
+                    await incident(gstorage, id).migrate()
+                else:
+                    await settings(gstorage).migrate()
+        return sum(pipeline.results)
+
+    async def _index_incidents(self, keys: List[str]) -> int:
+        incidents = set()  # type: Set[Tuple[str, int]]
+        for key in keys:
+            parts = key.split(':')
+            # the records of the incidents, guild:{id}:incident:{n}
+            if len(parts) == 4 and parts[2] == 'incident' \
+                    and parts[3].isdigit():
+                incidents.add((parts[1], int(parts[3])))
+        return sum(await asyncio.gather(*[
+            self.backfill(self.storage / 'guild' / guild, id)
+            for guild, id in incidents
+        ]))
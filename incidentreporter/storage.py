@@ -1,33 +1,87 @@
 from __future__ import annotations
 
+import asyncio
+from collections import OrderedDict
+import contextlib
+import contextvars
+import copy
 import datetime
+import hashlib
+import logging
 import os
-from typing import Callable, Union, AsyncGenerator, List, Optional
+import random
+import time
+import zlib
+from typing import (
+    Any, Callable, Dict, Union, AsyncGenerator, List, Optional, Sequence,
+    Tuple
+)
 
 import aredis
 
 
 STRINGABLE = Union[str, int, float, bool, bytes]
 TIME_TYPE = Union[int, float, datetime.timedelta, datetime.datetime]
+SCORE_TYPE = Union[float, str]
 
 SEPERATOR = ':'
+# amount of items fetched per round trip when iterating over a list
+CHUNK_SIZE = 100
 _NOT_SET = object()
 
+# commands that never modify data
+READ_COMMANDS = frozenset({
+    'get', 'mget', 'exists', 'pttl', 'hget', 'hmget', 'hkeys', 'hvals',
+    'hgetall', 'hexists', 'hlen', 'lindex', 'lrange', 'llen', 'lpos',
+    'smembers', 'sismember', 'scard', 'zscore', 'zcard', 'zcount', 'zrange',
+    'zrevrange', 'zrangebyscore', 'zrevrangebyscore', 'xlen', 'xrange',
+    'xrevrange', 'scan', 'hscan', 'sscan'
+})
+# commands reading in pages, with a cursor returned by the previous page
+CURSOR_COMMANDS = frozenset({'scan', 'hscan', 'sscan'})
+# commands whose replies can be served from the cache
+CACHED_COMMANDS = frozenset({'get', 'exists', 'smembers'})
+
+logger = logging.getLogger(__name__)
+
+
+class _Session:
+    __slots__ = ('wrote',)
+
+    def __init__(self):
+        self.wrote = False
+
+
+# see Storage.read_your_writes
+_session = contextvars.ContextVar('session', default=None)
+
+
+def _or_default(default):
+    def callback(value):
+        if value is None:
+            return default
+        return value
+    return callback
+
 
 class GetMixin:
-    async def get(self, ref, default=None) -> bytes:
+    async def _get(self, ref, callback: Callable):
         raise NotImplementedError
 
+    async def get(self, ref, default=None) -> bytes:
+        return await self._get(ref, _or_default(default))
+
     async def get_cast(self, ref, cast: Callable, default=None):
         """Gets a variables and casts it.
 
         E.g. Use 'bytes.decode' to get a string, 'int' for a integer,
         'float' for a float, etc...
         """
-        value = await self.get(ref, default=_NOT_SET)
-        if value is _NOT_SET:
-            return default
-        return cast(value)
+        def callback(value):
+            if value is None:
+                return default
+            return cast(value)
+        return await self._get(ref, callback)
 
     async def get_str(self, ref, default=None) -> str:
         return await self.get_cast(ref, bytes.decode, default=default)
@@ -39,24 +93,651 @@ class GetMixin:
         return await self.get_cast(ref, float, default=default)
 
 
-class Storage(GetMixin):
-    __slots__ = ('_redis', '_path')
+def key_class(key: str) -> str:
+    """Normalises a key by replacing its ids with wildcards.
+
+    E.g. 'guild:1234:incident:5:updates' becomes 'guild:*:incident:*:updates'
+    """
+    return SEPERATOR.join(
+        '*' if part.strip('{}').isdigit() else part
+        for part in key.split(SEPERATOR)
+    )
+
+
+def _is_read(command: str, args: tuple) -> bool:
+    if command == 'execute_command':
+        return args[0].lower() in READ_COMMANDS
+    return command in READ_COMMANDS
+
+
+def _label(command: str, args: tuple) -> Tuple[str, str]:
+    # (command, key class) of a command, for metrics
+    if command == 'execute_command':
+        command, args = args[0].lower(), args[1:]
+    elif command in ('eval', 'evalsha'):
+        command = 'script:' + _SCRIPT_NAMES.get(args[0], '?')
+        args = args[2:2 + args[1]]
+    key = args[0] if args else ''
+    if isinstance(key, (list, dict)):  # MGET and MSET
+        key = next(iter(key), '')
+    return command, key_class(key) if isinstance(key, str) else ''
+
+
+def _written_keys(command: str, args: tuple, kwargs: dict) -> tuple:
+    # keys a command may modify, used for invalidating cached values
+    if _is_read(command, args):
+        return ()
+    if command == 'delete':
+        return args
+    if command == 'mset':
+        return tuple(args[0])
+    if command == 'execute_command':
+        return args[1:2]
+    if command == 'sort':
+        return (kwargs['store'],) if kwargs.get('store') else ()
+    if command in ('eval', 'evalsha'):
+        return args[2:2 + args[1]]
+    return args[:1]
+
+
+class Script:
+    __slots__ = ('name', 'source', 'sha', 'readonly')
+
+    def __init__(self, name: str, source: str, readonly: bool = False):
+        self.name = name
+        self.source = source
+        self.sha = hashlib.sha1(source.encode()).hexdigest()
+        # replies of read only scripts are cached by their first key
+        self.readonly = readonly
+
+
+# name -> Script, scripts are loaded into redis lazily on first use
+SCRIPTS = {}  # type: Dict[str, Script]
+# sha1 and source -> name, for naming EVAL and EVALSHA in metrics
+_SCRIPT_NAMES = {}  # type: Dict[str, str]
+
+
+def register_script(name: str, source: str, *,
+                    readonly: bool = False) -> Script:
+    """Registers a lua script that can be run with :meth:`Storage.script`."""
+    script = SCRIPTS[name] = Script(name, source, readonly)
+    _SCRIPT_NAMES[script.sha] = _SCRIPT_NAMES[source] = name
+    return script
+
+
+# KEYS[1] = list, ARGV[1] = index, ARGV[2] = placeholder
+# there's no command for removing by index, so the item is overwritten
+# with an unique placeholder which is then removed, atomically
+register_script('list_pop', """
+local value = redis.call('LINDEX', KEYS[1], ARGV[1])
+if value then
+    redis.call('LSET', KEYS[1], ARGV[1], ARGV[2])
+    redis.call('LREM', KEYS[1], 1, ARGV[2])
+end
+return value
+""")
+
+# records (see RecordView), KEYS[1] = hash, KEYS[2..] = the legacy keys of
+# the fields in ARGV
+
+# fields missing from the hash are read from their legacy keys
+register_script('record_getall', """
+local record = redis.call('HGETALL', KEYS[1])
+local found = {}
+for i = 1, #record, 2 do
+    found[record[i]] = true
+end
+for i = 2, #KEYS do
+    if not found[ARGV[i - 1]] then
+        local value = redis.call('GET', KEYS[i])
+        if value then
+            record[#record + 1] = ARGV[i - 1]
+            record[#record + 1] = value
+        end
+    end
+end
+return record
+""", readonly=True)
+
+# ARGV = field, value, field, value, ...
+register_script('record_set', """
+for i = 2, #KEYS do
+    redis.call('HSET', KEYS[1], ARGV[i * 2 - 3], ARGV[i * 2 - 2])
+    redis.call('DEL', KEYS[i])
+end
+return #KEYS - 1
+""")
+
+register_script('record_del', """
+local deleted = 0
+for i = 2, #KEYS do
+    local hdel = redis.call('HDEL', KEYS[1], ARGV[i - 1])
+    local del = redis.call('DEL', KEYS[i])
+    if hdel + del > 0 then
+        deleted = deleted + 1
+    end
+end
+return deleted
+""")
+
+# values already in the hash are newer than the legacy ones
+register_script('record_migrate', """
+local moved = 0
+for i = 2, #KEYS do
+    local value = redis.call('GET', KEYS[i])
+    if value then
+        redis.call('HSETNX', KEYS[1], ARGV[i - 1], value)
+        redis.call('DEL', KEYS[i])
+        moved = moved + 1
+    end
+end
+return moved
+""")
+
+# KEYS[1] = hash, ARGV[1] = field
+register_script('dict_pop', """
+local value = redis.call('HGET', KEYS[1], ARGV[1])
+if value then
+    redis.call('HDEL', KEYS[1], ARGV[1])
+end
+return value
+""")
+
+
+class Cache:
+    """Bounded LRU cache for rarely written keys.
+
+    Only keys whose :func:`key_class` has a TTL in ``ttls`` are cached.
+    Writes made through :class:`Storage` invalidate the cache directly,
+    writes from other processes are picked up by :meth:`listen`, either from
+    redis keyspace notifications or from an explicit pub/sub ``channel``.
+    Cached values are only served while the listener is subscribed.
+    """
+
+    def __init__(self, ttls: Dict[str, float], size: int = 10000,
+                 channel: str = None):
+        self.ttls = ttls
+        self.size = size
+        self.channel = channel
+        self.listening = False
+        # incremented on every invalidation, so a value fetched before an
+        # invalidation is never stored afterwards
+        self.generation = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+        # key -> (expires at, {command: value})
+        self._entries = OrderedDict()  # type: OrderedDict[str, tuple]
+
+    def caches(self, key: str) -> bool:
+        return key_class(key) in self.ttls
+
+    def get(self, command: str, key: str):
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires, values = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+            elif command in values:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return values[command]
+        self.misses += 1
+        return _NOT_SET
+
+    def set(self, command: str, key: str, value, generation: int):
+        if generation != self.generation or not self.listening:
+            return
+        entry = self._entries.get(key)
+        if entry is None:
+            ttl = self.ttls[key_class(key)]
+            entry = self._entries[key] = (time.monotonic() + ttl, {})
+            if len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        entry[1][command] = value
+
+    def invalidate(self, *keys: str):
+        for key in keys:
+            self.generation += 1
+            self.invalidations += 1
+            self._entries.pop(key, None)
+
+    def clear(self):
+        self.generation += 1
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations
+        }
+
+    async def listen(self, redis: aredis.StrictRedis):
+        """Invalidates keys changed by other processes, runs forever."""
+        while True:
+            pubsub = redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                if self.channel:
+                    await pubsub.subscribe(self.channel)
+                    prefix = b''
+                else:
+                    db = redis.connection_pool.connection_kwargs.get('db', 0)
+                    prefix = f'__keyspace@{db}__:'.encode()
+                    await pubsub.psubscribe(*[
+                        f'__keyspace@{db}__:{pattern}' for pattern in self.ttls
+                    ])
+                self.listening = True
+
+                while True:
+                    message = await pubsub.listen()
+                    if message is None:
+                        continue
+                    if self.channel:
+                        key = message['data']
+                    else:
+                        key = message['channel'][len(prefix):]
+                    self.invalidate(key.decode())
+            except aredis.exceptions.RedisError:
+                logger.exception('cache invalidation listener failed')
+            finally:
+                # we might have missed invalidations
+                self.listening = False
+                self.clear()
+                pubsub.close()
+            await asyncio.sleep(5)
+
+
+class Pipeline:
+    """Queues storage commands and sends them in a single round trip.
+
+    Use it as an async context manager, the storage it yields queues every
+    command instead of sending it. Awaiting a command on it returns an
+    :class:`asyncio.Future` which resolves once the pipeline has been
+    executed, the results are also available in order as ``results``.
+
+        pipeline = storage.pipeline()
+        async with pipeline as pipe:
+            await pipe.get('incidents')
+            await pipe.exists('premium')
+        incidents, premium = pipeline.results
+
+    Don't await the returned futures inside of the ``async with`` block,
+    they are only resolved when it's left.
+
+    Pipelines without a transaction that only read are sent to a replica,
+    like single read only commands.
+    """
+    __slots__ = ('_storage', '_transaction', '_commands', '_reads_only',
+                 '_pending', '_written', '_sent', 'results')
+
+    def __init__(self, storage: Storage, transaction: bool = True):
+        self._storage = storage
+        self._transaction = transaction
+        # (command, args, kwargs), sent when the pipeline is executed
+        self._commands = []  # type: List[Tuple[str, tuple, dict]]
+        self._reads_only = True
+        # (future, callback, cached value or _NOT_SET, result hook, amount
+        # of replies if they are collected into a list)
+        self._pending = []  # type: List[Tuple[asyncio.Future, ...]]
+        self._written = []  # type: List[str]
+        # (command, key class) of the commands sent, for metrics
+        self._sent = []  # type: List[Tuple[str, str]]
+        self.results = None  # type: Optional[List[Any]]
+
+    async def __aenter__(self) -> Storage:
+        return self._storage._bind(self)
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            await self.execute()
+        else:
+            self._commands = []
+            for future, *_ in self._pending:
+                future.cancel()
+
+    async def queue(self, command: str, args: tuple, kwargs: dict,
+                    callback: Callable = None, *, value=_NOT_SET,
+                    hook: Callable = None, written: tuple = (),
+                    read: bool = False) -> asyncio.Future:
+        # commands with a value (e.g. from the cache) aren't sent at all
+        if value is _NOT_SET:
+            self._commands.append((command, args, kwargs))
+            self._reads_only = self._reads_only and read
+            if self._storage._observers:
+                self._sent.append(_label(command, args))
+        self._written.extend(written)
+        future = asyncio.get_event_loop().create_future()
+        self._pending.append((future, callback, value, hook, None))
+        return future
+
+    async def queue_many(self, command: str, args: List[tuple],
+                         callback: Callable = None) -> asyncio.Future:
+        # the same command once for every arguments, with a single result,
+        # the list of their replies
+        self._reads_only = self._reads_only and _is_read(command, ())
+        for x in args:
+            self._commands.append((command, x, {}))
+            if self._storage._observers:
+                self._sent.append(_label(command, x))
+        future = asyncio.get_event_loop().create_future()
+        self._pending.append((future, callback, _NOT_SET, None, len(args)))
+        return future
+
+    async def execute(self) -> List[Any]:
+        pending, self._pending = self._pending, []
+        written, self._written = self._written, []
+        sent, self._sent = self._sent, []
+        commands, self._commands = self._commands, []
+        storage = self._storage
+        if not self._transaction and self._reads_only \
+                and not storage._reads_primary('pipeline'):
+            client = random.choice(storage._replicas)
+        else:
+            client = storage._redis
+        self._reads_only = True
+        start = time.perf_counter()
+        pipeline = await client.pipeline(transaction=self._transaction)
+        for command, args, kwargs in commands:
+            await getattr(pipeline, command)(*args, **kwargs)
+        values = iter(await pipeline.execute())
+        self._storage._observe(sent, time.perf_counter() - start)
+        self._storage._inflight.clear()
+        await self._storage._invalidate(written)
+
+        self.results = []
+        for future, callback, value, hook, replies in pending:
+            if replies is not None:
+                value = [next(values) for _ in range(replies)]
+            elif value is _NOT_SET:
+                value = next(values)
+                if hook is not None:
+                    hook(value)
+            if callback is not None:
+                value = callback(value)
+            future.set_result(value)
+            self.results.append(value)
+        return self.results
 
-    def __init__(self, redis: aredis.StrictRedis, path: str = ''):
+
+class Storage(GetMixin):
+    """Key-value storage, with keys relative to ``path``.
+
+    ``redis`` is an `aredis.StrictRedis` client or any other backend
+    implementing the same commands, like
+    :class:`~incidentreporter.memory.MemoryBackend`. Single read only
+    commands are sent to one of the ``replicas`` if there are any, see
+    :meth:`read_your_writes`, as are pipelines without a transaction that
+    only read. Writes and other pipelines always go to ``redis``.
+    """
+    __slots__ = ('_redis', '_replicas', '_path', '_batch', '_cache',
+                 '_hash_tags', '_inflight', '_observers')
+
+    def __init__(self, redis: aredis.StrictRedis, path: str = '', *,
+                 cache: Cache = None, hash_tags: bool = False,
+                 replicas: List[aredis.StrictRedis] = ()):
         self._redis = redis
+        self._replicas = tuple(replicas)
         self._path = path
+        self._batch = None  # type: Optional[Pipeline]
+        self._cache = cache
+        self._hash_tags = hash_tags
+        # reads currently sent to redis, shared with every derived storage
+        self._inflight = {}  # type: Dict[tuple, asyncio.Future]
+        # shared as well, see observe
+        self._observers = []  # type: List[Callable]
 
     def __truediv__(self, other):
         if not self._path:
-            return Storage(self._redis, str(other))
-        return Storage(self._redis, self._path + SEPERATOR + str(other))
+            return self._derive(str(other))
+        return self._derive(self._path + SEPERATOR + str(other))
 
     def __getitem__(self, item) -> Storage:
-        return Storage(
-            self._redis,
+        return self._derive(
             SEPERATOR.join(self._path.split(SEPERATOR)[:item])
         )
 
+    def tag(self, other) -> Storage:
+        """Like ``/``, but in cluster mode all keys below are kept in the
+        same hash slot, so multi-key commands and pipelines work on them.
+        """
+        if self._hash_tags:
+            return self / f'{{{other}}}'
+        return self / other
+
+    def _derive(self, path: str) -> Storage:
+        storage = copy.copy(self)
+        storage._path = path
+        return storage
+
+    def _bind(self, batch: Optional[Pipeline]) -> Storage:
+        storage = copy.copy(self)
+        storage._batch = batch
+        return storage
+
+    def observe(self, observer: Callable[[str, str, Optional[float]], None]):
+        """Calls ``observer(command, key class, seconds)`` for every command
+        sent to redis, with the duration of its round trip.
+
+        Pipelines of several commands are observed as a whole, as command
+        ``'pipeline'`` without a key, and their commands without a duration.
+        Scripts are observed as ``'script:<name>'``, cached and coalesced
+        reads aren't observed.
+        """
+        self._observers.append(observer)
+
+    def unobserve(self, observer: Callable):
+        self._observers.remove(observer)
+
+    def _observe(self, commands: List[Tuple[str, str]], seconds: float):
+        if not self._observers or not commands:
+            return
+        if len(commands) == 1:
+            labels = [(*commands[0], seconds)]
+        else:
+            labels = [('pipeline', '', seconds),
+                      *[(*x, None) for x in commands]]
+        for observer in self._observers:
+            for command, key, duration in labels:
+                observer(command, key, duration)
+
+    @staticmethod
+    @contextlib.contextmanager
+    def read_your_writes(primary: bool = False):
+        """Reads in this context go to the primary after the first write.
+
+        Replicas lag behind, so without it a value that was just written
+        might not be read back. The context is inherited by tasks started
+        in it, like one invocation of a discord command. With ``primary``,
+        reads go to the primary from the start, for data another process
+        may have just written.
+        """
+        session = _Session()
+        session.wrote = primary
+        token = _session.set(session)
+        try:
+            yield
+        finally:
+            _session.reset(token)
+
+    def _reads_primary(self, command: str) -> bool:
+        # scan cursors are only valid on the server that returned them
+        if not self._replicas or command == 'scan':
+            return True
+        session = _session.get()
+        return session is not None and session.wrote
+
+    def _replica(self, command: str, args: tuple):
+        # the pages of a key are read from the same replica, as a cursor is
+        # only valid on the server that returned it
+        if command in CURSOR_COMMANDS:
+            index = zlib.crc32(args[0].encode()) % len(self._replicas)
+            return self._replicas[index]
+        return random.choice(self._replicas)
+
+    async def _scan(self, command: str, *args, match: str = None,
+                    count: int = None) -> AsyncGenerator:
+        # the pages of a command in CURSOR_COMMANDS
+        cursor = 0
+        while True:
+            cursor, data = await self._execute(
+                command, *args, cursor=cursor, match=match, count=count
+            )
+            yield data
+            if not int(cursor):
+                break
+
+    async def _execute(self, command: str, *args, callback: Callable = None,
+                       cache_as: Tuple[str, str] = None, **kwargs):
+        # every command goes through here, so pipelines can queue them
+        # cache_as = (name, key) caches the reply of a read only command
+        # that isn't in CACHED_COMMANDS
+        read = cache_as is not None or _is_read(command, args)
+        if not read:
+            session = _session.get()
+            if session is not None:
+                session.wrote = True
+        cache, cached, hook, written = self._cache, _NOT_SET, None, ()
+        if cache is not None:
+            if cache_as is None and command in CACHED_COMMANDS \
+                    and len(args) == 1:
+                cache_as = (command, args[0])
+            if cache_as is not None:
+                name, key = cache_as
+                if cache.caches(key):
+                    if cache.listening:
+                        cached = cache.get(name, key)
+                    generation = cache.generation
+
+                    def hook(value):
+                        cache.set(name, key, value, generation)
+            else:
+                written = tuple(x for x in _written_keys(command, args, kwargs)
+                                if cache.caches(x))
+
+        if self._batch is not None:
+            return await self._batch.queue(
+                command, args, kwargs, callback,
+                value=cached, hook=hook, written=written, read=read
+            )
+
+        if cached is not _NOT_SET:
+            value = cached
+        elif read:
+            primary = self._reads_primary(command)
+
+            async def read():
+                # the replica is picked by the read that is sent, so the
+                # identical reads joining it may go to any of them
+                client = self._redis if primary \
+                    else self._replica(command, args)
+                start = time.perf_counter()
+                value = await getattr(client, command)(*args, **kwargs)
+                if self._observers:
+                    self._observe([_label(command, args)],
+                                  time.perf_counter() - start)
+                if hook is not None:
+                    hook(value)
+                return value
+
+            # concurrent identical reads share a single request and its
+            # reply, a read is only joined while it is in flight, so nothing
+            # is stale
+            flight = (primary, command,
+                      *[tuple(x) if isinstance(x, list) else x for x in args],
+                      *sorted(kwargs.items()))
+            value = await self._single_flight(flight, read)
+        else:
+            start = time.perf_counter()
+            value = await getattr(self._redis, command)(*args, **kwargs)
+            if self._observers:
+                self._observe([_label(command, args)],
+                              time.perf_counter() - start)
+            # reads sent before this write must not be joined anymore
+            self._inflight.clear()
+            await self._invalidate(written)
+        if callback is None:
+            return value
+        return callback(value)
+
+    async def _single_flight(self, key: tuple, request: Callable):
+        # awaits request(), or the request with the same key in flight
+        try:
+            future = self._inflight.get(key)
+        except TypeError:  # unhashable arguments
+            key = future = None
+
+        if future is None:
+            future = asyncio.ensure_future(request())
+            if key is not None:
+                self._inflight[key] = future
+
+                def done(_):
+                    if self._inflight.get(key) is future:
+                        del self._inflight[key]
+                future.add_done_callback(done)
+        # one caller being cancelled mustn't cancel the others
+        return await asyncio.shield(future)
+
+    async def _invalidate(self, keys):
+        if not keys:
+            return
+        self._cache.invalidate(*keys)
+        if self._cache.channel:
+            for key in keys:
+                await self._redis.publish(self._cache.channel, key)
+
+    def pipeline(self, transaction: bool = True) -> Pipeline:
+        return Pipeline(self, transaction)
+
+    # scripting
+    async def script(self, name: str, keys: List[str] = (),
+                     args: List[STRINGABLE] = (), *,
+                     callback: Callable = None):
+        """Runs a script from the registry atomically on the server.
+
+        Keys are relative to this storage, like for every other command.
+        """
+        script = SCRIPTS[name]
+        keys = [self._get_key(x) for x in keys]
+        cache_as = (name, keys[0]) if script.readonly and keys else None
+        if self._batch is not None:
+            # a NOSCRIPT error would fail the whole pipeline, and the
+            # scripts are small enough to just send them
+            return await self._execute('eval', script.source, len(keys),
+                                       *keys, *args, callback=callback,
+                                       cache_as=cache_as)
+
+        try:
+            return await self._execute('evalsha', script.sha, len(keys),
+                                       *keys, *args, callback=callback,
+                                       cache_as=cache_as)
+        except aredis.exceptions.NoScriptError:
+            # not loaded yet or the script cache has been flushed, every
+            # concurrent caller gets this error, but loading once is enough
+            await self._single_flight(
+                ('script_load', script.source),
+                lambda: self._load_script(script.source)
+            )
+            return await self._execute('evalsha', script.sha, len(keys),
+                                       *keys, *args, callback=callback,
+                                       cache_as=cache_as)
+
+    async def _load_script(self, source: str):
+        # read only scripts also run on the replicas
+        for redis in (self._redis, *self._replicas):
+            await redis.script_load(source)
+
+    async def load_scripts(self):
+        for script in SCRIPTS.values():
+            await self._load_script(script.source)
+
     def _get_key(self, key: str) -> str:
         if not key:
             return self._path
@@ -108,49 +789,97 @@ class Storage(GetMixin):
         elif only_if_nonexistent:
             kwargs['nx'] = True
 
-        return await self._redis.set(
+        return await self._execute(
+            'set',
             self._get_key(key),
             value,
             **kwargs
         )
 
-    async def get(self, key: str, default=None) -> bytes:
-        value = await self._redis.get(
-            self._get_key(key)
+    async def _get(self, key: str, callback: Callable):
+        return await self._execute(
+            'get',
+            self._get_key(key),
+            callback=callback
         )
-        if value is None:
-            return default
-        return value
 
     async def delete(self, key: str, *keys: str):
-        return await self._redis.delete(
+        return await self._execute(
+            'delete',
             self._get_key(key),
             *[self._get_key(x) for x in keys]
         )
 
     async def exists(self, key: str, *keys: str) -> int:
-        return await self._redis.exists(
+        return await self._execute(
+            'exists',
             self._get_key(key),
             *[self._get_key(x) for x in keys]
         )
 
+    # batch helpers
+    async def get_many(self, *keys: str, default=None) -> List[bytes]:
+        return await self._execute(
+            'mget',
+            [self._get_key(x) for x in keys],
+            callback=lambda values: [default if x is None else x
+                                     for x in values]
+        )
+
+    async def set_many(self, mapping: Dict[str, STRINGABLE]) -> bool:
+        return await self._execute(
+            'mset',
+            {self._get_key(k): v for k, v in mapping.items()}
+        )
+
+    async def exists_many(self, *keys: str) -> List[bool]:
+        # EXISTS only returns the total, so every key needs its own command
+        if self._batch is None:
+            pipeline = self.pipeline(transaction=False)
+            async with pipeline as pipe:
+                await pipe.exists_many(*keys)
+            return pipeline.results[0]
+        return await self._batch.queue_many(
+            'exists', [(self._get_key(x),) for x in keys],
+            callback=lambda replies: [bool(x) for x in replies]
+        )
+
     # scan
     async def scan(self, match: str = None,
                    count: int = None) -> AsyncGenerator[str]:
-        async for data in self._redis.scan_iter(
-                    self._get_key(match) if match else None,
-                    count
+        async for keys in self._scan(
+                    'scan', match=self._get_key(match) if match else None,
+                    count=count
                 ):
-            yield data.decode()
+            for key in keys:
+                yield key.decode()
+
+    async def scan_page(self, cursor: int = 0, match: str = None,
+                        count: int = None) -> Tuple[int, List[str]]:
+        """A single SCAN call, for iterating in steps that can be resumed.
+
+        Not supported in cluster mode, where every node has its own cursor.
+        """
+        return await self._execute(
+            'scan',
+            cursor,
+            match=self._get_key(match) if match else None,
+            count=count,
+            callback=lambda reply: (int(reply[0]),
+                                    [x.decode() for x in reply[1]])
+        )
 
     # expire functions
     async def ttl(self, key: str) -> float:
-        ttl = await self._redis.pttl(
-            self._get_key(key)
+        def callback(ttl):
+            if ttl > 0:
+                return ttl / 1000
+            return ttl
+        return await self._execute(
+            'pttl',
+            self._get_key(key),
+            callback=callback
         )
-        if ttl > 0:
-            return ttl / 1000
-        return ttl
 
     async def expire(self, key: str, expires: TIME_TYPE) -> bool:
         expires_in = self._to_relative_time(expires)
@@ -159,34 +888,43 @@ class Storage(GetMixin):
             return True
 
         if expires_in % 1:
-            return await self._redis.pexpire(
+            return await self._execute(
+                'pexpire',
                 self._get_key(key),
                 int(expires_in * 1000)
             )
-        return await self._redis.expire(
+        return await self._execute(
+            'expire',
             self._get_key(key),
             int(expires_in)
         )
 
     # integer operations
     async def increment(self, key: str) -> int:
-        return int(await self._redis.incr(
-            self._get_key(key)
-        ))
+        return await self._execute(
+            'incr',
+            self._get_key(key),
+            callback=int
+        )
 
     async def increment_by(self, key: str, amount: int) -> int:
-        return int(await self._redis.incrby(
+        return await self._execute(
+            'incrby',
             self._get_key(key),
-            amount
-        ))
+            amount,
+            callback=int
+        )
 
     async def decrement(self, key: str) -> int:
-        return int(await self._redis.decr(
-            self._get_key(key)
-        ))
+        return await self._execute(
+            'decr',
+            self._get_key(key),
+            callback=int
+        )
 
     async def decrement_by(self, key: str, amount: int) -> int:
-        return await self._redis.decrby(
+        return await self._execute(
+            'decrby',
             self._get_key(key),
             amount
         )
@@ -201,9 +939,10 @@ class Storage(GetMixin):
                 alpha: bool = False,
                 store: str = None
             ) -> Optional[List[bytes]]:
-        return await self._redis.sort(
+        return await self._execute(
+            'sort',
             self._get_key(key),
-            *[self._get_key(x) for x in get],
+            get=[x if x == '#' else self._get_key(x) for x in get] or None,
             by=self._get_key(by) if by else by,
             desc=desc,
             alpha=alpha,
@@ -213,29 +952,50 @@ class Storage(GetMixin):
     def as_dict(self, key: str) -> DictView:
         return DictView(self, key)
 
-    def as_list(self, key: str) -> ListView:
-        return ListView(self, key)
+    def as_list(self, key: str, chunk_size: int = CHUNK_SIZE) -> ListView:
+        return ListView(self, key, chunk_size)
 
     def as_set(self, key: str) -> SetView:
         return SetView(self, key)
 
+    def as_sorted_set(self, key: str) -> SortedSetView:
+        return SortedSetView(self, key)
+
+    def as_stream(self, key: str) -> StreamView:
+        return StreamView(self, key)
+
+    def as_record(self, key: str, fields: Sequence[str],
+                  legacy: str = None, *,
+                  legacy_reads: bool = True) -> RecordView:
+        return RecordView(self, key, fields, key if legacy is None else legacy,
+                          legacy_reads)
+
 
 class DictView(GetMixin):
     def __init__(self, storage: Storage, key: str):
         self._storage = storage
         self._key = key
 
-    async def get(self, key: str, default=None) -> bytes:
-        value = await self._storage._redis.hget(
+    async def _get(self, key: str, callback: Callable):
+        return await self._storage._execute(
+            'hget',
             self._storage._get_key(self._key),
-            key
+            key,
+            callback=callback
+        )
+
+    async def get_many(self, *keys: str, default=None) -> List[bytes]:
+        return await self._storage._execute(
+            'hmget',
+            self._storage._get_key(self._key),
+            keys,
+            callback=lambda values: [default if x is None else x
+                                     for x in values]
         )
-        if value is None:
-            return default
-        return value
 
     async def set(self, key: str, value: STRINGABLE):
-        await self._storage._redis.hset(
+        await self._storage._execute(
+            'hset',
             self._storage._get_key(self._key),
             key,
             value
@@ -268,94 +1028,182 @@ class DictView(GetMixin):
         args = []
         for item in mapping.items():
             args.extend(item)
-        await self._storage._redis.execute_command(
+        await self._storage._execute(
+            'execute_command',
             'HSET',
             self._storage._get_key(self._key),
             *args
         )
 
+    set_many = update
+
     async def clear(self):
         # there's no special clear command, so just delete it
         await self._storage.delete(self._key)
 
     async def keys(self):
-        return await self._storage._redis.hkeys(
+        return await self._storage._execute(
+            'hkeys',
             self._storage._get_key(self._key)
         )
 
     async def values(self):
-        return await self._storage._redis.hvals(
+        return await self._storage._execute(
+            'hvals',
             self._storage._get_key(self._key)
         )
 
-    async def items(self) -> AsyncGenerator[str]:
-        cursor = '0'
-        while cursor != 0:
-            cursor, data = await self._storage._redis.hscan(
-                self._storage._get_key(self._key), cursor=cursor
-            )
+    async def items(self) -> AsyncGenerator[Tuple[bytes, bytes]]:
+        async for data in self._storage._scan(
+                    'hscan', self._storage._get_key(self._key)
+                ):
             for item in data:
                 yield item, data[item]
 
     async def copy(self) -> dict:
-        dict = {}
-        async for key, value in self.items():
-            dict[key] = value
-        return dict
+        return await self._storage._execute(
+            'hgetall',
+            self._storage._get_key(self._key)
+        )
 
     async def pop(self, key: str):
-        value = await self.get(key)
-        await self.del_(key)
-        return value
+        return await self._storage.script('dict_pop', [self._key], [key])
 
     async def del_(self, key: str):
-        return await self._storage._redis.hdel(
+        return await self._storage._execute(
+            'hdel',
             self._storage._get_key(self._key),
             key
         )
 
     async def contains(self, key: str):
-        return await self._storage._redis.hexists(
+        return await self._storage._execute(
+            'hexists',
             self._storage._get_key(self._key),
             key
         )
 
     async def len(self):
-        return await self._storage._redis.hlen(
+        return await self._storage._execute(
+            'hlen',
             self._storage._get_key(self._key)
         )
 
-    async def __aiter__(self):
-        return self._storage._redis.hscan_iter(
-            self._storage._get_key(self._key)
+    def __aiter__(self) -> AsyncGenerator[Tuple[bytes, bytes]]:
+        return self.items()
+
+    __getitem__ = GetMixin.get
+
+
+class RecordView(GetMixin):
+    """A hash holding the scalar fields of one object.
+
+    Before schema v2 every field was stored in its own key, ``legacy:field``.
+    Fields that aren't in the hash yet are still read from those keys and
+    writes remove them, so the data can be migrated while the bot is running
+    (see :mod:`incidentreporter.schema`). Every read is a single round trip
+    returning the whole record, which is cached if its key is. Once the data
+    has been migrated, ``legacy_reads`` can be turned off so reads only read
+    the hash.
+    """
+
+    def __init__(self, storage: Storage, key: str, fields: Sequence[str],
+                 legacy: str, legacy_reads: bool = True):
+        self._storage = storage
+        self._key = key
+        self._fields = tuple(fields)
+        self._legacy = legacy
+        self._legacy_reads = legacy_reads
+
+    def _legacy_key(self, field: str) -> str:
+        if not self._legacy:
+            return field
+        return self._legacy + SEPERATOR + field
+
+    def _keys(self, fields: Sequence[str]) -> List[str]:
+        for field in fields:
+            if field not in self._fields:
+                raise KeyError(field)
+        return [self._key, *map(self._legacy_key, fields)]
+
+    async def _get(self, field: str, callback: Callable):
+        return await self.copy(
+            callback=lambda record: callback(record.get(field))
+        )
+
+    async def copy(self, *, callback: Callable = None) -> Dict[str, bytes]:
+        def parse(reply):
+            record = {reply[i].decode(): reply[i + 1]
+                      for i in range(0, len(reply), 2)}
+            if callback is None:
+                return record
+            return callback(record)
+        if not self._legacy_reads:
+            return await self._storage.script(
+                'record_getall', [self._key], callback=parse
+            )
+        return await self._storage.script(
+            'record_getall', self._keys(self._fields), self._fields,
+            callback=parse
+        )
+
+    async def get_many(self, *fields: str, default=None) -> List[bytes]:
+        return await self.copy(
+            callback=lambda record: [record.get(x, default) for x in fields]
         )
 
-    __getitem__ = get
+    async def contains(self, field: str) -> bool:
+        return await self.copy(callback=lambda record: field in record)
+
+    async def set(self, field: str, value: STRINGABLE):
+        await self.update({field: value})
+
+    async def update(self, mapping: Dict[str, STRINGABLE]):
+        args = []
+        for item in mapping.items():
+            args.extend(item)
+        await self._storage.script('record_set', self._keys(mapping), args)
+
+    async def del_(self, *fields: str) -> int:
+        return await self._storage.script('record_del', self._keys(fields),
+                                          fields)
+
+    async def migrate(self) -> int:
+        """Moves the fields from their legacy keys into the hash."""
+        return await self._storage.script(
+            'record_migrate', self._keys(self._fields), self._fields
+        )
+
+    __getitem__ = GetMixin.get
 
 
 class ListView(GetMixin):
-    def __init__(self, storage: Storage, key: str):
+    def __init__(self, storage: Storage, key: str,
+                 chunk_size: int = CHUNK_SIZE):
         self._storage = storage
         self._key = key
+        self.chunk_size = chunk_size
 
-    async def get(self, index: int, default=None) -> bytes:
-        value = await self._storage._redis.lindex(
+    async def _get(self, index: int, callback: Callable):
+        return await self._storage._execute(
+            'lindex',
             self._storage._get_key(self._key),
-            index
+            index,
+            callback=callback
         )
-        if value is None:
-            return default
-        return value
 
     async def set(self, index: int, object: STRINGABLE):
-        await self._storage._redis.lset(
+        await self._storage._execute(
+            'lset',
             self._storage._get_key(self._key),
             index,
             object
         )
 
-    async def append(self, object: STRINGABLE):
-        await self._storage._redis.rpush(
+    async def append(self, object: STRINGABLE) -> int:
+        """Appends an item and returns the new length of the list."""
+        return await self._storage._execute(
+            'rpush',
             self._storage._get_key(self._key),
             object
         )
@@ -365,73 +1213,134 @@ class ListView(GetMixin):
         await self._storage.delete(self._key)
 
     async def copy(self):
-        copy = []
-        async for object in self:
-            copy.append(object)
-        return copy
-
-    async def count(self, object: STRINGABLE):
-        if not isinstance(object, bytes):
-            object = str(object).encode()
-        total = 0
-        async for item in self:
-            if item == object:
-                total += 1
-        return total
+        return await self._storage._execute(
+            'lrange',
+            self._storage._get_key(self._key),
+            0, -1
+        )
+
+    async def slice(self, start: int = 0, stop: int = None, *,
+                    callback: Callable = None) -> List[bytes]:
+        """Returns the items in [start:stop], like slicing a list."""
+        if stop == 0:
+            return [] if callback is None else callback([])
+        return await self._storage._execute(
+            'lrange',
+            self._storage._get_key(self._key),
+            start, -1 if stop is None else stop - 1,
+            callback=callback
+        )
+
+    async def tail(self, n: int) -> List[bytes]:
+        """Returns the last n items."""
+        if n <= 0:
+            return []
+        return await self._storage._execute(
+            'lrange',
+            self._storage._get_key(self._key),
+            -n, -1
+        )
+
+    async def _positions(self, object: STRINGABLE, *options,
+                         callback: Callable = None):
+        # LPOS is not supported by aredis yet
+        return await self._storage._execute(
+            'execute_command',
+            'LPOS',
+            self._storage._get_key(self._key),
+            object,
+            *options,
+            callback=callback
+        )
+
+    async def count(self, object: STRINGABLE) -> int:
+        return await self._positions(object, 'COUNT', 0, callback=len)
 
     async def extend(self, objects):
-        await self._storage._redis.rpush(
+        await self._storage._execute(
+            'rpush',
             self._storage._get_key(self._key),
             *objects
         )
 
     async def index(self, object: STRINGABLE, start: int = 0,
-                    stop: int = 9223372036854775807):
-        if not isinstance(object, bytes):
-            object = str(object).encode()
-        itemno = 0  # enumerate doesn't work with async-iterators
-        async for item in self:
-            if item == object and itemno > start:
-                return itemno
-            itemno += 1
-            if itemno >= stop:
-                break
+                    stop: int = None) -> Optional[int]:
+        options = () if stop is None else ('MAXLEN', stop)
+        if not start:
+            return await self._positions(object, *options)
+
+        # LPOS can't start at an offset, so only the positions are fetched
+        def callback(positions):
+            for position in positions:
+                if position >= start:
+                    return position
+        return await self._positions(object, 'COUNT', 0, *options,
+                                     callback=callback)
 
     async def pop(self, index: int = -1):
         if index == -1:
-            return await self._storage._redis.rpop(
+            return await self._storage._execute(
+                'rpop',
                 self._storage._get_key(self._key)
             )
-        value = await self.get(index)
-        await self.del_(index)
-        return value
+        # this is not really secure, but should never collide
+        return await self._storage.script(
+            'list_pop', [self._key], [index, b'_' + os.urandom(32)]
+        )
 
     async def remove(self, value: STRINGABLE):
-        await self._storage._redis.lrem(
+        await self._storage._execute(
+            'lrem',
             self._storage._get_key(self._key),
             1,
             value
         )
 
-    async def del_(self, index: int):
-        # this is not really secure, but should never collide
-        value = b'_' + os.urandom(32)
-        await self.set(index, value)
-        await self.remove(value)
+    async def del_(self, index: int) -> bool:
+        return await self._storage.script(
+            'list_pop', [self._key], [index, b'_' + os.urandom(32)],
+            callback=lambda value: value is not None
+        )
 
     async def len(self):
-        return await self._storage._redis.llen(
+        return await self._storage._execute(
+            'llen',
             self._storage._get_key(self._key)
         )
 
     async def __aiter__(self):
-        for object in await self._storage._redis.lrange(
-                    self._storage._get_key(self._key),
-                    0, -1
-                ):
-            yield object
+        # iterating is never pipelined
+        storage = self._storage._bind(None)
+        start = 0
+        while True:
+            chunk = await storage._execute(
+                'lrange',
+                storage._get_key(self._key),
+                start, start + self.chunk_size - 1
+            )
+            for object in chunk:
+                yield object
+            if len(chunk) < self.chunk_size:
+                break
+            start += self.chunk_size
+
+    async def reversed(self):
+        """Iterates over the list starting from the last item."""
+        storage = self._storage._bind(None)
+        end = -1
+        while True:
+            chunk = await storage._execute(
+                'lrange',
+                storage._get_key(self._key),
+                end - self.chunk_size + 1, end
+            )
+            for object in chunk[::-1]:
+                yield object
+            if len(chunk) < self.chunk_size:
+                break
+            end -= self.chunk_size
 
-    __getitem__ = get
+    __getitem__ = GetMixin.get
 
 
 class SetView:
@@ -440,7 +1349,8 @@ class SetView:
         self._key = key
 
     async def add(self, item: STRINGABLE):
-        await self._storage._redis.sadd(
+        await self._storage._execute(
+            'sadd',
             self._storage._get_key(self._key),
             item
         )
@@ -450,41 +1360,250 @@ class SetView:
         await self._storage.delete(self._key)
 
     async def copy(self):
-        s = set()
-        async for item in self:
-            s.add(item)
-        return s
+        return await self._storage._execute(
+            'smembers',
+            self._storage._get_key(self._key)
+        )
 
     async def extend(self, items):
-        await self._storage._redis.sadd(
+        await self._storage._execute(
+            'sadd',
             self._storage._get_key(self._key),
             *items
         )
 
     async def pop(self):
-        return await self._storage._redis.spop(
+        return await self._storage._execute(
+            'spop',
             self._storage._get_key(self._key)
         )
 
     async def remove(self, item: STRINGABLE):
-        await self._storage._redis.srem(
+        await self._storage._execute(
+            'srem',
             self._storage._get_key(self._key),
             item
         )
 
     async def contains(self, item: STRINGABLE):
-        return await self._storage._redis.sismember(
+        return await self._storage._execute(
+            'sismember',
             self._storage._get_key(self._key),
             item
         )
 
+    async def contains_many(self, *items: STRINGABLE) -> List[bool]:
+        if self._storage._batch is None:
+            pipeline = self._storage.pipeline(transaction=False)
+            async with pipeline as pipe:
+                await pipe.as_set(self._key).contains_many(*items)
+            return pipeline.results[0]
+        key = self._storage._get_key(self._key)
+        return await self._storage._batch.queue_many(
+            'sismember', [(key, x) for x in items],
+            callback=lambda replies: [bool(x) for x in replies]
+        )
+
     async def len(self):
-        return await self._storage._redis.scard(
+        return await self._storage._execute(
+            'scard',
             self._storage._get_key(self._key)
         )
 
     async def __aiter__(self):
-        async for item in self._storage._redis.sscan_iter(
-                    self._storage._get_key(self._key)
+        async for items in self._storage._scan(
+                    'sscan', self._storage._get_key(self._key)
                 ):
-            yield item
+            for item in items:
+                yield item
+
+
+class SortedSetView:
+    """A sorted set of members, each with a float score.
+
+    The members are ordered by their score, members with the same score by
+    their bytes, so ranges are read without sorting anything client side.
+    Score bounds may be floats, ``'-inf'``, ``'+inf'`` or exclusive bounds
+    like ``'(5'``.
+    """
+
+    def __init__(self, storage: Storage, key: str):
+        self._storage = storage
+        self._key = key
+
+    async def add(self, item: STRINGABLE, score: float,
+                  only_if_nonexistent: bool = False,
+                  only_if_exists: bool = False) -> int:
+        """Sets the score of an item, returns whether it was added."""
+        if only_if_nonexistent or only_if_exists:
+            return await self._storage._execute(
+                'zaddoption',
+                self._storage._get_key(self._key),
+                'NX' if only_if_nonexistent else 'XX',
+                score, item
+            )
+        return await self._storage._execute(
+            'zadd',
+            self._storage._get_key(self._key),
+            score, item
+        )
+
+    async def update(self, mapping: Dict[STRINGABLE, float]) -> int:
+        """Sets the scores of several items, returns how many were added."""
+        if not mapping:
+            return 0
+        args = []
+        for item, score in mapping.items():
+            args += (score, item)
+        return await self._storage._execute(
+            'zadd',
+            self._storage._get_key(self._key),
+            *args
+        )
+
+    async def clear(self):
+        # there's no special clear command, so just delete it
+        await self._storage.delete(self._key)
+
+    async def remove(self, *items: STRINGABLE) -> int:
+        return await self._storage._execute(
+            'zrem',
+            self._storage._get_key(self._key),
+            *items
+        )
+
+    async def remove_by_score(self, min: SCORE_TYPE,
+                              max: SCORE_TYPE) -> int:
+        return await self._storage._execute(
+            'zremrangebyscore',
+            self._storage._get_key(self._key),
+            min, max
+        )
+
+    async def score(self, item: STRINGABLE) -> Optional[float]:
+        return await self._storage._execute(
+            'zscore',
+            self._storage._get_key(self._key),
+            item
+        )
+
+    async def slice(self, start: int = 0, stop: int = None, *,
+                    desc: bool = False, withscores: bool = False) -> list:
+        """Returns the items in [start:stop] by rank, like slicing a list.
+
+        With ``withscores`` the items are ``(item, score)`` tuples.
+        """
+        if stop == 0:
+            return []
+        return await self._storage._execute(
+            'zrevrange' if desc else 'zrange',
+            self._storage._get_key(self._key),
+            start, -1 if stop is None else stop - 1,
+            withscores=withscores
+        )
+
+    async def range_by_score(self, min: SCORE_TYPE = '-inf',
+                             max: SCORE_TYPE = '+inf', *,
+                             offset: int = None, count: int = None,
+                             desc: bool = False,
+                             withscores: bool = False) -> list:
+        """Returns the items with a score between min and max.
+
+        ``offset`` and ``count`` page through the items, which are in
+        descending order with ``desc``.
+        """
+        if count is not None and offset is None:
+            offset = 0
+        key = self._storage._get_key(self._key)
+        if desc:
+            return await self._storage._execute(
+                'zrevrangebyscore', key, max, min, offset, count,
+                withscores=withscores
+            )
+        return await self._storage._execute(
+            'zrangebyscore', key, min, max, offset, count,
+            withscores=withscores
+        )
+
+    async def count(self, min: SCORE_TYPE = '-inf',
+                    max: SCORE_TYPE = '+inf') -> int:
+        return await self._storage._execute(
+            'zcount',
+            self._storage._get_key(self._key),
+            min, max
+        )
+
+    async def len(self):
+        return await self._storage._execute(
+            'zcard',
+            self._storage._get_key(self._key)
+        )
+
+
+class StreamView:
+    """An append only log of entries, each a dict of fields.
+
+    Entries are identified by ids like ``b'1614556800000-0'``, the time
+    they were added at in milliseconds and a sequence number, so ranges of
+    entries are ranges of time. A bound may be a full id, a time in
+    milliseconds or ``'-'`` or ``'+'`` for the first or last entry, bounds
+    are inclusive. Exclusive bounds (``b'(1614556800000-0'``) require redis
+    6.2, so they aren't used. Entries are returned as ``(id, {field:
+    value})`` tuples. Requires redis 5.
+    """
+
+    def __init__(self, storage: Storage, key: str):
+        self._storage = storage
+        self._key = key
+
+    async def add(self, fields: Dict[str, STRINGABLE],
+                  max_len: int = None) -> bytes:
+        """Appends an entry and returns its id, the oldest entries are
+        trimmed to about ``max_len`` entries."""
+        return await self._storage._execute(
+            'xadd',
+            self._storage._get_key(self._key),
+            fields,
+            max_len=max_len
+        )
+
+    async def clear(self):
+        # there's no special clear command, so just delete it
+        await self._storage.delete(self._key)
+
+    async def range(self, start: STRINGABLE = '-', end: STRINGABLE = '+',
+                    count: int = None, *,
+                    callback: Callable = None) -> List[tuple]:
+        """Returns the entries between start and end, oldest first."""
+        return await self._storage._execute(
+            'xrange',
+            self._storage._get_key(self._key),
+            start, end, count,
+            callback=callback
+        )
+
+    async def revrange(self, start: STRINGABLE = '+', end: STRINGABLE = '-',
+                       count: int = None, *,
+                       callback: Callable = None) -> List[tuple]:
+        """Returns the entries between start and end, newest first."""
+        return await self._storage._execute(
+            'xrevrange',
+            self._storage._get_key(self._key),
+            start, end, count,
+            callback=callback
+        )
+
+    async def trim(self, max_len: int) -> int:
+        """Removes the oldest entries until there are ``max_len`` left."""
+        return await self._storage._execute(
+            'xtrim',
+            self._storage._get_key(self._key),
+            max_len,
+            approximate=False
+        )
+
+    async def len(self):
+        return await self._storage._execute(
+            'xlen',
+            self._storage._get_key(self._key)
+        )
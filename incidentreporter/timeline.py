@@ -0,0 +1,286 @@
+"""Storage of the updates of an incident, its timeline.
+
+The updates are stored in one of two ways, chosen for every incident when
+it's created (``timeline`` in its record):
+
+    list     guild:{id}:incident:{n}:updates   a list, the default
+    stream   guild:{id}:incident:{n}:stream    a redis stream
+
+The stream isn't stored in ``incident:{n}:timeline``, which is the key of
+the ``timeline`` field in the schema v1 layout.
+
+The stream's entry ids are the times the updates were stored at, so the
+updates of a time window are read with a single XRANGE and the latest ones
+with XREVRANGE, without reading the rest of the timeline. Streams require
+redis 5.
+
+Long timelines of both kinds are compacted, only the latest updates are
+kept in the timeline, older ones are moved to a list that is only read for
+exports and summarised in a hash:
+
+    guild:{id}:incident:{n}:archive    the archived updates
+    guild:{id}:incident:{n}:snapshot   archived, first
+
+``archived`` is the amount of archived updates and ``first`` the first
+update of the incident, which tells when it started.
+"""
+
+from __future__ import annotations
+
+import datetime
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+from .codec import UpdateCodec
+from .storage import CHUNK_SIZE, Storage, register_script
+
+
+# field of the stream entries holding the update
+FIELD = 'u'
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+_MILLISECOND = datetime.timedelta(milliseconds=1)
+
+# KEYS = timeline, archive, snapshot, ARGV = amount of updates kept, length
+# of the timeline at which it is compacted, returns the amount of updates
+# moved, the amount of archived updates and the first update
+register_script('updates_compact', """
+local length = redis.call('LLEN', KEYS[1])
+local moved = 0
+if tonumber(ARGV[1]) > 0 and length >= tonumber(ARGV[2]) then
+    moved = length - tonumber(ARGV[1])
+    redis.call('HSETNX', KEYS[3], 'first', redis.call('LINDEX', KEYS[1], 0))
+    -- unpack() is limited in the amount of values
+    for start = 0, moved - 1, 1000 do
+        local stop = math.min(start + 1000, moved) - 1
+        redis.call('RPUSH', KEYS[2],
+                   unpack(redis.call('LRANGE', KEYS[1], start, stop)))
+    end
+    redis.call('LTRIM', KEYS[1], moved, -1)
+    redis.call('HINCRBY', KEYS[3], 'archived', moved)
+end
+local snapshot = redis.call('HMGET', KEYS[3], 'archived', 'first')
+return {moved, snapshot[1], snapshot[2]}
+""")
+
+# same as updates_compact, for streams
+register_script('timeline_compact', """
+local length = redis.call('XLEN', KEYS[1])
+local moved = 0
+if tonumber(ARGV[1]) > 0 and length >= tonumber(ARGV[2]) then
+    moved = length - tonumber(ARGV[1])
+    local entries = redis.call('XRANGE', KEYS[1], '-', '+', 'COUNT', moved)
+    redis.call('HSETNX', KEYS[3], 'first', entries[1][2][2])
+    local updates = {}
+    for i, entry in ipairs(entries) do
+        updates[#updates + 1] = entry[2][2]
+        if #updates == 1000 or i == #entries then
+            redis.call('RPUSH', KEYS[2], unpack(updates))
+            updates = {}
+        end
+    end
+    redis.call('XTRIM', KEYS[1], 'MAXLEN', ARGV[1])
+    redis.call('HINCRBY', KEYS[3], 'archived', moved)
+end
+local snapshot = redis.call('HMGET', KEYS[3], 'archived', 'first')
+return {moved, snapshot[1], snapshot[2]}
+""")
+
+
+def _parse_snapshot(reply) -> Tuple[int, int, Optional[bytes]]:
+    moved, archived, first = reply
+    return moved, int(archived or 0), first
+
+
+def _millis(time: datetime.datetime) -> int:
+    return (time - _EPOCH) // _MILLISECOND
+
+
+def _next_id(id: bytes) -> bytes:
+    # the id right after an entry id, as XRANGE bounds are inclusive
+    millis, _, sequence = id.partition(b'-')
+    return millis + b'-' + str(int(sequence) + 1).encode()
+
+
+def _updates(entries: List[Tuple[bytes, Dict[bytes, bytes]]]) -> List[bytes]:
+    return [entry[FIELD.encode()] for _, entry in entries]
+
+
+class Timeline:
+    """The updates of an incident that aren't archived, oldest first.
+
+    Works in pipelines like the views of :class:`Storage`.
+    """
+    # the kind of the timeline in the incident record
+    kind = None  # type: str
+    # name of the key, below the incident
+    key = None  # type: str
+    _compact_script = None  # type: str
+
+    def __init__(self, storage: Storage, incident: int, key: str = None):
+        self._storage = storage
+        self._incident = incident
+        self._key = f'incident:{incident}:{key or self.key}'
+
+    async def append(self, update: bytes) -> int:
+        """Appends an update and returns the amount of updates."""
+        raise NotImplementedError
+
+    async def len(self) -> int:
+        raise NotImplementedError
+
+    async def first(self) -> Optional[bytes]:
+        raise NotImplementedError
+
+    async def copy(self) -> List[bytes]:
+        raise NotImplementedError
+
+    async def tail(self, n: int) -> List[bytes]:
+        """Returns the latest n updates."""
+        raise NotImplementedError
+
+    async def between(self, start: datetime.datetime,
+                      end: datetime.datetime) -> List[bytes]:
+        """Returns the updates between start and end, inclusive.
+
+        Lists are read from their end back to start in several round trips,
+        so this doesn't work in pipelines for them.
+        """
+        raise NotImplementedError
+
+    async def page(self, cursor: Any = None,
+                   count: int = CHUNK_SIZE) -> Tuple[Any, List[bytes]]:
+        """Returns up to ``count`` updates and the cursor of the next page,
+        which is None after the last one."""
+        raise NotImplementedError
+
+    async def compact(self, keep: int) -> Tuple[int, int, Optional[bytes]]:
+        """Compacts the timeline once there are twice as many updates as
+        ``keep``, 0 never compacts it.
+
+        Returns the amount of updates that were moved to the archive, the
+        amount of archived updates and the first update, if it was archived.
+        """
+        prefix = f'incident:{self._incident}:'
+        return await self._storage.script(
+            self._compact_script,
+            [self._key, prefix + 'archive', prefix + 'snapshot'],
+            [keep, keep * 2],
+            callback=_parse_snapshot
+        )
+
+
+class ListTimeline(Timeline):
+    kind = 'list'
+    key = 'updates'
+    _compact_script = 'updates_compact'
+
+    def __init__(self, storage: Storage, incident: int, key: str = None):
+        super().__init__(storage, incident, key)
+        self._list = storage.as_list(self._key)
+
+    async def append(self, update: bytes) -> int:
+        return await self._list.append(update)
+
+    async def len(self) -> int:
+        return await self._list.len()
+
+    async def first(self) -> Optional[bytes]:
+        return await self._list.get(0)
+
+    async def copy(self) -> List[bytes]:
+        return await self._list.copy()
+
+    async def tail(self, n: int) -> List[bytes]:
+        return await self._list.tail(n)
+
+    async def between(self, start: datetime.datetime,
+                      end: datetime.datetime) -> List[bytes]:
+        # the times are only stored in the updates, which are appended in
+        # the order of their times, so only the updates from the first one
+        # before start on are read
+        updates = []
+        async for update in self._list.reversed():
+            time = UpdateCodec.decode_time(update)
+            if time < start:
+                break
+            if time <= end:
+                updates.append(update)
+        return updates[::-1]
+
+    async def page(self, cursor: int = None,
+                   count: int = CHUNK_SIZE) -> Tuple[Any, List[bytes]]:
+        cursor = cursor or 0
+
+        def callback(updates):
+            return (cursor + count if len(updates) == count else None,
+                    updates)
+        return await self._list.slice(cursor, cursor + count,
+                                      callback=callback)
+
+
+class StreamTimeline(Timeline):
+    """A timeline whose entry ids are the times the updates were stored
+    at, which are a few milliseconds after the times of the updates."""
+    kind = 'stream'
+    key = 'stream'
+    _compact_script = 'timeline_compact'
+
+    def __init__(self, storage: Storage, incident: int, key: str = None):
+        super().__init__(storage, incident, key)
+        self._stream = storage.as_stream(self._key)
+
+    async def append(self, update: bytes) -> int:
+        await self._stream.add({FIELD: update})
+        return await self._stream.len()
+
+    async def len(self) -> int:
+        return await self._stream.len()
+
+    async def first(self) -> Optional[bytes]:
+        return await self._stream.range(
+            count=1, callback=lambda entries: (_updates(entries) or [None])[0]
+        )
+
+    async def copy(self) -> List[bytes]:
+        return await self._stream.range(callback=_updates)
+
+    async def tail(self, n: int) -> List[bytes]:
+        if n <= 0:
+            return []
+        return await self._stream.revrange(
+            count=n, callback=lambda entries: _updates(entries)[::-1]
+        )
+
+    async def between(self, start: datetime.datetime,
+                      end: datetime.datetime) -> List[bytes]:
+        # an id without a sequence number is the first entry of that
+        # millisecond as start, and the last one as end
+        return await self._stream.range(_millis(start), _millis(end),
+                                        callback=_updates)
+
+    async def page(self, cursor: bytes = None,
+                   count: int = CHUNK_SIZE) -> Tuple[Any, List[bytes]]:
+        def callback(entries):
+            next = _next_id(entries[-1][0]) if len(entries) == count \
+                else None
+            return next, _updates(entries)
+        return await self._stream.range(cursor or '-', '+', count,
+                                        callback=callback)
+
+
+TIMELINES = {
+    ListTimeline.kind: ListTimeline,
+    StreamTimeline.kind: StreamTimeline
+}  # type: Dict[str, Type[Timeline]]
+
+
+def timeline(storage: Storage, incident: int,
+             kind: Optional[str]) -> Timeline:
+    """The timeline of an incident, ``kind`` is ``timeline`` of its record,
+    incidents without one have a list."""
+    return TIMELINES[kind or ListTimeline.kind](storage, incident)
+
+
+def archive(storage: Storage, incident: int) -> ListTimeline:
+    """The archived updates of an incident, see :meth:`Timeline.compact`."""
+    return ListTimeline(storage, incident, 'archive')
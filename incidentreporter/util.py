@@ -1,7 +1,7 @@
 
 from discord.ext import commands
 
-from .storage import Storage
+from .context import GuildContext
 
 
 class NotStaff(commands.CheckFailure):
@@ -18,13 +18,13 @@ class GuildBanned(commands.CheckFailure):
 
 def is_staff():
     async def predicate(ctx: commands.Context):
+        if ctx.guild is None:
+            raise commands.NoPrivateMessage()
         if ctx.channel.permissions_for(ctx.author).manage_guild:
             return True
-        storage = ctx.bot.get_storage(ctx.guild)  # type: Storage
-        roles = set(x.id for x in ctx.author.roles)
-        async for role in storage.as_set('staff'):
-            if int(role) in roles:
-                return True
+        guild_context = ctx.guild_context  # type: GuildContext
+        if not guild_context.staff.isdisjoint(x.id for x in ctx.author.roles):
+            return True
 
         raise NotStaff()
 
@@ -33,8 +33,10 @@ def is_staff():
 
 def has_premium():
     async def predicate(ctx: commands.Context):
-        storage = ctx.bot.get_storage(ctx.guild)  # type: Storage
-        if await storage.exists('premium'):
+        if ctx.guild is None:
+            raise commands.NoPrivateMessage()
+        guild_context = ctx.guild_context  # type: GuildContext
+        if guild_context.premium:
             return True
         raise NotPremium()
 
@@ -43,10 +45,9 @@ def has_premium():
 
 def is_guild_banned():
     async def predicate(ctx: commands.Context):
-        storage = ctx.bot.get_storage(ctx.guild)  # type: Storage
-        reason = await storage.get_str('ban')
-        if reason is None:
+        guild_context = ctx.guild_context  # type: GuildContext
+        if guild_context is None or guild_context.ban is None:
             return True
-        raise GuildBanned(reason)
+        raise GuildBanned(guild_context.ban)
 
     return commands.check(predicate)
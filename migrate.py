@@ -0,0 +1,48 @@
+"""Migrates the data in redis to the current storage schema.
+
+The migration can run while the bot is online and can be interrupted and
+restarted at any time, it continues where it stopped. Running bots notice
+that it's done within a few minutes and stop reading the keys of the old
+schema, so new installations should run it once too. It also indexes the
+incidents that weren't updated since the incidents command was added, so
+they are listed by it.
+
+    python migrate.py [batch size]
+"""
+
+import asyncio
+import configparser
+import functools
+import logging
+import sys
+
+import aredis
+
+from incidentreporter.codec import UpdateCodec
+from incidentreporter.ext.incidents import STATES, Incidents
+from incidentreporter.schema import Migrator
+from incidentreporter.storage import Storage
+
+
+async def main():
+    config = configparser.ConfigParser()
+    config.read('config.ini')
+    logging.basicConfig(level=logging.INFO)
+
+    if config.getboolean('general', 'redis cluster', fallback=False):
+        print('Migrating a redis cluster is not supported, migrate the data '
+              'before moving it to the cluster.')
+        exit(1)
+
+    redis = aredis.StrictRedis.from_url(config.get('general', 'redis'))
+    batch_size = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    # decoding doesn't depend on the format new updates are stored in
+    backfill = functools.partial(Incidents.backfill, UpdateCodec(STATES))
+    migrator = Migrator(Storage(redis), backfill, batch_size)
+
+    await migrator.run()
+    print(f'Storage schema is at version {await migrator.version()}')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
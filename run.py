@@ -6,6 +6,7 @@ import logging
 import aredis
 
 from incidentreporter.bot import IncidentReporterBot
+from incidentreporter.memory import MemoryBackend
 
 # change default event loop to uvloop (faster than asyncio)
 # but it's not available on windows, so we make it optional
@@ -17,6 +18,15 @@ else:
     asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
 
 
+# config option, aredis connection pool argument, type
+POOL_OPTIONS = (
+    ('redis max connections', 'max_connections', int),
+    ('redis max idle time', 'max_idle_time', float),
+    ('redis connect timeout', 'connect_timeout', float),
+    ('redis timeout', 'stream_timeout', float),
+)
+
+
 async def main():
     config = configparser.ConfigParser()
     config.read('config.ini')
@@ -26,15 +36,36 @@ async def main():
         print('No bot token found in config.ini')
         exit(1)
 
-    redis = aredis.StrictRedis.from_url(config.get('general', 'redis'))
+    pool = {}
+    for option, key, cast in POOL_OPTIONS:
+        value = config.get('general', option, fallback='')
+        if value:
+            pool[key] = cast(value)
+
+    url = config.get('general', 'redis')
+    replicas = []
+    if url.startswith('memory://'):
+        redis = MemoryBackend.from_url(url)
+    elif config.getboolean('general', 'redis cluster', fallback=False):
+        redis = aredis.StrictRedisCluster.from_url(
+            url, skip_full_coverage_check=True, **pool
+        )
+    else:
+        redis = aredis.StrictRedis.from_url(url, **pool)
+        replicas = [
+            aredis.StrictRedis.from_url(x, **pool)
+            for x in config.get('general', 'redis replicas',
+                                fallback='').split()
+        ]
     try:
-        await redis.exists('test')
+        for client in (redis, *replicas):
+            await client.exists('test')
     except aredis.exceptions.ConnectionError:
         print('Redis server is not running. Please make sure the URI in the '
               'config is correct.')
         exit(2)
 
-    bot = IncidentReporterBot(config, redis)
+    bot = IncidentReporterBot(config, redis, replicas)
     await bot.start(config.get('general', 'bot token'))
     if getattr(bot, 'restart'):
         import subprocess, sys
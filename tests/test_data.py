@@ -0,0 +1,34 @@
+import unittest
+
+from incidentreporter import schema
+from incidentreporter.ext.data import delete_guild
+from incidentreporter.ext.incidents import STALE
+from incidentreporter.ext.maintenance import DUE, Maintenance
+from incidentreporter.memory import MemoryBackend
+from incidentreporter.storage import Storage
+
+
+class DeleteGuildTest(unittest.IsolatedAsyncioTestCase):
+    async def test_global_entries(self):
+        storage = Storage(MemoryBackend())
+        guilds = storage / 'guild'
+        for guild in (1, 2):
+            gstorage = guilds.tag(guild)
+            await schema.incident(gstorage, 3).update({'state': 'Outage'})
+            await schema.incident_index(gstorage, 'open').add(3, 100)
+            await Maintenance.scheduled(gstorage).add(4, 200)
+            await storage.as_sorted_set(STALE).add(f'{guild}:3', 100)
+            await storage.as_sorted_set(DUE).add(f'{guild}:4', 200)
+
+        self.assertEqual(await delete_guild(storage, guilds.tag(1), 1), 3)
+        self.assertEqual(await guilds.tag(1).scan_page(match='*'), (0, []))
+        self.assertEqual(await storage.as_sorted_set(STALE).slice(),
+                         [b'2:3'])
+        self.assertEqual(await storage.as_sorted_set(DUE).slice(), [b'2:4'])
+        self.assertEqual(
+            await schema.incident(guilds.tag(2), 3).get('state'), b'Outage'
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
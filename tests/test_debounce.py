@@ -0,0 +1,37 @@
+import asyncio
+import unittest
+
+from incidentreporter.debounce import Debouncer
+
+
+class DebouncerTest(unittest.IsolatedAsyncioTestCase):
+    async def test_latest_call(self):
+        debouncer = Debouncer(0.01, 0.05)
+        first = debouncer.schedule('a', lambda: asyncio.sleep(0, 1))
+        second = debouncer.schedule('a', lambda: asyncio.sleep(0, 2))
+        self.assertEqual(await asyncio.gather(first, second), [2, 2])
+
+    async def test_cancelled_call(self):
+        async def cancelled():
+            raise asyncio.CancelledError()
+        future = Debouncer(0.01, 0.05).schedule('a', cancelled)
+        with self.assertRaises(asyncio.CancelledError):
+            await asyncio.wait_for(future, 1)
+
+    async def test_cancelled_while_waiting(self):
+        debouncer = Debouncer(0.01, 0.05)
+        future = debouncer.schedule('a', lambda: asyncio.sleep(0))
+        await asyncio.sleep(0)
+        for task in asyncio.all_tasks():
+            if task is not asyncio.current_task():
+                task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await asyncio.wait_for(future, 1)
+        # the next call starts a new burst
+        self.assertEqual(
+            await debouncer.schedule('a', lambda: asyncio.sleep(0, 1)), 1
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
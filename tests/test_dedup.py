@@ -0,0 +1,44 @@
+import unittest
+
+from incidentreporter import dedup
+from incidentreporter.memory import MemoryBackend
+from incidentreporter.storage import Storage
+
+
+class Http:
+    def __init__(self):
+        self.edits = []
+        self.fail = False
+
+    async def edit_message(self, channel, message, *, embed):
+        if self.fail:
+            raise ConnectionError()
+        self.edits.append(embed)
+
+
+class EditMessageTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.storage = Storage(MemoryBackend())
+        self.http = Http()
+
+    def edit(self, embed):
+        return dedup.edit_message(self.storage, self.http, 1, 2, embed)
+
+    async def test_unchanged(self):
+        self.assertEqual([await self.edit({'a': 1}), await self.edit({'a': 1}),
+                          await self.edit({'a': 2})], [True, False, True])
+        self.assertEqual(self.http.edits, [{'a': 1}, {'a': 2}])
+
+    async def test_failed_edit(self):
+        await self.edit({'a': 1})
+        self.http.fail = True
+        with self.assertRaises(ConnectionError):
+            await self.edit({'a': 2})
+        self.http.fail = False
+        # the message still has the first embed
+        self.assertTrue(await self.edit({'a': 2}))
+        self.assertEqual(self.http.edits, [{'a': 1}, {'a': 2}])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,207 @@
+"""The script handlers of the memory backend against the scripts they mirror.
+
+Every scenario runs on the memory backend and is checked against the
+expected result. With ``REDIS_URL`` set, it also runs on that redis server
+and both runs have to return the same:
+
+    REDIS_URL=redis://localhost:6379 python -m unittest discover tests
+"""
+
+import os
+import time
+import unittest
+import uuid
+
+import aredis
+
+from incidentreporter import dedup, schema, timeline
+from incidentreporter.memory import SCRIPT_HANDLERS, MemoryBackend
+from incidentreporter.scheduler import Scheduler
+from incidentreporter.storage import SCRIPTS, Storage
+
+
+REDIS_URL = os.environ.get('REDIS_URL')
+FIELDS = ('channel', 'message', 'state')
+
+
+class ScriptsTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        # the keys of a run are below a prefix of their own
+        self.prefix = f'test:{uuid.uuid4().hex}'
+        self.redis = None
+        if REDIS_URL is not None:
+            self.redis = aredis.StrictRedis.from_url(REDIS_URL)
+
+    async def asyncTearDown(self):
+        if self.redis is not None:
+            keys = [x async for x in self.redis.scan_iter(self.prefix + ':*')]
+            if keys:
+                await self.redis.delete(*keys)
+            self.redis.connection_pool.disconnect()
+
+    async def run_scenario(self, scenario, expected):
+        storage = Storage(MemoryBackend()) / self.prefix
+        self.assertEqual(await scenario(storage), expected)
+        if self.redis is not None:
+            storage = Storage(self.redis) / self.prefix
+            self.assertEqual(await scenario(storage), expected)
+
+    def test_every_script_has_a_handler(self):
+        self.assertEqual(set(SCRIPTS) - set(SCRIPT_HANDLERS), set())
+
+    async def test_list_pop(self):
+        async def scenario(storage):
+            items = storage.as_list('items')
+            await items.extend(['a', 'b', 'c'])
+            return [await items.del_(1), await items.del_(5),
+                    await items.copy()]
+        await self.run_scenario(scenario, [True, False, [b'a', b'c']])
+
+    async def test_dict_pop(self):
+        async def scenario(storage):
+            mapping = storage.as_dict('mapping')
+            await mapping.update({'a': 1, 'b': 2})
+            return [await mapping.pop('a'), await mapping.pop('c'),
+                    await mapping.copy()]
+        await self.run_scenario(scenario, [b'1', None, {b'b': b'2'}])
+
+    async def test_sort(self):
+        async def scenario(storage):
+            await storage.as_set('ids').extend([1, 2, 3])
+            await storage.as_list('items').extend([2, 10, 1])
+            for id, rank in ((1, 2), (2, 3), (3, 1)):
+                await storage.as_dict(f'item:{id}').update(
+                    {'rank': rank, 'name': f'item {id}'}
+                )
+            await storage.set('string', 1)
+            try:
+                await storage.sort('string')
+            except aredis.ResponseError as error:
+                wrongtype = str(error).startswith('WRONGTYPE')
+            return [
+                await storage.sort('ids'),
+                await storage.sort('items', desc=True),
+                await storage.sort('ids', '#', 'item:*->name',
+                                   by='item:*->rank'),
+                await storage.sort('items', alpha=True, store='sorted'),
+                await storage.as_list('sorted').copy(),
+                wrongtype
+            ]
+        await self.run_scenario(scenario, [
+            [b'1', b'2', b'3'], [b'10', b'2', b'1'],
+            [b'3', b'item 3', b'1', b'item 1', b'2', b'item 2'],
+            3, [b'1', b'10', b'2'], True
+        ])
+
+    async def test_record_legacy_reads(self):
+        async def scenario(storage):
+            await storage.set_many({'record:channel': 1, 'record:state': 'a'})
+            record = storage.as_record('record', FIELDS)
+            await record.set('state', 'b')
+            return [await record.copy(), await storage.exists('record:state'),
+                    await storage.as_record('record', FIELDS,
+                                            legacy_reads=False).copy()]
+        await self.run_scenario(scenario, [
+            {'channel': b'1', 'state': b'b'}, False, {'state': b'b'}
+        ])
+
+    async def test_record_del(self):
+        async def scenario(storage):
+            await storage.set('record:channel', 1)
+            record = storage.as_record('record', FIELDS)
+            await record.set('message', 2)
+            return [await record.del_('channel', 'message', 'state'),
+                    await record.copy(),
+                    await storage.exists('record:channel')]
+        await self.run_scenario(scenario, [2, {}, False])
+
+    async def test_record_migrate(self):
+        async def scenario(storage):
+            await storage.set_many({'record:channel': 1, 'record:state': 'a'})
+            await storage.as_dict('record').set('state', 'b')
+            record = storage.as_record('record', FIELDS)
+            return [await record.migrate(), await record.migrate(),
+                    await storage.as_dict('record').copy()]
+        await self.run_scenario(scenario, [
+            2, 0, {b'channel': b'1', b'state': b'b'}
+        ])
+
+    async def compact(self, cls):
+        async def scenario(storage):
+            updates = cls(storage, 1)
+            for x in range(5):
+                await updates.append(b'%d' % x)
+            never = await updates.compact(0)
+            compacted = await updates.compact(2)
+            await updates.append(b'5')
+            return [never, compacted, await updates.compact(2),
+                    await updates.copy(),
+                    await timeline.archive(storage, 1).copy(),
+                    await storage.as_dict('incident:1:snapshot').copy()]
+        await self.run_scenario(scenario, [
+            (0, 0, None), (3, 3, b'0'), (0, 3, b'0'), [b'3', b'4', b'5'],
+            [b'0', b'1', b'2'], {b'archived': b'3', b'first': b'0'}
+        ])
+
+    async def test_updates_compact(self):
+        await self.compact(timeline.ListTimeline)
+
+    async def test_timeline_compact(self):
+        await self.compact(timeline.StreamTimeline)
+
+    async def test_scheduler_claim(self):
+        async def scenario(storage):
+            scheduler = Scheduler(storage, 'jobs', None, lease=60,
+                                  batch_size=2)
+            now = time.time()
+            await scheduler.jobs.update({'a': now - 2, 'b': now - 1,
+                                         'c': now - 0.5, 'd': now + 30})
+            claimed = await scheduler._claim(now)
+            scores = dict(await scheduler.jobs.slice(withscores=True))
+            return [claimed, [x for x, score in scores.items()
+                              if score >= now + 60]]
+        await self.run_scenario(scenario, [['a', 'b'], [b'a', b'b']])
+
+    async def test_edit_digest(self):
+        async def scenario(storage):
+            async def edited(previous, embed):
+                return await storage.script(
+                    'edit_digest', ['edits:1'],
+                    [previous, dedup.digest(embed), dedup.DIGEST_TTL]
+                )
+            a, b = dedup.digest({'a': 1}), dedup.digest({'a': 2})
+            return [await edited('', {'a': 1}),
+                    await storage.get('edits:1') == a.encode(),
+                    0 < await storage.ttl('edits:1') <= dedup.DIGEST_TTL,
+                    await edited(a, {'a': 2}),
+                    # edited by someone else since the digest was read
+                    await edited(a, {'a': 1}),
+                    await storage.exists('edits:1'),
+                    await edited(b, {'a': 1})]
+        await self.run_scenario(scenario, [1, True, True, 1, 0, False, 0])
+
+    async def test_statusembed_migrate(self):
+        async def scenario(storage):
+            await storage.set_many({'statusembed:1:incident:0': 4,
+                                    'statusembed:1:incident:2': 5})
+            await schema.statusembed_systems(storage, 1).set('2', '6:Outage')
+            return [await schema.migrate_statusembed(storage, 1, 3),
+                    await storage.exists('statusembed:1:incident:0')]
+        await self.run_scenario(scenario, [
+            {b'0': b'4:', b'2': b'6:Outage', b'migrated': b'1'}, False
+        ])
+
+    async def test_statusembed_state(self):
+        async def scenario(storage):
+            systems = schema.statusembed_systems(storage, 1)
+            await systems.update({'0': '4:Outage', '1': '5:Outage'})
+            # system 2 has been unlinked, system 1 belongs to another one
+            await schema.statusembed_state(storage, 1, 4, 'Maintenance',
+                                           [0, 1, 2])
+            return await systems.copy()
+        await self.run_scenario(scenario, {b'0': b'4:Maintenance',
+                                           b'1': b'5:Outage'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+import time
+import unittest
+
+from incidentreporter.memory import MemoryBackend
+from incidentreporter.scheduler import Scheduler
+from incidentreporter.storage import Storage
+
+
+class RetryTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.available = False
+
+        async def handler(job):
+            if not self.available:
+                return self.scheduler.retry(job)
+            return None
+
+        self.scheduler = Scheduler(Storage(MemoryBackend()), 'jobs', handler,
+                                   retry_delay=10, max_retry_delay=30,
+                                   max_retries=4)
+
+    async def delays(self, count: int):
+        delays = []
+        for _ in range(count):
+            await self.scheduler.schedule('a', 0)
+            await self.scheduler._handle('a')
+            due = await self.scheduler.jobs.score('a')
+            delays.append(None if due is None else round(due - time.time()))
+        return delays
+
+    async def test_backoff(self):
+        self.assertEqual(await self.delays(5), [10, 20, 30, 30, None])
+
+    async def test_reset(self):
+        await self.delays(2)
+        self.available = True
+        self.assertEqual(await self.delays(1), [None])
+        self.available = False
+        self.assertEqual(await self.delays(1), [10])
+
+
+if __name__ == '__main__':
+    unittest.main()
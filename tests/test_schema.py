@@ -0,0 +1,97 @@
+import datetime
+import functools
+import unittest
+
+from incidentreporter import schema, timeline
+from incidentreporter.codec import UpdateCodec
+from incidentreporter.ext.incidents import (
+    STATE_OUTAGE, STATE_PARTIAL_OUTAGE, STATE_RESOLVED, STATE_UPDATE, STATES,
+    Incidents
+)
+from incidentreporter.memory import MemoryBackend
+from incidentreporter.storage import Storage
+
+
+CODEC = UpdateCodec(STATES)
+START = datetime.datetime(2021, 3, 1, 12)
+
+
+def score(minutes: int) -> float:
+    return (START + datetime.timedelta(minutes=minutes)).replace(
+        tzinfo=datetime.timezone.utc
+    ).timestamp()
+
+
+class MigratorTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.storage = Storage(MemoryBackend())
+        self.gstorage = self.storage / 'guild' / '1'
+        self.migrator = schema.Migrator(
+            self.storage, functools.partial(Incidents.backfill, CODEC), 2
+        )
+
+    async def create(self, incident: int, states, kind: str = 'list',
+                     legacy: bool = False):
+        # an incident as written before the indexes were introduced
+        if legacy:
+            await self.gstorage.set(f'incident:{incident}:channel', 5)
+        else:
+            await schema.incident(self.gstorage, incident).update(
+                {'channel': 5, 'timeline': kind}
+            )
+        updates = timeline.timeline(self.gstorage, incident, kind)
+        for minutes, state in enumerate(states):
+            await updates.append(CODEC.encode(
+                state, 'message', START + datetime.timedelta(minutes=minutes)
+            ))
+
+    def index(self, name: str):
+        return schema.incident_index(self.gstorage, name).slice(
+            withscores=True
+        )
+
+    async def test_backfill(self):
+        await self.storage.set('schema:version', 2)
+        await self.create(1, [STATE_OUTAGE, STATE_UPDATE, STATE_UPDATE])
+        # the first update is archived
+        await timeline.ListTimeline(self.gstorage, 1).compact(1)
+        await self.create(2, [STATE_OUTAGE, STATE_RESOLVED,
+                              STATE_PARTIAL_OUTAGE], 'stream')
+        await self.create(3, [STATE_OUTAGE, STATE_RESOLVED])
+        # indexed by an update in the meantime
+        await self.create(4, [STATE_OUTAGE])
+        await schema.incident(self.gstorage, 4).set('state', STATE_OUTAGE)
+
+        await self.migrator.run()
+        self.assertEqual(await self.migrator.version(), schema.SCHEMA_VERSION)
+        self.assertEqual(await self.index('updated'), [
+            (b'3', score(1)), (b'1', score(2)), (b'2', score(2))
+        ])
+        self.assertEqual(await self.index('channel:5'),
+                         await self.index('updated'))
+        self.assertEqual(await self.index('open'), [
+            (b'1', score(0)), (b'2', score(2))
+        ])
+        self.assertEqual(await self.index('state:outage'), [(b'1', score(2))])
+        self.assertEqual(await self.index('state:partial-outage'),
+                         [(b'2', score(2))])
+        self.assertEqual(await self.index('state:resolved'),
+                         [(b'3', score(1))])
+        self.assertEqual(
+            await schema.incident(self.gstorage, 2).get('state'),
+            STATE_PARTIAL_OUTAGE.encode()
+        )
+        self.assertFalse(await self.storage.exists('schema:migration'))
+
+    async def test_legacy_records(self):
+        await self.create(1, [STATE_OUTAGE], legacy=True)
+        await self.migrator.run()
+        self.assertEqual(
+            await schema.incident(self.gstorage, 1).copy(),
+            {'channel': b'5', 'state': STATE_OUTAGE.encode()}
+        )
+        self.assertEqual(await self.index('open'), [(b'1', score(0))])
+
+
+if __name__ == '__main__':
+    unittest.main()
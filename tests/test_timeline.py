@@ -0,0 +1,45 @@
+import os
+import unittest
+import uuid
+
+import aredis
+
+from incidentreporter import timeline
+from incidentreporter.memory import MemoryBackend
+from incidentreporter.storage import Storage
+
+
+REDIS_URL = os.environ.get('REDIS_URL')
+
+
+class StreamTimelineTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.prefix = f'test:{uuid.uuid4().hex}'
+        self.backends = [MemoryBackend()]
+        if REDIS_URL is not None:
+            self.backends.append(aredis.StrictRedis.from_url(REDIS_URL))
+
+    async def asyncTearDown(self):
+        for backend in self.backends[1:]:
+            await backend.delete(f'{self.prefix}:incident:1:stream')
+            backend.connection_pool.disconnect()
+
+    async def test_page(self):
+        # pages continue after the last entry with inclusive bounds, which
+        # works on redis 5, even within one millisecond
+        for backend in self.backends:
+            updates = timeline.StreamTimeline(Storage(backend) / self.prefix,
+                                              1)
+            for x in range(5):
+                await updates.append(b'%d' % x)
+            pages, cursor = [], None
+            while True:
+                cursor, page = await updates.page(cursor, 2)
+                pages.append(page)
+                if cursor is None:
+                    break
+            self.assertEqual(pages, [[b'0', b'1'], [b'2', b'3'], [b'4']])
+
+
+if __name__ == '__main__':
+    unittest.main()